@@ -0,0 +1,129 @@
+# backend/app/async_routes.py
+"""
+Route class used when DB_MODE=async.
+
+The polled reads -- GET /users/{user_id}, /me and /users/{user_id}/stats -- are native
+`async def` handlers (below): their statements are awaited on an AsyncSession
+(aiomysql/aiosqlite), the Redis cache, leaderboard and sticky-read calls run on a worker
+thread (database/offload.py `call`), and what is left on the event loop is building the
+response. They share the statement builders, dict shapes, replica routing and cache keys
+with the sync handlers in app/main.py, which AsyncSessionRoute replaces by them.
+
+Every other endpoint that takes a `db` dependency keeps its sync body and runs it through
+AsyncSession.run_sync: a greenlet on the event loop thread in which database I/O is awaited.
+Those are the writes (each body is one transaction around the crud layer, which stays shared
+by both modes) and the less frequent reads. Anything in them that blocks without being
+database I/O goes through offload.blocking and runs on a worker thread while the greenlet
+waits: the Redis cache and leaderboard calls, the write-behind queue, and the engine over a
+/process-day/batch.
+"""
+import functools
+import inspect
+from datetime import date
+
+from fastapi import Depends, HTTPException, Query
+from fastapi.routing import APIRoute
+from starlette.requests import Request
+
+from app import conditional
+from app.fastjson import FastJSONResponse
+from database import cache, crud, leaderboard, offload, routing, user_versions
+from database.async_connection import get_async_db
+from database.models import User
+
+# -------------------------
+# Native async handlers (replace the app/main.py handler of the same name)
+# -------------------------
+async def _routed(db, user_id: int, read):
+    """await read(on_replica), on the session's replica where routing.replica_read would use one."""
+    session = db.sync_session
+    if routing.replica_allowed(session):
+        sticky = await offload.in_thread(routing.sticky.is_sticky, user_id)
+        if routing.choose_replica(session, user_id, lambda _uid: sticky):
+            with routing.reading_replica(session):
+                return await read(True)
+    return await read(False)
+
+async def _for_user(db, user_id: int, *extra):
+    async def read(_on_replica):
+        return (await db.execute(user_versions.current_stmt(user_id))).first()
+    return conditional.from_current(user_id, await _routed(db, user_id, read), *extra)
+
+async def _profile(db, user_id: int):
+    async def load():
+        return crud.profile_dict(await db.get(User, user_id))
+
+    async def read(on_replica):
+        return await cache.get_or_load_async(f"user:{user_id}", load, store=not on_replica)
+    return await _routed(db, user_id, read)
+
+async def _stats(db, user_id: int):
+    async def load():
+        return crud.stats_dict((await db.execute(crud.user_stats_stmt(user_id))).first())
+
+    async def read(on_replica):
+        return await cache.get_or_load_async(f"stats:{user_id}", load, store=not on_replica)
+    return await _routed(db, user_id, read)
+
+async def api_me(user_id: int = Query(..., description="user id"), db=Depends(get_async_db)):
+    u = await _profile(db, user_id)
+    if not u:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {
+        "id": u["id"],
+        "username": u["username"],
+        "total_xp": u["total_xp"],
+        "current_level": u["current_level"],
+        "streak_days": u["streak_days"]
+    }
+
+async def api_get_user(user_id: int, request: Request, db=Depends(get_async_db)):
+    v = await _for_user(db, user_id)
+    if v and v.matches(request):
+        return v.not_modified()
+    u = await _profile(db, user_id)
+    if not u:
+        raise HTTPException(status_code=404, detail="User not found")
+    v = v.for_body(u.pop("data_version", None)) if v else None
+    return FastJSONResponse(u, headers=v.headers if v else None)
+
+async def api_user_stats(user_id: int, request: Request, db=Depends(get_async_db)):
+    if not leaderboard.loaded():
+        await db.run_sync(leaderboard.ensure_loaded)
+    ranks = {}
+    for board, field in (("total_xp", "rank"), ("streak_days", "streak_rank")):
+        r = await offload.call(leaderboard.backend.rank, board, user_id)
+        ranks[field] = r + 1 if r is not None else None
+    v = await _for_user(db, user_id, date.today().isoformat(), ranks["rank"], ranks["streak_rank"])
+    if v and v.matches(request):
+        return v.not_modified()
+    stats = await _stats(db, user_id)
+    if not stats:
+        raise HTTPException(status_code=404, detail="User not found")
+    v = v.for_body(stats.pop("data_version", None)) if v else None
+    stats.update(ranks)
+    return FastJSONResponse({"stats": stats}, headers=v.headers if v else None)
+
+NATIVE = {fn.__name__: fn for fn in (api_me, api_get_user, api_user_stats)}
+
+# -------------------------
+# Route class
+# -------------------------
+def in_async_session(endpoint):
+    if endpoint.__name__ in NATIVE:
+        return NATIVE[endpoint.__name__]
+    sig = inspect.signature(endpoint)
+    if "db" not in sig.parameters or inspect.iscoroutinefunction(endpoint):
+        return endpoint
+
+    @functools.wraps(endpoint)
+    async def wrapper(*args, db, **kwargs):
+        return await db.run_sync(lambda sync_db: endpoint(*args, db=sync_db, **kwargs))
+
+    params = [p.replace(default=Depends(get_async_db)) if p.name == "db" else p for p in sig.parameters.values()]
+    wrapper.__signature__ = sig.replace(parameters=params)
+    return wrapper
+
+class AsyncSessionRoute(APIRoute):
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, in_async_session(endpoint), **kwargs)
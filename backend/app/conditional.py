@@ -0,0 +1,84 @@
+# backend/app/conditional.py
+"""
+Conditional GETs (ETag / Last-Modified) for the per-user read endpoints.
+
+Validators come from users.data_version and users.data_updated_at (database/user_versions.py),
+read with one primary-key lookup before anything else, so an unchanged poll is answered
+with 304 without touching tasks, task_logs or the stats tables:
+
+    ETag           W/"<user_id>-<data_version>[-<extra>...]"
+                   extra: inputs the body depends on besides the user's own data
+                   (today's date and the ranks on /users/{id}/stats)
+    Last-Modified  data_updated_at; only sent when the body has no extra inputs
+
+If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2). Because the
+validators are read before the body, a write committing in between can only make the
+ETag older than the body (the next poll refetches), never newer. Bodies served from the
+read-through cache carry the version they were loaded at (see for_body).
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from database import user_versions
+
+@dataclass(frozen=True)
+class Validators:
+    user_id: int
+    version: int
+    updated_at: Optional[datetime] = None  # naive UTC; None: no Last-Modified
+    extra: Tuple = ()
+
+    @property
+    def etag(self) -> str:
+        return 'W/"' + "-".join(str(p) for p in (self.user_id, self.version) + self.extra) + '"'
+
+    @property
+    def headers(self) -> dict:
+        out = {"ETag": self.etag, "Cache-Control": "private, no-cache"}
+        if self.updated_at is not None and not self.extra:
+            out["Last-Modified"] = format_datetime(self.updated_at.replace(tzinfo=timezone.utc), usegmt=True)
+        return out
+
+    def matches(self, request: Request) -> bool:
+        """True if the client's copy is current (answer with not_modified())."""
+        inm = request.headers.get("if-none-match")
+        if inm is not None:
+            tags = {t.strip().removeprefix("W/") for t in inm.split(",")}
+            return "*" in tags or self.etag.removeprefix("W/") in tags
+        ims = request.headers.get("if-modified-since")
+        if ims is None or self.updated_at is None or self.extra:
+            return False
+        try:
+            since = parsedate_to_datetime(ims)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        return self.updated_at <= since
+
+    def for_body(self, version: Optional[int]) -> Optional["Validators"]:
+        """Validators for a body loaded at `version` (a cached body can lag the users row); None if unknown."""
+        if version == self.version:
+            return self
+        if version is None:
+            return None
+        return Validators(self.user_id, version, None, self.extra)
+
+    def not_modified(self) -> Response:
+        return Response(status_code=304, headers=self.headers)
+
+def for_user(db, user_id: int, *extra) -> Optional[Validators]:
+    """Validators of a user's data, or None if the user does not exist."""
+    return from_current(user_id, user_versions.current(db, user_id), *extra)
+
+def from_current(user_id: int, found, *extra) -> Optional[Validators]:
+    """Validators from a user_versions.current (data_version, data_updated_at) row; None for None."""
+    if found is None:
+        return None
+    version, updated_at = found
+    return Validators(user_id, version, updated_at, tuple(extra))
@@ -0,0 +1,39 @@
+# backend/app/fastjson.py
+"""
+JSON response class for the read endpoints.
+
+Handlers return FastJSONResponse(content) with plain dicts and lists (e.g. the
+crud.list_task_rows / list_log_rows rows), which skips FastAPI's jsonable_encoder
+pass over every value. Serialization uses orjson when it is installed (optional:
+pip install orjson); dates and datetimes are written as ISO strings by the
+serializer, so handlers do not call isoformat() per row. Without orjson the stdlib
+encoder produces the same JSON.
+"""
+import json
+from datetime import date
+from decimal import Decimal
+
+from starlette.responses import Response
+
+try:
+    import orjson  # optional dependency
+except ImportError:
+    orjson = None
+
+def _default(o):
+    if isinstance(o, date):  # date and datetime (orjson handles these itself)
+        return o.isoformat()
+    if isinstance(o, Decimal):  # SUM() on MySQL
+        return int(o) if o == o.to_integral_value() else float(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -1,5 +1,14 @@
 # backend/app/main.py
 import sys
+import base64
+import csv
+import io
+import json
+import tempfile
+import threading
+import zlib
+from contextlib import closing
+from itertools import chain
 from pathlib import Path
 
 # Ensure backend folder is on sys.path so imports resolve when running from backend/
@@ -7,20 +16,35 @@ here = Path(__file__).resolve().parents[1]
 if str(here) not in sys.path:
     sys.path.insert(0, str(here))
 
-from fastapi import FastAPI, Depends, HTTPException, Query
-from pydantic import BaseModel
+from fastapi import FastAPI, Depends, HTTPException, Query, Header, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from typing import List, Optional
 from streax.models import Task as DataTask, UserState as DataUserState
 from streax.engine import process_day
-from datetime import date
+from streax import achievements
+from datetime import date, timedelta
 from fastapi.middleware.cors import CORSMiddleware
 
 # DB imports
-from database.connection import SessionLocal
-from database import crud
+from database.connection import SessionLocal, DB_MODE, REQUEST_METRICS, pool_metrics, replica_pool_metrics
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from app import metrics, conditional
+from app.fastjson import FastJSONResponse
+from database import crud, cache, leaderboard, offload, write_queue, routing
+from database.engine_glue import DAILY_TARGET_COUNT, engine_state, day_entries, state_event, queued_day
+from database.import_logs import import_logs
+from database import simulate
 
 app = FastAPI(title="StreaX Engine API - Dev (DB)")
 
+if DB_MODE == "async":
+    # must be set before the routes below are declared; it swaps api_me, api_get_user and
+    # api_user_stats for their native async versions in app/async_routes.py
+    from app.async_routes import AsyncSessionRoute
+    app.router.route_class = AsyncSessionRoute
+
 # Allow frontend dev origin (adjust later)
 app.add_middleware(
     CORSMiddleware,
@@ -28,27 +52,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag", "Last-Modified"],
 )
 
+# Per-route latency / SQL instrumentation (REQUEST_METRICS=1; SERVER_TIMING=1 adds the header)
+if REQUEST_METRICS:
+    app.add_middleware(metrics.RequestMetricsMiddleware)
+
 # Pydantic models for API
+MAX_TASK_BASE_XP = 1_000_000  # per task; keeps users.total_xp (INT) and level lookups in range
+
 class TaskIn(BaseModel):
     id: int
     name: str
     type: str
-    base_xp: int
+    base_xp: int = Field(..., ge=0, le=MAX_TASK_BASE_XP)
     required_daily: bool = False
 
 class TaskCreateIn(BaseModel):
     user_id: int
     name: str
     type: str
-    base_xp: int
+    base_xp: int = Field(..., ge=0, le=MAX_TASK_BASE_XP)
     required_daily: bool = False
 
 class TaskUpdateIn(BaseModel):
     name: Optional[str] = None
     type: Optional[str] = None
-    base_xp: Optional[int] = None
+    base_xp: Optional[int] = Field(None, ge=0, le=MAX_TASK_BASE_XP)
     required_daily: Optional[bool] = None
 
 class UserStateIn(BaseModel):
@@ -64,9 +95,27 @@ class ProcessDayRequest(BaseModel):
     user: UserStateIn
     tasks: List[TaskIn]
 
-# DB dependency
-def get_db():
+# Opaque pagination cursors: urlsafe base64 of "id" or "date|id" (last row of the previous page)
+def encode_cursor(last_id: int, last_date: Optional[str] = None) -> str:
+    raw = f"{last_date}|{last_id}" if last_date is not None else str(last_id)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Return (after_id, after_date or None); 400 on garbage."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        if "|" in raw:
+            d, i = raw.rsplit("|", 1)
+            return int(i), d
+        return int(raw), None
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# DB dependency; read-only requests may read from a replica (database/routing.py)
+def get_db(request: Request):
     db = SessionLocal()
+    if request.method in ("GET", "HEAD"):
+        routing.allow_replica_reads(db)
     try:
         yield db
     finally:
@@ -74,7 +123,7 @@ def get_db():
 
 @app.get("/")
 def root():
-    return {"ok": True, "msg": "StreaX Engine API (dev) with DB"}
+    return {"ok": True, "msg": "StreaX Engine API (dev) with DB", "db_mode": DB_MODE}
 
 @app.post("/users", summary="Create a user (if username provided)")
 def api_create_user(payload: UserStateIn, db = Depends(get_db)):
@@ -98,47 +147,49 @@ def api_create_user(payload: UserStateIn, db = Depends(get_db)):
 
 @app.get("/me", summary="Convenience: get basic user object by query user_id")
 def api_me(user_id: int = Query(..., description="user id"), db = Depends(get_db)):
-    u = crud.get_user(db, user_id)
+    u = crud.get_user_profile(db, user_id)
     if not u:
         raise HTTPException(status_code=404, detail="User not found")
     return {
-        "id": u.id,
-        "username": u.username,
-        "total_xp": u.total_xp,
-        "current_level": u.current_level,
-        "streak_days": u.streak_days
+        "id": u["id"],
+        "username": u["username"],
+        "total_xp": u["total_xp"],
+        "current_level": u["current_level"],
+        "streak_days": u["streak_days"]
     }
 
 @app.get("/users/{user_id}", summary="Get user by id")
-def api_get_user(user_id: int, db = Depends(get_db)):
-    u = crud.get_user(db, user_id)
+def api_get_user(user_id: int, request: Request, db = Depends(get_db)):
+    """Conditional GET: ETag / Last-Modified from the user's data version (app/conditional.py)."""
+    v = conditional.for_user(db, user_id)
+    if v and v.matches(request):
+        return v.not_modified()
+    u = crud.get_user_profile(db, user_id)
     if not u:
         raise HTTPException(status_code=404, detail="User not found")
-    return {
-        "id": u.id,
-        "username": u.username,
-        "total_xp": u.total_xp,
-        "current_level": u.current_level,
-        "streak_days": u.streak_days,
-        "last_active_date": u.last_active_date,
-        "consecutive_misses": u.consecutive_misses,
-    }
+    v = v.for_body(u.pop("data_version", None)) if v else None
+    return FastJSONResponse(u, headers=v.headers if v else None)
 
 @app.get("/tasks", summary="List tasks for a user")
-def api_list_tasks(user_id: int = Query(..., description="user id"), limit: int = 100, offset: int = 0, db = Depends(get_db)):
-    tasks = crud.list_tasks_for_user(db, user_id=user_id, limit=limit, offset=offset)
-    result = []
-    for t in tasks:
-        result.append({
-            "id": t.id,
-            "user_id": t.user_id,
-            "name": t.name,
-            "type": t.type,
-            "base_xp": t.base_xp,
-            "required_daily": bool(t.required_daily),
-            "created_at": t.created_at.isoformat() if t.created_at else None
-        })
-    return {"tasks": result, "count": len(result)}
+def api_list_tasks(
+    request: Request,
+    user_id: int = Query(..., description="user id"),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0, description="legacy; prefer after_id / cursor"),
+    after_id: Optional[int] = Query(None, description="return tasks with id > after_id"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db = Depends(get_db),
+):
+    """Conditional GET (see api_get_user); rows are read as plain columns and serialized by FastJSONResponse."""
+    if cursor:
+        after_id, _ = decode_cursor(cursor)
+    v = conditional.for_user(db, user_id)
+    if v and v.matches(request):
+        return v.not_modified()
+    tasks = crud.list_task_rows(db, user_id=user_id, limit=limit, offset=offset, after_id=after_id)
+    next_cursor = encode_cursor(tasks[-1]["id"]) if len(tasks) == limit else None
+    return FastJSONResponse({"tasks": tasks, "count": len(tasks), "next_cursor": next_cursor},
+                            headers=v.headers if v else None)
 
 @app.post("/tasks", summary="Create a task for a user")
 def api_create_task(payload: TaskCreateIn, db = Depends(get_db)):
@@ -189,38 +240,301 @@ def api_delete_task(task_id: int, db = Depends(get_db)):
     return {"deleted": ok, "task_id": task_id}
 
 @app.get("/task-logs", summary="List task logs for a user")
-def api_list_logs(user_id: int = Query(..., description="user id"), limit: int = 100, offset: int = 0, db = Depends(get_db)):
-    logs = crud.list_logs_for_user(db, user_id=user_id, limit=limit, offset=offset)
-    out = []
-    for l in logs:
-        out.append({
-            "id": l.id,
-            "task_id": l.task_id,
-            "user_id": l.user_id,
-            "date": l.date,
-            "xp_awarded": l.xp_awarded,
-            "streak_at_time": l.streak_at_time,
-            "is_full_day": bool(l.is_full_day),
-            "created_at": l.created_at.isoformat() if l.created_at else None
-        })
-    return {"logs": out, "count": len(out)}
+def api_list_logs(
+    request: Request,
+    user_id: int = Query(..., description="user id"),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0, description="legacy; prefer after_id / cursor"),
+    after_id: Optional[int] = Query(None, description="return logs older than this id (no date range only)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    date_from: Optional[date] = Query(None, alias="from", description="first day (ISO), inclusive"),
+    date_to: Optional[date] = Query(None, alias="to", description="last day (ISO), inclusive"),
+    include_cold: bool = Query(False, description="also read archived logs (older than the hot window)"),
+    db = Depends(get_db),
+):
+    """Conditional GET (see api_get_user): an unchanged poll gets 304 without reading task_logs."""
+    ranged = date_from is not None or date_to is not None
+    after_date = None
+    if cursor:
+        after_id, after_date = decode_cursor(cursor)
+        if ranged != (after_date is not None):
+            raise HTTPException(status_code=400, detail="Cursor does not match the date filter")
+    elif ranged and after_id is not None:
+        raise HTTPException(status_code=400, detail="Use cursor (not after_id) together with from/to")
+    v = conditional.for_user(db, user_id)
+    if v and v.matches(request):
+        return v.not_modified()
+    logs = crud.list_log_rows(
+        db, user_id=user_id, limit=limit, offset=offset, after_id=after_id,
+        date_from=date_from.isoformat() if date_from else None,
+        date_to=date_to.isoformat() if date_to else None,
+        after_date=after_date, include_cold=include_cold,
+    )
+    next_cursor = None
+    if len(logs) == limit:
+        last = logs[-1]
+        next_cursor = encode_cursor(last["id"], last["date"].isoformat() if ranged else None)
+    return FastJSONResponse({"logs": logs, "count": len(logs), "next_cursor": next_cursor},
+                            headers=v.headers if v else None)
+
+EXPORT_BATCH_ROWS = 1000  # rows fetched per server-side cursor batch and written per chunk
+
+def _export_row(r) -> dict:
+    return {
+        "id": r.id,
+        "user_id": r.user_id,
+        "task_id": r.task_id,
+        "task_name": r.task_name,
+        "date": r.date.isoformat(),
+        "xp_awarded": r.xp_awarded,
+        "streak_at_time": r.streak_at_time,
+        "is_full_day": bool(r.is_full_day),
+        "created_at": r.created_at.isoformat() if r.created_at else None
+    }
+
+def _export_chunks(fmt: str, user_id: Optional[int], date_from: Optional[str], date_to: Optional[str],
+                   include_cold: bool = False):
+    """Encoded export chunks. Uses its own session: the body is streamed after the endpoint has returned."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if fmt == "csv":
+        writer.writerow(crud.EXPORT_COLUMNS)
+    with SessionLocal() as db:
+        for rows in crud.iter_logs_export(db, EXPORT_BATCH_ROWS, user_id, date_from, date_to, include_cold):
+            for r in rows:
+                row = _export_row(r)
+                if fmt == "csv":
+                    writer.writerow([row[k] for k in crud.EXPORT_COLUMNS])
+                else:
+                    buf.write(json.dumps(row) + "\n")
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()  # CSV header of an empty export
+
+def _gzip_chunks(chunks):
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+@app.get("/export/task-logs", summary="Stream task logs as NDJSON or CSV")
+def api_export_logs(
+    user_id: Optional[int] = Query(None, description="one user's logs; omit for every user"),
+    date_from: Optional[date] = Query(None, alias="from", description="first day (ISO), inclusive"),
+    date_to: Optional[date] = Query(None, alias="to", description="last day (ISO), inclusive"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = Query(False, description="download as a .gz file"),
+    include_cold: bool = Query(False, description="also export archived logs (older than the hot window)"),
+):
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    chunks = _export_chunks(format, user_id,
+                            date_from.isoformat() if date_from else None,
+                            date_to.isoformat() if date_to else None, include_cold)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"task_logs{'_' + str(user_id) if user_id is not None else ''}.{format}"
+    if gzip:
+        chunks = _gzip_chunks(chunks)
+        media_type = "application/gzip"
+        filename += ".gz"
+    return StreamingResponse(chunks, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+IMPORT_SPOOL_BYTES = 8 * 1024 * 1024  # request bodies above this are spooled to a temp file
+
+def _run_import(body, fmt: str, fill_gaps: bool) -> dict:
+    text = io.TextIOWrapper(body, encoding="utf-8", newline="")
+    report = import_logs(text, fmt, fill_gaps=fill_gaps, log=lambda msg: None)  # no progress lines on server stdout
+    return report.as_dict()
+
+@app.post("/import/task-logs", summary="Bulk import historical task logs (CSV or NDJSON request body)")
+async def api_import_logs(
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    fill_gaps: bool = Query(True, description="count days without completions as missed days"),
+):
+    """
+    Rows: username or user_id, task, date, xp (see database/import_logs.py). Rows are inserted in
+    chunked bulk statements, then the imported users' state is replayed from their logs.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES) as body:
+        async for chunk in request.stream():
+            body.write(chunk)
+        body.seek(0)
+        return await run_in_threadpool(_run_import, body, format, fill_gaps)
+
+@app.get("/users/{user_id}/activity", summary="Per-day task counts and XP sums (heatmap)")
+def api_user_activity(
+    user_id: int,
+    date_from: Optional[date] = Query(None, alias="from", description="first day (ISO), default to - 364 days"),
+    date_to: Optional[date] = Query(None, alias="to", description="last day (ISO), default today"),
+    db = Depends(get_db),
+):
+    date_to = date_to or date.today()
+    date_from = date_from or (date_to - timedelta(days=364))
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    if (date_to - date_from).days > 365:
+        raise HTTPException(status_code=400, detail="Range is limited to 366 days")
+    days = crud.get_activity(db, user_id, date_from.isoformat(), date_to.isoformat())
+    return {"user_id": user_id, "from": date_from.isoformat(), "to": date_to.isoformat(), "days": days}
 
 @app.get("/users/{user_id}/stats", summary="Get simple stats for a user")
-def api_user_stats(user_id: int, db = Depends(get_db)):
+def api_user_stats(user_id: int, request: Request, db = Depends(get_db)):
+    """
+    Conditional GET (see api_get_user). The ETag also covers today's date (week / month counters)
+    and both ranks; there is no Last-Modified, since those change without a write by this user.
+    """
+    # ranks move when other users score, so they are read from the leaderboard, not the stats cache
+    ranks = {}
+    for board, field in (("total_xp", "rank"), ("streak_days", "streak_rank")):
+        r = leaderboard.rank_of(db, board, user_id)
+        ranks[field] = r + 1 if r is not None else None
+    v = conditional.for_user(db, user_id, date.today().isoformat(), ranks["rank"], ranks["streak_rank"])
+    if v and v.matches(request):
+        return v.not_modified()
     stats = crud.get_user_stats(db, user_id)
     if not stats:
         raise HTTPException(status_code=404, detail="User not found")
-    return {"stats": stats}
+    v = v.for_body(stats.pop("data_version", None)) if v else None
+    stats.update(ranks)
+    return FastJSONResponse({"stats": stats}, headers=v.headers if v else None)
+
+@app.get("/achievements", summary="All achievement rules")
+def api_achievement_rules():
+    return {"achievements": [
+        {"name": r.name, "field": r.field, "threshold": r.threshold, "description": r.description}
+        for r in achievements.default_index.rules.values()
+    ]}
+
+@app.get("/users/{user_id}/achievements", summary="Achievements unlocked by a user")
+def api_user_achievements(user_id: int, db = Depends(get_db)):
+    rules = achievements.default_index.rules
+    out = []
+    for name, unlocked_at in crud.list_achievements(db, user_id):
+        rule = rules.get(name)
+        out.append({
+            "name": name,
+            "description": rule.description if rule else None,
+            "unlocked_at": unlocked_at.isoformat() if unlocked_at else None
+        })
+    return {"user_id": user_id, "achievements": out}
+
+@app.get("/leaderboard", summary="Top users by total_xp or streak_days")
+def api_leaderboard(
+    by: str = Query("total_xp", pattern="^(total_xp|streak_days)$"),
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    around_user: Optional[int] = Query(None, description="centre the page on this user"),
+    friends: Optional[str] = Query(None, description="comma-separated user ids to rank among"),
+    db = Depends(get_db),
+):
+    if friends:
+        try:
+            ids = [int(x) for x in friends.split(",") if x.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="friends must be comma-separated user ids")
+        rows = leaderboard.among(db, by, ids[:1000])[:limit]
+    elif around_user is not None:
+        rows = leaderboard.around(db, by, around_user, limit)
+        if rows is None:
+            raise HTTPException(status_code=404, detail="User not ranked")
+    else:
+        rows = leaderboard.top(db, by, limit, offset)
+    names = crud.get_usernames(db, [uid for _, uid, _ in rows])
+    entries = [{"rank": r + 1, "user_id": uid, "username": names.get(uid), "score": int(score)}
+               for r, uid, score in rows]
+    return {"by": by, "entries": entries, "total": leaderboard.size(db, by)}
+
+@app.get("/cache/stats", summary="Read-through cache hit/miss counters")
+def api_cache_stats():
+    return cache.stats()
+
+@app.get("/db/pool", summary="Connection pool checkout/checkin/overflow metrics")
+def api_pool_stats():
+    out = {"sync": pool_metrics.as_dict()}
+    for i, pm in enumerate(replica_pool_metrics):
+        out[f"sync_replica{i}"] = pm.as_dict()
+    if DB_MODE == "async":
+        from database.async_connection import async_pool_metrics, async_replica_pool_metrics
+        out["async"] = async_pool_metrics.as_dict()
+        for i, pm in enumerate(async_replica_pool_metrics):
+            out[f"async_replica{i}"] = pm.as_dict()
+    if replica_pool_metrics:
+        out["routing"] = routing.stats.as_dict()
+    return out
+
+@app.get("/metrics", summary="Prometheus metrics", response_class=PlainTextResponse)
+def api_metrics():
+    pools = {"sync": pool_metrics}
+    pools.update((f"sync_replica{i}", pm) for i, pm in enumerate(replica_pool_metrics))
+    if DB_MODE == "async":
+        from database.async_connection import async_pool_metrics, async_replica_pool_metrics
+        pools["async"] = async_pool_metrics
+        pools.update((f"async_replica{i}", pm) for i, pm in enumerate(async_replica_pool_metrics))
+    gauges = {}
+    for engine_name, pm in pools.items():
+        for k, v in pm.as_dict().items():
+            gauges.setdefault(f"streax_db_pool_{k}", {})[(("engine", engine_name),)] = v
+    for k, v in cache.stats().items():
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            gauges[f"streax_cache_{k}"] = {None: v}
+    if replica_pool_metrics:
+        for k, v in routing.stats.as_dict().items():
+            gauges[f"streax_db_routing_{k}"] = {None: v}
+    if write_queue.ENABLED:
+        for k, v in write_queue.get_queue().stats().items():
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                gauges[f"streax_write_queue_{k}"] = {None: v}
+    return PlainTextResponse(metrics.render_prometheus(gauges), media_type="text/plain; version=0.0.4")
+
+# -------------------------
+# /process-day (engine glue in database/engine_glue.py, shared with the write-behind worker)
+# -------------------------
+MAX_BATCH_ITEMS = 10000
+BATCH_CHUNK_USERS = 1000  # users per transaction in /process-day/batch
+PROCESS_DAY_ATTEMPTS = 3  # optimistic-lock retries in /process-day
+
+def user_out(orm_user) -> dict:
+    return {
+        "id": orm_user.id,
+        "username": orm_user.username,
+        "total_xp": orm_user.total_xp,
+        "current_level": orm_user.current_level,
+        "streak_days": orm_user.streak_days,
+        "last_active_date": orm_user.last_active_date,
+        "consecutive_misses": orm_user.consecutive_misses
+    }
 
 @app.post("/process-day", summary="Process day, persist logs and update user")
-def api_process_day(payload: ProcessDayRequest, db = Depends(get_db)):
+def api_process_day(payload: ProcessDayRequest, db = Depends(get_db),
+                    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=100)):
+    """
+    A user is processed at most once per day: a repeated submission (same user and date, or the
+    same Idempotency-Key) returns the recorded event with "duplicate": true and writes nothing.
+    event["achievements"] lists the achievements the day unlocked.
+    Concurrent requests for one user are serialized by the users.version check; the loser
+    recomputes from the fresh row (or replays the winner's event).
+    With WRITE_BEHIND=1 the day is queued instead (see _process_day_queued).
+    """
+    if write_queue.ENABLED:
+        return _process_day_queued(payload, db, idempotency_key)
     user = payload.user
     tasks = payload.tasks
+    today_iso = date.today().isoformat()
 
     # find or create user
     orm_user = None
     if user.user_id:
         orm_user = crud.get_user(db, user.user_id)
+        if orm_user:
+            cached = crud.get_day_event(db, orm_user.id, today_iso, idempotency_key)
+            if cached is not None:
+                return {"event": cached, "user": user_out(orm_user), "duplicate": True}
 
     if not orm_user:
         uname = user.username or f"user_{user.user_id or 'anon'}"
@@ -229,54 +543,304 @@ def api_process_day(payload: ProcessDayRequest, db = Depends(get_db)):
     # Convert incoming pydantic TaskIn to data Task objects (engine expects streax.models.Task)
     data_tasks = [DataTask(t.id, t.name, t.type, t.base_xp, t.required_daily) for t in tasks]
 
-    # create a lightweight UserState object for engine from DB or payload
-    data_user = DataUserState(
-        user_id=orm_user.id,
-        total_xp=orm_user.total_xp,
-        current_level=orm_user.current_level,
-        streak_days=orm_user.streak_days,
-        last_active_date=orm_user.last_active_date or "",
-        consecutive_misses=orm_user.consecutive_misses
-    )
+    for _ in range(PROCESS_DAY_ATTEMPTS):
+        updated_user_state, event = process_day(engine_state(orm_user), data_tasks, today_iso,
+                                                daily_target_count=DAILY_TARGET_COUNT)
+
+        # Persist in one transaction: day_events row, bulk task lookup/insert, bulk TaskLog insert, one user UPDATE
+        entries = day_entries(data_tasks, event, updated_user_state.streak_days, today_iso)
+        user_event = state_event(updated_user_state, today_iso, orm_user.version)
+        try:
+            orm_user, _ = crud.persist_day(db, orm_user, entries, user_event,
+                                           day_event={"event": event, "idempotency_key": idempotency_key})
+        except (IntegrityError, crud.StaleUserError):
+            # another request processed this user first (persist_day rolled back, so orm_user reloads)
+            cached = crud.get_day_event(db, orm_user.id, today_iso, idempotency_key)
+            if cached is not None:
+                return {"event": cached, "user": user_out(orm_user), "duplicate": True}
+            continue
 
+        # Return the event and user (as a simple dict)
+        return {
+            "event": event,
+            "user": user_out(orm_user),
+            "duplicate": False
+        }
+    raise HTTPException(status_code=409, detail="User was updated concurrently, retry")
+
+def _process_day_queued(payload: ProcessDayRequest, db, idempotency_key: Optional[str]):
+    """
+    Write-behind /process-day (database/write_queue.py): compute the event and queue its
+    persistence; the response carries "queued": true and a job_id for /process-day/status.
+    The engine starts from the user's newest queued day if the workers have not written it
+    yet, otherwise from the users row. event["achievements"] is filled in when the day is
+    written (see the status endpoint).
+    """
+    queue = write_queue.get_queue()
     today_iso = date.today().isoformat()
-    updated_user_state, event = process_day(data_user, data_tasks, today_iso, daily_target_count=2)
-
-    # Persist: ensure tasks exist and create TaskLog rows
-    total_base = sum(t.base_xp for t in data_tasks) or 1
-    task_awards = []
-    for t in data_tasks:
-        orm_task = crud.ensure_task(db, orm_user.id, t.name, t.type, t.base_xp, t.required_daily)
-        xp_awarded = int(round(event["day_xp"] * (t.base_xp / total_base)))
-        task_awards.append({
-            "task_id": orm_task.id,
-            "xp_awarded": xp_awarded,
-            "streak_at_time": updated_user_state.streak_days,
-            "is_full_day": False,
-            "date": today_iso
-        })
+    user = payload.user
+
+    # in_flight before the users row: a job that is done by now is already in that row
+    in_flight = queue.in_flight(user.user_id) if user.user_id else None
+    orm_user = crud.get_user(db, user.user_id) if user.user_id else None
+    if orm_user is None:
+        uname = user.username or f"user_{user.user_id or 'anon'}"
+        orm_user = crud.create_user(db, uname, user_id=user.user_id)
+        in_flight = None
 
-    crud.create_task_logs(db, orm_user.id, task_awards)
+    data_tasks = [DataTask(t.id, t.name, t.type, t.base_xp, t.required_daily) for t in payload.tasks]
+    job, duplicate = _enqueue_day(queue, db, orm_user, in_flight, data_tasks, today_iso, idempotency_key)
+    if job is None:
+        return {"event": duplicate, "user": user_out(orm_user), "duplicate": True}
+    return _queued_out(job, orm_user, duplicate=duplicate)
 
-    # Update user row with engine results
-    orm_user = crud.update_user_after_event(db, orm_user, {
-        "total_xp": updated_user_state.total_xp,
-        "current_level": updated_user_state.current_level,
-        "streak_days": updated_user_state.streak_days,
-        "consecutive_misses": updated_user_state.consecutive_misses,
-        "date": today_iso
-    })
+def _enqueue_day(queue, db, orm_user, in_flight: Optional[dict], data_tasks: List[DataTask], today_iso: str,
+                 idempotency_key: Optional[str] = None):
+    """
+    Queue one day of orm_user (in_flight: queue.in_flight(), read before the users row).
+    Returns (job, duplicate), or (None, recorded event) if the day is already in day_events.
+    The job's base_version is the users.version its state starts from: the row's, or one past
+    the in-flight job's when chained on it ("after"). If the row has moved on by the time the
+    worker writes the day (import, rebuild, sweep), the worker recomputes the day from the row.
+    """
+    job = queue.find(orm_user.id, today_iso, idempotency_key)
+    if job is not None:
+        return job, True
+    recorded = crud.get_day_event(db, orm_user.id, today_iso, idempotency_key)
+    if recorded is not None:
+        return None, recorded
 
-    # Return the event and user (as a simple dict)
+    if in_flight:
+        state = DataUserState(**in_flight["payload"]["state"])
+        chained = in_flight["payload"]["user_event"].get("base_version")
+        base_version = chained + 1 if chained is not None else None
+        job_payload = queued_day(state, data_tasks, today_iso, base_version, after=in_flight["id"])
+    else:
+        job_payload = queued_day(engine_state(orm_user), data_tasks, today_iso, orm_user.version)
+    try:
+        job_id = queue.enqueue(orm_user.id, today_iso, job_payload, idempotency_key)
+    except write_queue.DuplicateJob as e:
+        return e.job, True
+    return {"id": job_id, "state": write_queue.PENDING, "payload": job_payload, "result": None}, False
+
+def _queued_out(job: dict, orm_user, duplicate: bool) -> dict:
+    state = job["payload"]["state"]
     return {
-        "event": event,
-        "user": {
-            "id": orm_user.id,
-            "username": orm_user.username,
-            "total_xp": orm_user.total_xp,
-            "current_level": orm_user.current_level,
-            "streak_days": orm_user.streak_days,
-            "last_active_date": orm_user.last_active_date,
-            "consecutive_misses": orm_user.consecutive_misses
+        "event": job["result"] or job["payload"]["event"],
+        "user": dict(user_out(orm_user), **{k: v for k, v in state.items() if k != "user_id"}),
+        "duplicate": duplicate,
+        "queued": True,
+        "job_id": job["id"],
+        "job_state": job["state"],
+    }
+
+@app.get("/process-day/status", summary="Write-behind status of a queued day or of a user's writes")
+def api_process_day_status(job_id: Optional[int] = Query(None), user_id: Optional[int] = Query(None)):
+    """
+    job_id: the job's state (pending | claimed | done | failed), its event (with achievements once
+    done) and error. user_id: "synced" is true when none of the user's days are waiting, i.e. reads
+    of the user's rows reflect every accepted /process-day (read-your-writes).
+    """
+    if not write_queue.ENABLED:
+        raise HTTPException(status_code=404, detail="Write-behind mode is off (WRITE_BEHIND)")
+    queue = write_queue.get_queue()
+    if job_id is not None:
+        job = queue.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found (unknown or pruned)")
+        return {
+            "job_id": job["id"], "user_id": job["user_id"], "date": job["date"], "state": job["state"],
+            "enqueued_at": job["enqueued_at"], "done_at": job["done_at"], "attempts": job["attempts"],
+            "error": job["error"], "event": job["result"] or job["payload"]["event"],
         }
+    if user_id is None:
+        raise HTTPException(status_code=400, detail="Pass job_id or user_id")
+    waiting = queue.in_flight(user_id)
+    latest = queue.latest(user_id)
+    return {
+        "user_id": user_id,
+        "synced": waiting is None,
+        "waiting_job_id": waiting["id"] if waiting else None,
+        "latest_job_id": latest["id"] if latest else None,
+        "latest_job_state": latest["state"] if latest else None,
     }
+
+@app.get("/queue/stats", summary="Write-behind queue depth and lag")
+def api_queue_stats():
+    if not write_queue.ENABLED:
+        return {"enabled": False}
+    return write_queue.get_queue().stats()
+
+class ProcessDayBatchRequest(BaseModel):
+    items: List[ProcessDayRequest] = Field(..., max_length=MAX_BATCH_ITEMS)
+
+@app.post("/process-day/batch", summary="Process a day for many users in bulk")
+def api_process_day_batch(payload: ProcessDayBatchRequest, db = Depends(get_db)):
+    """
+    Users must already exist (unlike /process-day, which creates them). Like /process-day, a user
+    is processed at most once per day: users that already processed today, and repeated items for
+    one user, get the recorded event with "duplicate": true. Users are written in transactions of
+    BATCH_CHUNK_USERS; a failing transaction (e.g. a concurrent /process-day) only fails the items
+    of its users, which can simply be resubmitted.
+    With WRITE_BEHIND=1 every day is queued like a /process-day (see _process_day_batch_queued).
+    """
+    if write_queue.ENABLED:
+        return _process_day_batch_queued(payload, db)
+    today_iso = date.today().isoformat()
+    items = payload.items
+    users = crud.get_users(db, [it.user.user_id for it in items if it.user.user_id])
+    done = crud.get_day_events(db, list(users), today_iso)
+
+    results = [None] * len(items)
+    todo = {}  # user_id -> (engine state, tasks, users.version, [item indexes]), insertion ordered
+    for i, item in enumerate(items):
+        uid = item.user.user_id
+        orm_user = users.get(uid) if uid else None
+        if orm_user is None:
+            results[i] = {"index": i, "user_id": uid, "ok": False, "error": "User not found"}
+            continue
+        if uid in done:
+            results[i] = {"index": i, "user_id": uid, "ok": True, "event": done[uid], "duplicate": True}
+            continue
+        if uid in todo:
+            todo[uid][3].append(i)
+            continue
+        data_tasks = [DataTask(t.id, t.name, t.type, t.base_xp, t.required_daily) for t in item.tasks]
+        # the version is kept with the event: a failed chunk rolls back, which expires every user, and
+        # later chunks must not pass the version check against a row reloaded after a concurrent write
+        todo[uid] = (engine_state(orm_user), data_tasks, orm_user.version, [i])
+    # user_id -> (entries, user_event, event, [item indexes])
+    pending = offload.blocking(_compute_days, todo, today_iso)
+
+    groups = list(pending.items())
+    for start in range(0, len(groups), BATCH_CHUNK_USERS):
+        chunk = groups[start:start + BATCH_CHUNK_USERS]
+        days = [(users[uid], entries, user_event) for uid, (entries, user_event, _, _) in chunk]
+        day_events = [{"user_id": uid, "date": today_iso, "event": event} for uid, (_, _, event, _) in chunk]
+        try:
+            crud.persist_days(db, days, day_events)
+        except (SQLAlchemyError, crud.StaleUserError) as e:
+            msg = str(getattr(e, "orig", e))
+            for uid, (_, _, _, indexes) in chunk:
+                for i in indexes:
+                    results[i] = {"index": i, "user_id": uid, "ok": False, "error": f"Not processed: {msg}"}
+            continue
+        for uid, (_, _, event, indexes) in chunk:
+            for n, i in enumerate(indexes):
+                results[i] = {"index": i, "user_id": uid, "ok": True, "event": event, "duplicate": n > 0}
+
+    failed = sum(1 for r in results if not r["ok"])
+    return {"date": today_iso, "processed": len(results) - failed, "failed": failed, "results": results}
+
+def _compute_days(todo: dict, today_iso: str) -> dict:
+    """
+    The engine over a batch (pure CPU, no session): {user_id: (state, tasks, version, indexes)} ->
+    {user_id: (entries, user_event, event, indexes)}. Runs off the event loop under DB_MODE=async.
+    """
+    out = {}
+    for uid, (state, data_tasks, version, indexes) in todo.items():
+        state, event = process_day(state, data_tasks, today_iso, daily_target_count=DAILY_TARGET_COUNT)
+        out[uid] = (day_entries(data_tasks, event, state.streak_days, today_iso),
+                    state_event(state, today_iso, version), event, indexes)
+    return out
+
+def _process_day_batch_queued(payload: ProcessDayBatchRequest, db):
+    """
+    Write-behind /process-day/batch: each user's day goes through the queue, so the queue's one
+    day per user and date holds across both endpoints and days chain on queued state.
+    Results carry "queued": true and the job_id, as /process-day does.
+    """
+    queue = write_queue.get_queue()
+    today_iso = date.today().isoformat()
+    items = payload.items
+    uids = list(dict.fromkeys(it.user.user_id for it in items if it.user.user_id))
+    # in_flight before the users rows: a job that is done by now is already in its row
+    in_flight = {uid: queue.in_flight(uid) for uid in uids}
+    users = crud.get_users(db, uids)
+
+    results = []
+    for i, item in enumerate(items):
+        uid = item.user.user_id
+        orm_user = users.get(uid) if uid else None
+        if orm_user is None:
+            results.append({"index": i, "user_id": uid, "ok": False, "error": "User not found"})
+            continue
+        data_tasks = [DataTask(t.id, t.name, t.type, t.base_xp, t.required_daily) for t in item.tasks]
+        job, duplicate = _enqueue_day(queue, db, orm_user, in_flight[uid], data_tasks, today_iso)
+        if job is None:
+            results.append({"index": i, "user_id": uid, "ok": True, "event": duplicate, "duplicate": True})
+            continue
+        results.append({"index": i, "user_id": uid, "ok": True, "event": job["result"] or job["payload"]["event"],
+                        "duplicate": duplicate, "queued": True, "job_id": job["id"], "job_state": job["state"]})
+
+    failed = sum(1 for r in results if not r["ok"])
+    return {"date": today_iso, "processed": len(results) - failed, "failed": failed, "results": results}
+
+# -------------------------
+# Rule-change simulation (database/simulate.py)
+# -------------------------
+SIMULATE_MAX_CONCURRENT = 1  # simulations running at once per process; more get 429
+SIMULATE_MAX_PROJECTED_DAYS = 5_000_000  # runs * days of one projection
+SIMULATION_SLOTS = threading.BoundedSemaphore(SIMULATE_MAX_CONCURRENT)
+
+class SimulationRulesIn(BaseModel):
+    """Candidate rules; omitted fields keep the current value."""
+    streak_step: Optional[float] = Field(None, ge=0, le=1)
+    streak_cap: Optional[float] = Field(None, ge=0, le=10)
+    full_day_bonus: Optional[float] = Field(None, ge=0, le=10)
+    daily_target_count: Optional[int] = Field(None, ge=0, le=100)
+    curve: Optional[str] = Field(None, pattern="^(linear|power)$")
+    curve_base: Optional[int] = Field(None, ge=10, le=1000000)
+    curve_exponent: Optional[float] = Field(None, ge=0.5, le=4)
+
+class SimulateRequest(BaseModel):
+    mode: str = Field("replay", pattern="^(replay|project)$")
+    rules: SimulationRulesIn = SimulationRulesIn()
+    user_id: Optional[int] = None  # project only
+    days: int = Field(90, ge=1, le=3650)
+    runs: int = Field(1000, ge=1, le=100000)
+    window_days: int = Field(90, ge=1, le=3650)
+    seed: Optional[int] = None
+    fill_gaps: bool = True  # replay only
+    chunk_users: int = Field(5000, ge=100, le=100000)
+
+def _simulation_lines(summaries):
+    try:
+        with closing(summaries):
+            for summary in summaries:
+                yield (json.dumps(summary) + "\n").encode("utf-8")
+    finally:
+        SIMULATION_SLOTS.release()
+
+@app.post("/simulate", summary="Replay history or project a user under candidate XP rules")
+def api_simulate(payload: SimulateRequest):
+    """
+    mode=replay: all users' task log history (hot and archived) under the current and the candidate rules, across a
+    process pool in user-id chunks; streams NDJSON, one running summary per finished chunk (the last
+    has "done": true). mode=project: Monte Carlo projection of user_id for `days` days, one JSON
+    object. Nothing is written. See database/simulate.py.
+    """
+    if payload.mode == "project":
+        if payload.user_id is None:
+            raise HTTPException(status_code=400, detail="user_id is required for mode=project")
+        if payload.runs * payload.days > SIMULATE_MAX_PROJECTED_DAYS:
+            raise HTTPException(status_code=400,
+                                detail=f"runs * days is limited to {SIMULATE_MAX_PROJECTED_DAYS}")
+    candidate = simulate.BASELINE.replace(**payload.rules.model_dump())
+    if not SIMULATION_SLOTS.acquire(blocking=False):
+        raise HTTPException(status_code=429, detail="A simulation is already running, retry later")
+    if payload.mode == "project":
+        try:
+            result = simulate.project_user(payload.user_id, payload.days, payload.runs, candidate,
+                                           window_days=payload.window_days, seed=payload.seed)
+        finally:
+            SIMULATION_SLOTS.release()
+        if result is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return FastJSONResponse(result)
+    lines = _simulation_lines(simulate.simulate_history(candidate, chunk_users=payload.chunk_users,
+                                                        fill_gaps=payload.fill_gaps))
+    # the first chunk runs here: errors still become a status code, and once the generator has
+    # started, closing it (also on client disconnect) releases the slot and stops the pool
+    first = next(lines)
+    return StreamingResponse(chain([first], lines), media_type="application/x-ndjson")
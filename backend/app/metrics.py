@@ -0,0 +1,154 @@
+# backend/app/metrics.py
+"""
+Per-request latency and SQL instrumentation.
+
+RequestMetricsMiddleware (plain ASGI, enabled with REQUEST_METRICS=1) puts a
+QueryStats object in a contextvar for the duration of each request; the
+before/after_cursor_execute hooks in database/connection.py add every statement
+to it. When the response finishes, the request is folded into per-route
+aggregates (count, latency histogram, query count, DB time, slowest statement)
+that /metrics renders in Prometheus text format.
+
+SERVER_TIMING=1 additionally adds a `Server-Timing: app;dur=..., db;dur=...`
+header to every response.
+
+With REQUEST_METRICS unset the middleware is not added and the SQL hooks are
+not installed, so requests pay nothing.
+"""
+import os
+import threading
+import time
+
+from database.connection import QueryStats, current_query_stats
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "").strip().lower() in ("1", "true", "yes", "on")
+
+# seconds; Prometheus histogram upper bounds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SLOW_SQL_MAX_CHARS = 300
+
+class RouteStats:
+    __slots__ = ("requests", "statuses", "latency_sum", "buckets", "queries", "db_time",
+                 "max_queries", "slowest_time", "slowest_sql")
+
+    def __init__(self):
+        self.requests = 0
+        self.statuses = {}
+        self.latency_sum = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.queries = 0
+        self.db_time = 0.0
+        self.max_queries = 0
+        self.slowest_time = 0.0
+        self.slowest_sql = ""
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes = {}  # (method, route template) -> RouteStats
+
+    def record(self, method: str, route: str, status: int, seconds: float, q: QueryStats):
+        with self._lock:
+            rs = self.routes.get((method, route))
+            if rs is None:
+                rs = self.routes[(method, route)] = RouteStats()
+            rs.requests += 1
+            rs.statuses[status] = rs.statuses.get(status, 0) + 1
+            rs.latency_sum += seconds
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    rs.buckets[i] += 1
+            rs.queries += q.count
+            rs.db_time += q.db_time
+            rs.max_queries = max(rs.max_queries, q.count)
+            if q.slowest_time > rs.slowest_time:
+                rs.slowest_time = q.slowest_time
+                rs.slowest_sql = " ".join(q.slowest_sql.split())[:SLOW_SQL_MAX_CHARS]
+
+    def snapshot(self):
+        with self._lock:
+            return sorted(self.routes.items())
+
+registry = MetricsRegistry()
+
+class RequestMetricsMiddleware:
+    def __init__(self, app, registry: MetricsRegistry = registry, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.registry = registry
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    app_ms = (time.perf_counter() - started) * 1000.0
+                    value = f'app;dur={app_ms:.2f}, db;dur={stats.db_time * 1000.0:.2f};desc="{stats.count} queries"'
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", value.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_query_stats.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            self.registry.record(scope.get("method", ""), path, status, time.perf_counter() - started, stats)
+
+# -------------------------
+# Prometheus text exposition
+# -------------------------
+def _label(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", " ").replace('"', '\\"')
+
+def render_prometheus(extra_gauges: dict = None) -> str:
+    """
+    Render route aggregates, plus flat `extra_gauges` {metric_name: {label_tuple_or_None: value}}
+    (pool / cache numbers) as Prometheus text format 0.0.4.
+    """
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lbl = ",".join(f'{k}="{_label(v)}"' for k, v in labels)
+            lines.append(f"{name}{{{lbl}}} {value}" if lbl else f"{name} {value}")
+
+    routes = registry.snapshot()
+    base = lambda m, r: [("method", m), ("route", r)]
+
+    metric("streax_http_requests_total", "counter", "HTTP requests by route and status",
+           [(base(m, r) + [("status", s)], n) for (m, r), rs in routes for s, n in sorted(rs.statuses.items())])
+
+    name = "streax_http_request_duration_seconds"
+    lines.append(f"# HELP {name} Request latency by route")
+    lines.append(f"# TYPE {name} histogram")
+    for (m, r), rs in routes:
+        lbl = f'method="{_label(m)}",route="{_label(r)}"'
+        for bound, n in zip(LATENCY_BUCKETS, rs.buckets):
+            lines.append(f'{name}_bucket{{{lbl},le="{bound}"}} {n}')
+        lines.append(f'{name}_bucket{{{lbl},le="+Inf"}} {rs.requests}')
+        lines.append(f"{name}_sum{{{lbl}}} {rs.latency_sum:.6f}")
+        lines.append(f"{name}_count{{{lbl}}} {rs.requests}")
+    metric("streax_db_queries_total", "counter", "SQL statements issued while handling the route",
+           [(base(m, r), rs.queries) for (m, r), rs in routes])
+    metric("streax_db_queries_max", "gauge", "Most SQL statements issued by a single request",
+           [(base(m, r), rs.max_queries) for (m, r), rs in routes])
+    metric("streax_db_time_seconds_total", "counter", "Time spent executing SQL for the route",
+           [(base(m, r), f"{rs.db_time:.6f}") for (m, r), rs in routes])
+    metric("streax_db_slowest_statement_seconds", "gauge", "Slowest single SQL statement seen for the route",
+           [(base(m, r) + [("statement", rs.slowest_sql)], f"{rs.slowest_time:.6f}")
+            for (m, r), rs in routes if rs.slowest_sql])
+
+    for name, samples in (extra_gauges or {}).items():
+        metric(name, "gauge", name.replace("_", " "), [(list(k or ()), v) for k, v in samples.items()])
+    return "\n".join(lines) + "\n"
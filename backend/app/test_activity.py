@@ -0,0 +1,46 @@
+# backend/app/test_activity.py
+"""
+GET /users/{user_id}/activity (the Streaks grid): per-day counts from daily_rollups, where
+"scored" counts only the logs that awarded XP, on the write path and after a rebuild.
+
+Run (from backend/):
+    python -m unittest app.test_activity      (or: python -m pytest app/test_activity.py)
+"""
+import unittest
+
+from sqlalchemy.orm import Session
+
+from database import testing
+from database.testing import engine, logs, process_day
+from database import crud
+
+def activity(user_id: int) -> list:
+    r = testing.client().get(f"/users/{user_id}/activity", params={"from": "2024-03-01", "to": "2024-03-31"})
+    r.raise_for_status()
+    return r.json()["days"]
+
+class ActivityTest(unittest.TestCase):
+    def setUp(self):
+        testing.reset()
+        testing.client().post("/users", json={"user_id": 1, "username": "u1"}).raise_for_status()
+        process_day(1, "2024-03-01", [("read", 40, True), ("rest", 0, False), ("run", 60, False)])
+        process_day(1, "2024-03-02", [("rest", 0, False)])
+
+    def test_scored_counts_logs_that_awarded_xp(self):
+        xp = {}
+        for day, _, awarded in logs(1):
+            xp.setdefault(day, []).append(awarded)
+        self.assertEqual(xp["2024-03-01"].count(0), 1)
+        want = [{"date": d, "count": len(v), "scored": sum(1 for x in v if x > 0), "xp": sum(v)}
+                for d, v in sorted(xp.items())]
+        self.assertEqual(activity(1), want)
+        self.assertEqual([d["scored"] for d in want], [2, 0])
+
+    def test_rebuild_keeps_scored(self):
+        before = activity(1)
+        with Session(bind=engine) as db:
+            crud.rebuild_daily_rollups(db, user_id=1)
+        self.assertEqual(activity(1), before)
+
+if __name__ == "__main__":
+    unittest.main()
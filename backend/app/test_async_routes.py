@@ -0,0 +1,65 @@
+# backend/app/test_async_routes.py
+"""
+app/async_routes.py: under DB_MODE=async the polled reads are native async def handlers that
+answer like the sync ones (bodies, ETags, 304s, 404s); the other db endpoints keep the
+run_sync wrapper.
+
+Run (from backend/):
+    python -m unittest app.test_async_routes      (or: python -m pytest app/test_async_routes.py)
+"""
+import inspect
+import unittest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from database import testing
+from database.testing import process_day
+from app import async_routes, main
+
+ROUTES = [("/me", main.api_me), ("/users/{user_id}", main.api_get_user),
+          ("/users/{user_id}/stats", main.api_user_stats), ("/tasks", main.api_list_tasks)]
+
+def async_app() -> FastAPI:
+    """The handlers above registered the way app/main.py does with DB_MODE=async."""
+    app = FastAPI()
+    app.router.route_class = async_routes.AsyncSessionRoute
+    for path, endpoint in ROUTES:
+        app.get(path)(endpoint)
+    return app
+
+class AsyncRoutesTest(unittest.TestCase):
+    def setUp(self):
+        testing.reset()
+        for uid in (1, 2):
+            testing.client().post("/users", json={"user_id": uid, "username": f"u{uid}"}).raise_for_status()
+        process_day(1, "2024-03-01", [("read", 40, True)]).raise_for_status()
+        self.app = async_app()
+
+    def test_hot_reads_are_native(self):
+        endpoints = {r.path: r.endpoint for r in self.app.routes if r.path in dict(ROUTES)}
+        for path in ("/me", "/users/{user_id}", "/users/{user_id}/stats"):
+            self.assertIs(endpoints[path], async_routes.NATIVE[dict(ROUTES)[path].__name__])
+        self.assertIsNot(endpoints["/tasks"], main.api_list_tasks)  # the run_sync wrapper
+        self.assertTrue(all(inspect.iscoroutinefunction(e) for e in endpoints.values()))
+
+    def test_same_answers_as_sync(self):
+        with TestClient(self.app) as client:
+            for url in ("/me?user_id=1", "/users/1", "/users/1/stats", "/tasks?user_id=1", "/users/9"):
+                with self.subTest(url=url):
+                    want, got = testing.client().get(url), client.get(url)
+                    self.assertEqual(got.status_code, want.status_code)
+                    self.assertEqual(got.json(), want.json())
+                    self.assertEqual(got.headers.get("etag"), want.headers.get("etag"))
+
+    def test_conditional_get(self):
+        with TestClient(self.app) as client:
+            first = client.get("/users/1")
+            self.assertEqual(client.get("/users/1", headers={"If-None-Match": first.headers["etag"]}).status_code, 304)
+            process_day(1, "2024-03-02", [("read", 40, True)]).raise_for_status()
+            again = client.get("/users/1", headers={"If-None-Match": first.headers["etag"]})
+            self.assertEqual(again.status_code, 200)
+            self.assertEqual(again.json()["total_xp"], testing.user_row(1)[0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+# backend/app/test_process_day.py
+"""
+POST /process-day under repeats and concurrent writers: Idempotency-Key, one day per user
+and date, and the users.version retry loop (api_process_day).
+
+Run (from backend/):
+    python -m unittest app.test_process_day      (or: python -m pytest app/test_process_day.py)
+"""
+import unittest
+from unittest import mock
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from database import testing
+from database.testing import engine, logs, process_day, user_row
+from database import crud
+from database.models import User
+from app import main
+
+DAY = [("read", 40, True), ("run", 60, True)]
+
+def concurrent_write(user_id: int, xp: int):
+    """Another writer commits to the users row (bumping users.version) in between."""
+    with engine.begin() as conn:
+        conn.execute(update(User).where(User.id == user_id)
+                     .values(total_xp=User.total_xp + xp, version=User.version + 1))
+
+class ProcessDayTest(unittest.TestCase):
+    def setUp(self):
+        testing.reset()
+        testing.client().post("/users", json={"user_id": 1, "username": "u1"}).raise_for_status()
+
+    def test_same_key_replays_the_event(self):
+        first = process_day(1, "2024-03-01", DAY, idempotency_key="k1").json()
+        again = process_day(1, "2024-03-01", DAY, idempotency_key="k1").json()
+        self.assertEqual((first["duplicate"], again["duplicate"]), (False, True))
+        self.assertEqual(again["event"], first["event"])
+        self.assertEqual(len(logs(1)), 2)
+        # the key identifies the submission even on another date (a retry across midnight)
+        late = process_day(1, "2024-03-02", [], idempotency_key="k1").json()
+        self.assertTrue(late["duplicate"])
+        self.assertEqual(late["event"], first["event"])
+        self.assertEqual(user_row(1)[4], "2024-03-01")
+
+    def test_same_date_other_key_is_a_duplicate(self):
+        first = process_day(1, "2024-03-01", DAY, idempotency_key="k1").json()
+        other = process_day(1, "2024-03-01", [("read", 40, True)], idempotency_key="k2").json()
+        self.assertTrue(other["duplicate"])
+        self.assertEqual(other["event"], first["event"])
+        self.assertEqual(user_row(1)[0], first["event"]["total_xp"])
+        nokey = process_day(1, "2024-03-01", []).json()
+        self.assertTrue(nokey["duplicate"])
+
+    def test_stale_version_recomputes(self):
+        persist_day = crud.persist_day
+        calls = []
+
+        def racing_persist_day(db, user, *args, **kwargs):
+            if not calls:
+                concurrent_write(user.id, 1000)
+            calls.append(user.version)
+            return persist_day(db, user, *args, **kwargs)
+
+        with mock.patch.object(crud, "persist_day", racing_persist_day):
+            out = process_day(1, "2024-03-01", DAY).json()
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(calls[1], calls[0] + 1)  # the retry started from the concurrent writer's row
+        self.assertFalse(out["duplicate"])
+        self.assertEqual(out["event"]["total_xp"], 1000 + out["event"]["day_xp"])
+        self.assertEqual(user_row(1)[0], out["event"]["total_xp"])
+
+    def test_concurrent_request_for_the_same_day_wins(self):
+        persist_day = crud.persist_day
+        winner = {}
+
+        def racing_persist_day(db, user, *args, **kwargs):
+            if not winner:  # another request processes the same day first
+                with mock.patch.object(crud, "persist_day", persist_day):
+                    winner.update(process_day(1, "2024-03-01", [("write", 25, False)]).json())
+            return persist_day(db, user, *args, **kwargs)
+
+        with mock.patch.object(crud, "persist_day", racing_persist_day):
+            out = process_day(1, "2024-03-01", DAY).json()
+        self.assertTrue(out["duplicate"])
+        self.assertEqual(out["event"], winner["event"])
+        self.assertEqual([name for _, name, _ in logs(1)], ["write"])
+
+    def test_out_of_retries_is_409(self):
+        persist_day = crud.persist_day
+        calls = []
+
+        def always_raced(db, user, *args, **kwargs):
+            concurrent_write(user.id, 1)
+            calls.append(1)
+            return persist_day(db, user, *args, **kwargs)
+
+        with mock.patch.object(crud, "persist_day", always_raced):
+            r = process_day(1, "2024-03-01", DAY)
+        self.assertEqual(r.status_code, 409)
+        self.assertEqual(len(calls), main.PROCESS_DAY_ATTEMPTS)
+        self.assertEqual(user_row(1)[0], len(calls))  # only the other writer's changes
+        self.assertEqual(logs(1), [])
+
+class ApplyUserEventsBulkTest(unittest.TestCase):
+    def setUp(self):
+        testing.reset()
+        for uid in (1, 2, 3):
+            testing.client().post("/users", json={"user_id": uid, "username": f"u{uid}"}).raise_for_status()
+
+    def event(self, total_xp: int, base_version=None) -> dict:
+        return {"total_xp": total_xp, "current_level": 1, "streak_days": 1, "consecutive_misses": 0,
+                "date": "2024-03-01", "base_version": base_version}
+
+    def test_writes_every_user_and_bumps_versions(self):
+        with Session(bind=engine) as db:
+            users = crud.get_users(db, [1, 2, 3])
+            before = {uid: (u.version, u.data_version) for uid, u in users.items()}
+            crud.apply_user_events_bulk(db, [(users[uid], self.event(100 * uid)) for uid in (1, 2, 3)])
+            db.commit()
+        with Session(bind=engine) as db:
+            after = crud.get_users(db, [1, 2, 3])
+            for uid, u in after.items():
+                self.assertEqual(u.total_xp, 100 * uid)
+                self.assertEqual((u.version, u.data_version), (before[uid][0] + 1, before[uid][1] + 1))
+
+    def test_stale_user_raises_before_commit(self):
+        for chunk in (1, 1000):  # one UPDATE per user, and one CASE UPDATE for all of them
+            with self.subTest(chunk=chunk), Session(bind=engine) as db:
+                users = crud.get_users(db, [1, 2, 3])
+                versions = {uid: u.version for uid, u in users.items()}
+                concurrent_write(2, 5)
+                pairs = [(users[uid], self.event(100, versions[uid])) for uid in (1, 2, 3)]
+                with self.assertRaises(crud.StaleUserError):
+                    crud.apply_user_events_bulk(db, pairs, chunk=chunk)
+                db.rollback()
+            self.assertEqual([user_row(uid)[0] for uid in (1, 3)], [0, 0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+# backend/bench/bench_crud.py
+"""
+crud-level benchmarks: the /process-day persistence path and log listing, at a given task_logs size.
+
+Usage (from backend/):
+    python bench/bench_crud.py --rows 1000
+    python bench/bench_crud.py --rows 100000
+    python bench/bench_crud.py --rows 10000000 --iterations 200    # slow to seed the first time
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+import common
+from common import latency_summary, save_results, seed, QueryCounter
+
+def timed(fn, iterations: int, counter: QueryCounter) -> dict:
+    lat = []
+    q0 = counter.count
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        lat.append(time.perf_counter() - t0)
+    out = latency_summary(lat)
+    out["ops_per_s"] = round(iterations / sum(lat), 1) if lat else 0.0
+    out["queries_per_op"] = round((counter.count - q0) / iterations, 2) if iterations else 0.0
+    return out
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="crud benchmarks")
+    parser.add_argument("--rows", type=int, default=100000, help="task_logs rows to seed (e.g. 1000, 100000, 10000000)")
+    parser.add_argument("--users", type=int, default=None, help="users to spread rows over (default rows // 5000, min 1)")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args(argv)
+    n_users = args.users or max(1, args.rows // 5000)
+
+    seed(n_users, args.rows)
+
+    from sqlalchemy import select, func, delete
+    from database.connection import engine, SessionLocal
+    from database.models import TaskLog
+    from database import crud
+
+    counter = QueryCounter(engine)
+    rnd = random.Random(7)
+    limit = args.page_size
+    logs_per_user = args.rows // n_users
+    deep_offset = max(0, min(50 * limit, int(logs_per_user * 0.8) // limit * limit))
+    results = {"rows": args.rows, "users": n_users, "page_size": limit, "deep_offset": deep_offset}
+
+    with SessionLocal() as db:
+        # cursor for the deep page of each user, so the keyset read starts where OFFSET would
+        deep_after = {}
+        for u in range(1, min(n_users, 50) + 1):
+            deep_after[u] = db.execute(
+                select(TaskLog.id).where(TaskLog.user_id == u).order_by(TaskLog.id.desc())
+                .offset(max(0, deep_offset - 1)).limit(1)
+            ).scalar()
+        users = list(deep_after)
+        pick = lambda: rnd.choice(users)
+        today = date.today()
+
+        results["list_logs_first_page"] = timed(
+            lambda: crud.list_logs_for_user(db, pick(), limit=limit), args.iterations, counter)
+        results["list_logs_deep_offset"] = timed(
+            lambda: crud.list_logs_for_user(db, pick(), limit=limit, offset=deep_offset), args.iterations, counter)
+
+        def keyset():
+            u = pick()
+            crud.list_logs_for_user(db, u, limit=limit, after_id=deep_after[u])
+        results["list_logs_deep_keyset"] = timed(keyset, args.iterations, counter)
+        results["list_logs_last_30_days"] = timed(
+            lambda: crud.list_logs_for_user(db, pick(), limit=limit, date_from=(today - timedelta(days=30)).isoformat()),
+            args.iterations, counter)
+        results["activity_365_days"] = timed(
+            lambda: crud.get_activity(db, pick(), (today - timedelta(days=364)).isoformat(), today.isoformat()),
+            args.iterations, counter)
+        db.expunge_all()
+
+        # /process-day persistence; the rows it writes are removed afterwards so the seed stays reusable
+        max_id = db.execute(select(func.max(TaskLog.id))).scalar() or 0
+        touched = set()
+
+        def persist():
+            u = pick()
+            touched.add(u)
+            user = crud.get_user(db, u)
+            entries = [{"name": f"task_{k}", "type": "habit", "base_xp": 10 + 5 * k, "required_daily": k < 2,
+                        "xp_awarded": 20, "streak_at_time": 1, "is_full_day": False, "date": today.isoformat()}
+                       for k in range(5)]
+            crud.persist_day(db, user, entries, {"total_xp": user.total_xp + 100, "date": today.isoformat()})
+        results["persist_day_5_tasks"] = timed(persist, min(args.iterations, 200), counter)
+
+        db.execute(delete(TaskLog).where(TaskLog.id > max_id))
+        db.commit()
+        for u in touched:
+            crud.rebuild_daily_rollups(db, u)
+
+    for name, r in results.items():
+        print(f"{name:28s} {r}")
+    save_results(f"crud-{args.rows}", results, args.out)
+
+if __name__ == "__main__":
+    main()
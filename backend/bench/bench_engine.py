@@ -0,0 +1,85 @@
+# backend/bench/bench_engine.py
+"""
+Micro-benchmarks for streax.engine (compute_day_xp, process_day), streax.levels and the vectorized streax.replay.
+
+Usage (from backend/):
+    python bench/bench_engine.py [--repeat 5] [--out results.json]
+"""
+import argparse
+import random
+import timeit
+
+import common  # noqa: F401  (sys.path setup)
+from common import save_results
+from streax.engine import compute_day_xp, process_day
+from streax.levels import LinearCurve, PowerCurve
+from streax.models import Task, UserState
+
+def bench(fn, number: int, repeat: int) -> dict:
+    times = timeit.repeat(fn, number=number, repeat=repeat)
+    best = min(times)
+    return {"calls": number, "best_s": round(best, 6), "ns_per_call": round(best / number * 1e9, 1),
+            "calls_per_s": round(number / best, 1)}
+
+def naive_level(total_xp: int, curve) -> int:
+    """Walk the curve one level at a time (what a per-request loop would do)."""
+    level = spent = 0
+    while spent + curve.step(level) <= total_xp:
+        spent += curve.step(level)
+        level += 1
+    return level
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", default=None, help="results JSON path (default bench/results/engine-<commit>.json)")
+    args = parser.parse_args(argv)
+
+    tasks = [Task(i, f"t{i}", "habit", 10 + i, i < 2) for i in range(5)]
+    results = {
+        "compute_day_xp_5_tasks": bench(lambda: compute_day_xp(tasks, 7, True), 200000, args.repeat),
+        "process_day_5_tasks": bench(
+            lambda: process_day(UserState(1, 500, 5, 7, "", 0), tasks, "2024-01-01", daily_target_count=2),
+            100000, args.repeat),
+        "process_day_0_tasks": bench(
+            lambda: process_day(UserState(1, 500, 5, 7, "", 0), [], "2024-01-01", daily_target_count=2),
+            100000, args.repeat),
+    }
+
+    xps = [random.Random(0).randint(0, 200_000) for _ in range(1000)]
+    for curve in (LinearCurve(), PowerCurve()):
+        results[f"level_naive_{curve.name}_1k"] = bench(lambda: [naive_level(x, curve) for x in xps], 1, args.repeat)
+        results[f"level_bisect_{curve.name}_1k"] = bench(lambda: [curve.level_for(x) for x in xps], 200, args.repeat)
+        results[f"next_threshold_{curve.name}_1k"] = bench(lambda: [curve.threshold(x % 500) for x in xps], 200,
+                                                            args.repeat)
+
+    try:
+        import numpy as np
+        from streax.replay import replay_days
+    except ImportError:
+        print("numpy not installed; skipping replay benchmark")
+    else:
+        rnd = np.random.default_rng(0)
+        n = 1_000_000
+        users = np.sort(rnd.integers(0, 20000, n))
+        days = np.arange(n)  # unique per row is enough for throughput
+        completed = rnd.integers(0, 5, n)
+        cols = dict(user_ids=users, days=days, base_xp=completed * 15, completed=completed,
+                    required_completed=np.minimum(completed, 2))
+        r = bench(lambda: replay_days(daily_target_count=2, **cols), 1, args.repeat)
+        r["user_days"] = n
+        r["user_days_per_s"] = round(n / r["best_s"], 1)
+        results["replay_days_1M_user_days"] = r
+
+        from streax.replay import level_array
+        total_xp = rnd.integers(0, 200_000, n)
+        r = bench(lambda: level_array(total_xp), 1, args.repeat)
+        r["users_per_s"] = round(n / r["best_s"], 1)
+        results["level_array_1M"] = r
+
+    for name, r in results.items():
+        print(f"{name:32s} {r}")
+    save_results("engine", results, args.out)
+
+if __name__ == "__main__":
+    main()
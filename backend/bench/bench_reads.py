@@ -0,0 +1,116 @@
+# backend/bench/bench_reads.py
+"""
+Read endpoint serialization: rows/sec of a /task-logs page, before and after the column-only path,
+and the cost of an unchanged poll (304).
+
+    orm_dicts_jsonable     crud.list_logs_for_user (ORM entities), a dict per row with isoformat(),
+                           FastAPI's jsonable_encoder + JSONResponse (the old handler)
+    core_rows_fastjson     crud.list_log_rows (column-only select, plain dicts) + FastJSONResponse
+                           (orjson when installed)
+    core_rows_stdlib_json  the same with the stdlib encoder (FastJSONResponse without orjson)
+    not_modified_304       conditional.for_user + ETag match (one primary-key read, no task_logs)
+
+Usage (from backend/):
+    python bench/bench_reads.py --rows 100000
+    python bench/bench_reads.py --rows 1000000 --page-size 1000 --iterations 200
+"""
+import argparse
+import random
+import time
+
+import common
+from common import latency_summary, save_results, seed, QueryCounter
+
+def timed(fn, iterations: int, counter: QueryCounter) -> dict:
+    lat = []
+    rows = 0
+    q0 = counter.count
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        rows += fn()
+        lat.append(time.perf_counter() - t0)
+    out = latency_summary(lat)
+    out["ops_per_s"] = round(iterations / sum(lat), 1) if lat else 0.0
+    out["rows_per_s"] = round(rows / sum(lat), 1) if lat else 0.0
+    out["queries_per_op"] = round((counter.count - q0) / iterations, 2) if iterations else 0.0
+    return out
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="read endpoint serialization benchmarks")
+    parser.add_argument("--rows", type=int, default=100000, help="task_logs rows to seed")
+    parser.add_argument("--users", type=int, default=None, help="users to spread rows over (default rows // 5000, min 1)")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args(argv)
+    n_users = args.users or max(1, args.rows // 5000)
+
+    seed(n_users, args.rows)
+
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from starlette.requests import Request
+    from database.connection import engine, SessionLocal
+    from database import crud
+    from app import conditional, fastjson
+    from app.fastjson import FastJSONResponse
+
+    counter = QueryCounter(engine)
+    rnd = random.Random(7)
+    limit = args.page_size
+    users = list(range(1, min(n_users, 50) + 1))
+    pick = lambda: rnd.choice(users)
+    results = {"rows": args.rows, "users": n_users, "page_size": limit,
+               "orjson": fastjson.orjson is not None}
+
+    with SessionLocal() as db:
+        def orm_dicts_jsonable():
+            logs = crud.list_logs_for_user(db, pick(), limit=limit)
+            out = [{
+                "id": l.id,
+                "task_id": l.task_id,
+                "user_id": l.user_id,
+                "date": l.date.isoformat(),
+                "xp_awarded": l.xp_awarded,
+                "streak_at_time": l.streak_at_time,
+                "is_full_day": bool(l.is_full_day),
+                "created_at": l.created_at.isoformat() if l.created_at else None
+            } for l in logs]
+            JSONResponse(jsonable_encoder({"logs": out, "count": len(out), "next_cursor": None}))
+            db.expunge_all()  # a request session starts with an empty identity map
+            return len(out)
+
+        def core_rows_fastjson():
+            logs = crud.list_log_rows(db, pick(), limit=limit)
+            FastJSONResponse({"logs": logs, "count": len(logs), "next_cursor": None})
+            return len(logs)
+
+        results["orm_dicts_jsonable"] = timed(orm_dicts_jsonable, args.iterations, counter)
+        results["core_rows_fastjson"] = timed(core_rows_fastjson, args.iterations, counter)
+        saved, fastjson.orjson = fastjson.orjson, None
+        try:
+            results["core_rows_stdlib_json"] = timed(core_rows_fastjson, args.iterations, counter)
+        finally:
+            fastjson.orjson = saved
+
+        etags = {u: conditional.for_user(db, u).etag for u in users}
+
+        def not_modified():
+            u = pick()
+            request = Request({"type": "http", "headers": [(b"if-none-match", etags[u].encode())]})
+            v = conditional.for_user(db, u)
+            assert v.matches(request)
+            v.not_modified()
+            return 0
+        results["not_modified_304"] = timed(not_modified, args.iterations, counter)
+        db.rollback()
+
+    for name, r in results.items():
+        print(f"{name:24s} {r}")
+    before = results["orm_dicts_jsonable"]["rows_per_s"]
+    if before:
+        print(f"core_rows_fastjson: {results['core_rows_fastjson']['rows_per_s'] / before:.2f}x rows/s of the old path")
+    save_results(f"reads-{args.rows}", results, args.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# backend/bench/common.py
+"""
+Shared helpers for the benchmark scripts.
+
+The benchmarks never touch MYSQL_URL: they run against BENCH_DB_URL
+(default: SQLite file backend/bench/bench.db), which is exported as MYSQL_URL
+before any database module is imported. Point BENCH_DB_URL at a scratch
+local MySQL database to benchmark MySQL.
+"""
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND = BENCH_DIR.parent
+RESULTS_DIR = BENCH_DIR / "results"
+
+if str(BACKEND) not in sys.path:
+    sys.path.insert(0, str(BACKEND))
+
+BENCH_DB_URL = os.getenv("BENCH_DB_URL") or f"sqlite:///{BENCH_DIR / 'bench.db'}"
+os.environ["MYSQL_URL"] = BENCH_DB_URL
+
+def percentile(sorted_values, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+def latency_summary(seconds) -> dict:
+    s = sorted(seconds)
+    ms = lambda v: round(v * 1000.0, 3)
+    return {
+        "n": len(s),
+        "mean_ms": ms(sum(s) / len(s)) if s else 0.0,
+        "p50_ms": ms(percentile(s, 50)),
+        "p95_ms": ms(percentile(s, 95)),
+        "p99_ms": ms(percentile(s, 99)),
+        "max_ms": ms(s[-1]) if s else 0.0,
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def save_results(name: str, results: dict, out: str = None) -> Path:
+    """Write {meta, results} as JSON to `out` or bench/results/<name>-<commit>.json."""
+    commit = git_commit()
+    payload = {
+        "benchmark": name,
+        "meta": {
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "db": BENCH_DB_URL.split("@")[-1],  # no credentials
+        },
+        "results": results,
+    }
+    path = Path(out) if out else RESULTS_DIR / f"{name}-{commit}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(payload, indent=2, sort_keys=True))
+    print(f"Saved {path}")
+    return path
+
+class QueryCounter:
+    """Counts statements sent to the DB by a (sync) engine via before_cursor_execute."""
+
+    def __init__(self, sync_engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(sync_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *_):
+        self.count += 1
+
+# -------------------------
+# Seeding
+# -------------------------
+def seed(n_users: int, n_logs: int, tasks_per_user: int = 5, chunk: int = 50000, seed_value: int = 42):
+    """
+    Create the schema and fill it with n_users users, tasks_per_user tasks each and
+    n_logs task_logs spread over the users and the last ~3 years (plus matching daily_rollups).
+    Skips seeding when the database already has exactly that many task_logs.
+    """
+    from sqlalchemy import insert, select, func, delete
+    from database.connection import engine
+    from database.migrate import upgrade
+    from database.models import User, Task, TaskLog, DailyRollup
+
+    upgrade(engine)
+    with engine.begin() as conn:
+        have_users = conn.execute(select(func.count()).select_from(User)).scalar()
+        have_logs = conn.execute(select(func.count()).select_from(TaskLog)).scalar()
+        if have_users == n_users and have_logs == n_logs:
+            print(f"Reusing seeded database ({n_users} users, {n_logs} task_logs).")
+            return
+        if have_users or have_logs:
+            print("Clearing previous benchmark data...")
+            for model in (DailyRollup, TaskLog, Task, User):
+                conn.execute(delete(model))
+
+    rnd = random.Random(seed_value)
+    started = time.perf_counter()
+    today = date.today()
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": u, "username": f"bench_{u}"} for u in range(1, n_users + 1)])
+        conn.execute(insert(Task), [
+            {"id": (u - 1) * tasks_per_user + k + 1, "user_id": u, "name": f"task_{k}", "type": "habit",
+             "base_xp": 10 + 5 * k, "required_daily": k < 2}
+            for u in range(1, n_users + 1) for k in range(tasks_per_user)
+        ])
+    rollups = {}
+    written = 0
+    with engine.connect() as conn:
+        while written < n_logs:
+            rows = []
+            for i in range(written, min(n_logs, written + chunk)):
+                u = rnd.randint(1, n_users)
+                d = (today - timedelta(days=rnd.randint(0, 1100))).isoformat()
+                xp = rnd.randint(5, 60)
+                rows.append({"task_id": (u - 1) * tasks_per_user + rnd.randrange(tasks_per_user) + 1,
+                             "user_id": u, "date": d, "xp_awarded": xp, "streak_at_time": 0, "is_full_day": False})
+                cnt, tot = rollups.get((u, d), (0, 0))
+                rollups[(u, d)] = (cnt + 1, tot + xp)
+            conn.execute(insert(TaskLog), rows)
+            conn.commit()
+            written += len(rows)
+            rate = written / (time.perf_counter() - started)
+            print(f"  seeded {written}/{n_logs} task_logs ({rate:.0f} rows/s)", end="\r")
+        print()
+        items = list(rollups.items())
+        for i in range(0, len(items), chunk):
+            conn.execute(insert(DailyRollup), [  # every seeded log awards XP
+                {"user_id": u, "date": d, "task_count": c, "scored_count": c, "xp_sum": x}
+                for (u, d), (c, x) in items[i:i + chunk]])
+        conn.commit()
@@ -0,0 +1,57 @@
+# backend/bench/compare.py
+"""
+Compare two benchmark result files (e.g. from two commits) and flag regressions.
+
+Usage (from backend/):
+    python bench/compare.py bench/results/crud-100000-abc123.json bench/results/crud-100000-def456.json [--threshold 10]
+
+Every numeric leaf present in both files is compared. Latencies (*_ms, *_s) and
+queries_per_* are "lower is better"; rates (*_per_s, throughput_*) are "higher is better".
+Exit code 1 if any metric regressed by more than --threshold percent.
+"""
+import argparse
+import json
+import sys
+
+def flatten(d, prefix=""):
+    out = {}
+    for k, v in d.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            out.update(flatten(v, key + "."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = float(v)
+    return out
+
+def direction(key: str):
+    leaf = key.rsplit(".", 1)[-1]
+    if leaf.endswith("_per_s") or leaf.startswith("throughput") or leaf == "calls_per_s":
+        return 1   # higher is better
+    if leaf.endswith("_ms") or leaf.endswith("_s") or leaf.startswith("queries_per") or leaf == "ns_per_call":
+        return -1  # lower is better
+    return 0       # informational (counts, sizes)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="compare two benchmark JSON files")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change counted as a regression")
+    args = parser.parse_args(argv)
+    old, new = (json.load(open(p)) for p in (args.old, args.new))
+    a, b = flatten(old["results"]), flatten(new["results"])
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']} ({old['benchmark']})")
+    regressions = 0
+    for key in sorted(set(a) & set(b)):
+        d = direction(key)
+        if d == 0 or a[key] == 0:
+            continue
+        change = (b[key] - a[key]) / a[key] * 100.0
+        worse = -change * d
+        flag = "REGRESSION" if worse > args.threshold else ("improved" if -worse > args.threshold else "")
+        regressions += flag == "REGRESSION"
+        print(f"{key:55s} {a[key]:>12.3f} {b[key]:>12.3f} {change:+8.1f}% {flag}")
+    print(f"{regressions} regression(s) over {args.threshold}%")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+# backend/bench/load_http.py
+"""
+In-process HTTP load generator: drives the FastAPI app through httpx's ASGI transport
+(no network, no server; needs httpx) with a weighted mix of endpoints against the seeded bench database.
+
+Reports throughput, p50/p95/p99 latency per endpoint and overall, and SQL queries per request.
+Run once with DB_MODE=sync and once with DB_MODE=async to compare the two stacks.
+
+Usage (from backend/):
+    python bench/load_http.py --rows 100000 --requests 5000 --concurrency 32
+    DB_MODE=async python bench/load_http.py --rows 100000 --requests 5000 --concurrency 32
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import date
+
+import common
+from common import latency_summary, save_results, seed, QueryCounter
+
+# (name, weight): the dashboard polls profile/stats far more than it writes
+MIX = [
+    ("get_user", 25),
+    ("get_stats", 25),
+    ("list_tasks", 12),
+    ("list_logs", 13),
+    ("activity", 10),
+    ("process_day", 15),
+]
+
+def make_request(name: str, user_id: int):
+    if name == "get_user":
+        return "GET", f"/users/{user_id}", None
+    if name == "get_stats":
+        return "GET", f"/users/{user_id}/stats", None
+    if name == "list_tasks":
+        return "GET", f"/tasks?user_id={user_id}&limit=50", None
+    if name == "list_logs":
+        return "GET", f"/task-logs?user_id={user_id}&limit=100", None
+    if name == "activity":
+        return "GET", f"/users/{user_id}/activity", None
+    tasks = [{"id": k, "name": f"task_{k}", "type": "habit", "base_xp": 10 + 5 * k, "required_daily": k < 2}
+             for k in range(random.randint(1, 5))]
+    # only a user's first process_day per day writes; repeats take the duplicate-replay path
+    return "POST", "/process-day", {"user": {"user_id": user_id}, "tasks": tasks}
+
+async def run_load(app, n_users: int, total: int, concurrency: int, rnd: random.Random):
+    import httpx
+    names = [n for n, _ in MIX]
+    weights = [w for _, w in MIX]
+    plan = [(rnd.choices(names, weights)[0], rnd.randint(1, n_users)) for _ in range(total)]
+    latencies = {n: [] for n in names}
+    errors = {}
+    queue = asyncio.Queue()
+    for item in plan:
+        queue.put_nowait(item)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            while True:
+                try:
+                    name, uid = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                method, url, body = make_request(name, uid)
+                t0 = time.perf_counter()
+                resp = await client.request(method, url, json=body)
+                latencies[name].append(time.perf_counter() - t0)
+                if resp.status_code >= 400:
+                    errors[f"{name}:{resp.status_code}"] = errors.get(f"{name}:{resp.status_code}", 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="in-process HTTP load test")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=None, help="default rows // 100 (min 1)")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args(argv)
+    n_users = args.users or max(1, args.rows // 100)
+
+    seed(n_users, args.rows)
+
+    from database.connection import engine, DB_MODE
+    from app.main import app
+    if DB_MODE == "async":
+        from database.async_connection import async_engine
+        counter = QueryCounter(async_engine.sync_engine)
+    else:
+        counter = QueryCounter(engine)
+
+    rnd = random.Random(11)
+    asyncio.run(run_load(app, n_users, args.warmup, args.concurrency, rnd))
+    q0 = counter.count
+    latencies, errors, elapsed = asyncio.run(run_load(app, n_users, args.requests, args.concurrency, rnd))
+    queries = counter.count - q0
+
+    all_lat = [v for vs in latencies.values() for v in vs]
+    results = {
+        "db_mode": DB_MODE,
+        "rows": args.rows,
+        "users": n_users,
+        "concurrency": args.concurrency,
+        "requests": len(all_lat),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(all_lat) / elapsed, 1),
+        "queries_per_request": round(queries / max(1, len(all_lat)), 2),
+        "errors": errors,
+        "overall": latency_summary(all_lat),
+        "endpoints": {name: latency_summary(v) for name, v in latencies.items() if v},
+    }
+    print(f"{results['requests']} requests in {elapsed:.2f}s -> {results['throughput_rps']} req/s, "
+          f"{results['queries_per_request']} queries/request, errors={errors}")
+    print(f"overall {results['overall']}")
+    for name, r in results["endpoints"].items():
+        print(f"  {name:12s} {r}")
+    save_results(f"http-{DB_MODE}-{args.rows}", results, args.out)
+
+if __name__ == "__main__":
+    main()
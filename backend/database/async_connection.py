@@ -0,0 +1,56 @@
+# backend/database/async_connection.py
+"""
+Async engine/session for DB_MODE=async.
+
+The async URL is MYSQL_ASYNC_URL if set, otherwise derived from MYSQL_URL:
+    mysql+pymysql://...  -> mysql+aiomysql://...   (pip install aiomysql)
+    sqlite:///...        -> sqlite+aiosqlite:///... (pip install aiosqlite; local stand-in)
+
+Replicas (MYSQL_REPLICA_URLS) are converted the same way; the sessions route like
+SessionLocal (connection.RoutingSession, database/routing.py).
+"""
+import os
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from starlette.requests import Request
+from .connection import (
+    DATABASE_URL, REPLICA_URLS, REQUEST_METRICS, RoutingSession, engine_options, install_statement_timeout,
+    install_pool_metrics, install_query_hooks,
+)
+from . import routing
+
+ASYNC_DRIVERS = {"mysql": "aiomysql", "sqlite": "aiosqlite"}
+
+def to_async_url(url: str) -> str:
+    u = make_url(url)
+    backend = u.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"No async driver configured for {backend!r}; set MYSQL_ASYNC_URL")
+    return u.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = os.getenv("MYSQL_ASYNC_URL") or to_async_url(DATABASE_URL)
+
+def create_configured_async_engine(url: str):
+    """Async engine with the same pool / timeout settings and hooks as the sync engines."""
+    eng = create_async_engine(url, **engine_options(url))
+    install_statement_timeout(eng.sync_engine)
+    if REQUEST_METRICS:
+        install_query_hooks(eng.sync_engine)
+    return eng
+
+async_engine = create_configured_async_engine(ASYNC_DATABASE_URL)
+async_pool_metrics = install_pool_metrics(async_engine.sync_engine)
+
+async_replica_engines = [create_configured_async_engine(to_async_url(u)) for u in REPLICA_URLS]
+async_replica_pool_metrics = [install_pool_metrics(e.sync_engine) for e in async_replica_engines]
+
+# same session options as SessionLocal
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession,
+                                       sync_session_class=RoutingSession,
+                                       replicas=[e.sync_engine for e in async_replica_engines])
+
+async def get_async_db(request: Request):
+    async with AsyncSessionLocal() as db:
+        if request.method in ("GET", "HEAD"):
+            routing.allow_replica_reads(db.sync_session)
+        yield db
@@ -0,0 +1,126 @@
+# backend/database/backfill_achievements.py
+"""
+Award achievements for history that predates the achievement rules (or after adding rules).
+
+Per chunk of users, from existing data:
+  - completion counters ("tasks", "tasks:<type>") from one GROUP BY over task_logs and
+    task_logs_archive,
+    written to achievement_counters (replacing the stored values),
+  - the longest streak from the vectorized replay of the logs (streax.replay), or the
+    current streak if that is longer, plus current total_xp / current_level; days without
+    logs count as missed days (a zero-task /process-day leaves no logs) unless --no-fill-gaps,
+then every rule whose threshold is reached is inserted unless already unlocked.
+/process-day keeps everything up to date incrementally afterwards.
+
+Counters are recomputed from the logs, so run it while no /process-day traffic is writing
+(e.g. right after `migrate.py upgrade`); unlocks themselves are idempotent.
+
+Usage (from backend/):
+    python database/backfill_achievements.py [--chunk-users 10000] [--no-fill-gaps] [--dry-run]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+here = Path(__file__).resolve().parents[1]
+if str(here) not in sys.path:
+    sys.path.insert(0, str(here))
+
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from database.connection import engine as default_engine
+from database.models import User, Task, Achievement
+from database import crud
+from database.log_archive import all_logs
+from database.rebuild_users import DAILY_TARGET_COUNT, load_user_days, user_id_chunks
+from streax import achievements
+from streax.replay import replay_days
+
+def max_streaks(conn, lo: int, hi: int, fill_gaps: bool, user_ids=None) -> dict:
+    """{user_id: longest streak_days over the replayed history}."""
+    cols = load_user_days(conn, lo, hi, user_ids)
+    if cols is None:
+        return {}
+    r = replay_days(daily_target_count=DAILY_TARGET_COUNT, fill_gaps=fill_gaps, **cols)
+    starts = np.flatnonzero(np.r_[True, r.user_ids[1:] != r.user_ids[:-1]])
+    best = np.maximum.reduceat(r.streak_days, starts)
+    return {int(u): int(b) for u, b in zip(r.user_ids[starts], best)}
+
+def _in_chunk(col, lo: int, hi: int, ids):
+    cond = [col >= lo, col < hi]
+    if ids is not None:
+        cond.append(col.in_(ids))
+    return cond
+
+def completion_counters(conn, lo: int, hi: int, user_ids=None) -> dict:
+    """{user_id: {"tasks": n, "tasks:<type>": n}} from task_logs and task_logs_archive."""
+    logs = all_logs(lambda m: _in_chunk(m.user_id, lo, hi, user_ids))
+    rows = conn.execute(
+        select(logs.c.user_id, Task.type, func.count(logs.c.id))
+        .join(Task, Task.id == logs.c.task_id)
+        .group_by(logs.c.user_id, Task.type)
+    ).all()
+    out = {}
+    for uid, type_, n in rows:
+        c = out.setdefault(uid, {"tasks": 0})
+        c["tasks"] += n
+        c[f"tasks:{type_}"] = n
+    return out
+
+def backfill(engine=None, chunk_users: int = 10000, fill_gaps: bool = True, dry_run: bool = False,
+             rules: achievements.RuleIndex = None, user_ids=None, log=print):
+    """Returns (users_seen, achievements_awarded). With user_ids, only those users (e.g. after an import)."""
+    engine = engine or default_engine
+    rules = rules or achievements.default_index
+    seen = awarded = 0
+    started = time.perf_counter()
+    with Session(bind=engine) as db:
+        conn = db.connection()
+        for lo, hi, ids in user_id_chunks(conn, chunk_users, user_ids):
+            users = conn.execute(
+                select(User.id, User.total_xp, User.current_level, User.streak_days)
+                .where(*_in_chunk(User.id, lo, hi, ids))
+            ).all()
+            streaks = max_streaks(conn, lo, hi, fill_gaps, ids)
+            counters = completion_counters(conn, lo, hi, ids)
+
+            rows = []
+            for uid, total_xp, current_level, streak_days in users:
+                values = {"total_xp": total_xp, "current_level": current_level,
+                          "streak_days": max(streak_days or 0, streaks.get(uid, 0))}
+                values.update(counters.get(uid, {}))
+                rows.extend({"user_id": uid, "name": rule.name}
+                            for field, v in values.items() for rule in rules.reached(field, v))
+            have = set()
+            if rows:
+                have = set(conn.execute(select(Achievement.user_id, Achievement.name)
+                                        .where(*_in_chunk(Achievement.user_id, lo, hi, ids))).all())
+            new = [r for r in rows if (r["user_id"], r["name"]) not in have]
+            seen += len(users)
+            awarded += len(new)
+            if not dry_run:
+                crud.upsert_achievement_counters(db, [{"user_id": uid, "name": n, "value": v}
+                                                      for uid, c in counters.items() for n, v in c.items()], add=False)
+                crud.insert_achievements_ignore(db, new)
+                db.commit()
+                conn = db.connection()
+            elapsed = time.perf_counter() - started
+            log(f"users {lo}..{hi - 1}: {len(new)} achievements ({seen / max(elapsed, 1e-9):.0f} users/s)")
+    return seen, awarded
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Award achievements from existing history")
+    parser.add_argument("--chunk-users", type=int, default=10000, help="user id range per chunk")
+    parser.add_argument("--no-fill-gaps", action="store_true", help="do not treat days without logs as missed days")
+    parser.add_argument("--dry-run", action="store_true", help="count without writing")
+    args = parser.parse_args(argv)
+    seen, awarded = backfill(chunk_users=args.chunk_users, fill_gaps=not args.no_fill_gaps, dry_run=args.dry_run)
+    verb = "would award" if args.dry_run else "awarded"
+    print(f"Done: {seen} users, {verb} {awarded} achievements.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+# backend/database/cache.py
+"""
+Read-through cache for per-user read models (profile dict, stats dict).
+
+Backends implement CacheBackend (get / set / delete / clear). InProcessCache is a
+thread-safe LRU with a TTL; RedisCache adapts any Redis-compatible client
+(redis-py, fakeredis, a local stand-in) that has get / set(ex=) / delete. Its calls are
+@offloaded (database/offload.py): under DB_MODE=async they run on a worker thread instead
+of blocking the event loop.
+
+Writes never touch the cache directly: crud calls invalidate_user(db, user_id),
+and the keys are dropped right after that session commits (or forgotten on
+rollback), so a reader cannot re-cache the pre-commit row.
+
+Config (env):
+    CACHE_BACKEND      memory (default) | redis | none
+    CACHE_TTL_SECONDS  default 10 (in-process caches are per worker, keep it short)
+    CACHE_MAX_ENTRIES  default 10000 (memory backend)
+    REDIS_URL          for CACHE_BACKEND=redis
+"""
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database import offload
+from database.offload import offloaded
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def incr(self, name: str, n: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def as_dict(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "sets": self.sets,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+        }
+
+class CacheBackend(ABC):
+    """Interface. Values are JSON-serializable dicts."""
+    name = "base"
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: dict, ttl: float):
+        ...
+
+    @abstractmethod
+    def delete(self, *keys: str):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    def size(self) -> Optional[int]:
+        return None
+
+class NullCache(CacheBackend):
+    name = "none"
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+class InProcessCache(CacheBackend):
+    """LRU (OrderedDict) bounded by max_entries, entries expire after their TTL."""
+    name = "memory"
+
+    def __init__(self, max_entries: int = 10000):
+        super().__init__()
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.stats.incr("evictions")
+
+    def delete(self, *keys):
+        with self._lock:
+            for k in keys:
+                self._data.pop(k, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def size(self):
+        return len(self._data)
+
+class RedisCache(CacheBackend):
+    """Adapter for a Redis-compatible client: get(key), set(key, value, ex=seconds), delete(*keys)."""
+    name = "redis"
+
+    def __init__(self, client, prefix: str = "streax:"):
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+
+    @offloaded
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    @offloaded
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+
+    @offloaded
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + k for k in keys])
+
+    @offloaded
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + "*")) if hasattr(self.client, "scan_iter") else []
+        if keys:
+            self.client.delete(*keys)
+
+def _backend_from_env() -> CacheBackend:
+    kind = os.getenv("CACHE_BACKEND", "memory").lower()
+    if kind == "none":
+        return NullCache()
+    if kind == "redis":
+        try:
+            import redis  # optional dependency
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis needs the redis package (pip install redis)")
+        return RedisCache(redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0")))
+    return InProcessCache(max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "10000")))
+
+TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "10"))
+backend: CacheBackend = _backend_from_env()
+
+def set_backend(new_backend: CacheBackend, ttl: float = None):
+    """Swap the cache backend (tests, or wiring a Redis stand-in at startup)."""
+    global backend, TTL_SECONDS
+    backend = new_backend
+    if ttl is not None:
+        TTL_SECONDS = ttl
+
+# -------------------------
+# Keys and read-through helper
+# -------------------------
+def user_keys(user_id: int):
+    return [f"user:{user_id}", f"stats:{user_id}"]
+
+def get_or_load(key: str, loader: Callable[[], Optional[dict]], store: bool = True) -> Optional[dict]:
+    """
+    Return the cached value for key, else call loader() and cache a non-None result.
+    store=False serves the loaded value without caching it (loaded from a replica that may lag).
+    """
+    value = backend.get(key)
+    if value is not None:
+        backend.stats.incr("hits")
+        return dict(value)
+    backend.stats.incr("misses")
+    value = loader()
+    if value is not None and store:
+        backend.set(key, dict(value), TTL_SECONDS)
+        backend.stats.incr("sets")
+    return value
+
+async def get_or_load_async(key: str, loader, store: bool = True) -> Optional[dict]:
+    """get_or_load for async def handlers: loader is a coroutine function; backend calls go through offload.call."""
+    value = await offload.call(backend.get, key)
+    if value is not None:
+        backend.stats.incr("hits")
+        return dict(value)
+    backend.stats.incr("misses")
+    value = await loader()
+    if value is not None and store:
+        await offload.call(backend.set, key, dict(value), TTL_SECONDS)
+        backend.stats.incr("sets")
+    return value
+
+# -------------------------
+# Invalidation (applied after commit)
+# -------------------------
+def invalidate_user(db: Session, user_id: int):
+    """Mark a user's cached read models stale; keys are deleted once `db` commits."""
+    db.info.setdefault("cache_invalidate", set()).add(user_id)
+
+def pending_invalidations(session) -> set:
+    """Users marked by invalidate_user() in the session's current transaction (database/user_versions.py)."""
+    return session.info.get("cache_invalidate") or set()
+
+@event.listens_for(Session, "after_commit")
+def _flush_invalidations(session):
+    user_ids = session.info.pop("cache_invalidate", None)
+    if not user_ids:
+        return
+    keys = [k for uid in user_ids for k in user_keys(uid)]
+    backend.delete(*keys)
+    backend.stats.incr("invalidations", len(user_ids))
+
+@event.listens_for(Session, "after_rollback")
+def _drop_invalidations(session):
+    session.info.pop("cache_invalidate", None)
+
+def stats() -> dict:
+    out = {"backend": backend.name, "ttl_seconds": TTL_SECONDS, "entries": backend.size()}
+    out.update(backend.stats.as_dict())
+    return out
@@ -1,7 +1,12 @@
 # backend/database/connection.py
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+import itertools
 import os
+import threading
+import time
+from contextvars import ContextVar
 from dotenv import load_dotenv
 
 load_dotenv()  # loads from backend/.env by default
@@ -10,10 +15,203 @@ DATABASE_URL = os.getenv("MYSQL_URL")
 if not DATABASE_URL:
     raise RuntimeError("Please set MYSQL_URL in backend/.env")
 
+# "sync" (default): blocking sessions on Starlette's threadpool
+# "async": AsyncEngine + async endpoints (see database/async_connection.py)
+DB_MODE = os.getenv("DB_MODE", "sync").lower()
+
+# -------------------------
+# Pool / engine tuning (env)
+# -------------------------
+def _env_int(name: str, default: int) -> int:
+    v = os.getenv(name)
+    return int(v) if v not in (None, "") else default
+
+def _env_bool(name: str, default: bool) -> bool:
+    v = os.getenv(name)
+    return default if v in (None, "") else v.strip().lower() in ("1", "true", "yes", "on")
+
+POOL_SIZE = _env_int("DB_POOL_SIZE", 10)
+MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 20)
+POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 10)         # seconds to wait for a connection before TimeoutError
+POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)       # seconds; keep below MySQL wait_timeout ("server has gone away")
+POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+ISOLATION_LEVEL = os.getenv("DB_ISOLATION_LEVEL") or None  # e.g. "READ COMMITTED"; default: server default
+STATEMENT_TIMEOUT_MS = _env_int("DB_STATEMENT_TIMEOUT_MS", 0)  # 0 = no limit
+
+# Read replicas (optional): comma-separated URLs; see database/routing.py
+REPLICA_URLS = [u.strip() for u in os.getenv("MYSQL_REPLICA_URLS", "").split(",") if u.strip()]
+
+def engine_options(url: str) -> dict:
+    """create_engine / create_async_engine keyword arguments for `url` from the settings above."""
+    opts = {"echo": False, "pool_pre_ping": POOL_PRE_PING, "pool_recycle": POOL_RECYCLE}
+    u = make_url(url)
+    # in-memory SQLite uses a single shared connection pool without sizing options
+    if not (u.get_backend_name() == "sqlite" and u.database in (None, "", ":memory:")):
+        opts.update(pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW, pool_timeout=POOL_TIMEOUT)
+    if ISOLATION_LEVEL:
+        opts["isolation_level"] = ISOLATION_LEVEL
+    return opts
+
+def install_statement_timeout(sync_engine, timeout_ms: int = None):
+    """Apply a per-session statement timeout on every new DBAPI connection (MySQL: MAX_EXECUTION_TIME, SELECTs only)."""
+    timeout_ms = STATEMENT_TIMEOUT_MS if timeout_ms is None else timeout_ms
+    if not timeout_ms or sync_engine.dialect.name != "mysql":
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_timeout(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        try:
+            cur.execute(f"SET SESSION MAX_EXECUTION_TIME={int(timeout_ms)}")
+        finally:
+            cur.close()
+
+# -------------------------
+# Pool metrics (pool events)
+# -------------------------
+class PoolMetrics:
+    """Counters and gauges from pool connect/checkout/checkin/invalidate events."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.overflow_checkouts = 0  # checkouts that needed a connection beyond pool_size
+
+    def on_connect(self, *_):
+        with self._lock:
+            self.connects += 1
+
+    def on_checkout(self, *_):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            size = getattr(self.pool, "size", None)
+            if callable(size) and self.checked_out > size():
+                self.overflow_checkouts += 1
+
+    def on_checkin(self, *_):
+        with self._lock:
+            self.checkins += 1
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def on_invalidate(self, *_):
+        with self._lock:
+            self.invalidations += 1
+
+    def as_dict(self) -> dict:
+        out = {
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "invalidations": self.invalidations,
+            "checked_out": self.checked_out,
+            "max_checked_out": self.max_checked_out,
+            "overflow_checkouts": self.overflow_checkouts,
+        }
+        # live QueuePool gauges where the pool class has them
+        for name in ("size", "checkedin", "overflow"):
+            fn = getattr(self.pool, name, None)
+            if callable(fn):
+                out[f"pool_{name}"] = fn()
+        return out
+
+def install_pool_metrics(sync_engine) -> PoolMetrics:
+    m = PoolMetrics(sync_engine.pool)
+    event.listen(sync_engine.pool, "connect", m.on_connect)
+    event.listen(sync_engine.pool, "checkout", m.on_checkout)
+    event.listen(sync_engine.pool, "checkin", m.on_checkin)
+    event.listen(sync_engine.pool, "invalidate", m.on_invalidate)
+    return m
+
+# -------------------------
+# Per-request query stats (before/after_cursor_execute)
+# -------------------------
+# Off by default; when off the hooks are not installed at all.
+REQUEST_METRICS = _env_bool("REQUEST_METRICS", False)
+
+class QueryStats:
+    """Statements run while handling one request (set by app/metrics.py)."""
+    __slots__ = ("count", "db_time", "slowest_time", "slowest_sql")
+
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql = ""
+
+    def add(self, statement: str, seconds: float):
+        self.count += 1
+        self.db_time += seconds
+        if seconds > self.slowest_time:
+            self.slowest_time = seconds
+            self.slowest_sql = statement
+
+current_query_stats: ContextVar = ContextVar("current_query_stats", default=None)
+
+def install_query_hooks(sync_engine):
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if current_query_stats.get() is not None:
+            conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stats = current_query_stats.get()
+        starts = conn.info.get("query_start")
+        if stats is None or not starts:
+            return
+        stats.add(statement, time.perf_counter() - starts.pop())
+
+# -------------------------
+# Replica routing session
+# -------------------------
+_replica_turn = itertools.count()
+
+class RoutingSession(Session):
+    """
+    Session bound to the primary, with optional read replicas (sync engines). While
+    database/routing.py has switched the session to replica reads (info["replica_reads"] > 0)
+    statements go to one replica, picked round-robin when the session first needs one and
+    kept for the session's lifetime (a request sees one replica's timeline); everything else,
+    and any flush, goes to the primary.
+    """
+
+    def __init__(self, *args, replicas=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = list(replicas)
+        self.replica = None
+
+    def get_bind(self, mapper=None, **kw):
+        if self.replicas and self.info.get("replica_reads") and not self._flushing:
+            if self.replica is None:
+                self.replica = self.replicas[next(_replica_turn) % len(self.replicas)]
+            return self.replica
+        return super().get_bind(mapper, **kw)
+
+def create_configured_engine(url: str):
+    """Sync engine for `url` with the pool settings, statement timeout and query hooks above."""
+    eng = create_engine(url, future=True, **engine_options(url))
+    install_statement_timeout(eng)
+    if REQUEST_METRICS:
+        install_query_hooks(eng)
+    return eng
+
 # echo=True prints SQL for debugging (turn off in production)
-engine = create_engine(DATABASE_URL, echo=False, future=True)
+engine = create_configured_engine(DATABASE_URL)
+pool_metrics = install_pool_metrics(engine)
+
+replica_engines = [create_configured_engine(u) for u in REPLICA_URLS]
+replica_pool_metrics = [install_pool_metrics(e) for e in replica_engines]
 
 # Use expire_on_commit=False so objects remain usable after commit (handy)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
+SessionLocal = sessionmaker(bind=engine, class_=RoutingSession, replicas=replica_engines,
+                            autoflush=False, autocommit=False, expire_on_commit=False, future=True)
 
 Base = declarative_base()
@@ -43,11 +43,12 @@ try:
 finally:
     conn.close()
 
-# Now create tables using SQLAlchemy
+# Now create tables / apply schema upgrades using SQLAlchemy
 # Use absolute imports (backend is on sys.path)
-from database.connection import engine, Base
-from database.models import User, Task, TaskLog, Achievement
+# (create_all alone cannot add indexes/columns to existing tables, so go through the migrations)
+from database.connection import engine
+from database.migrate import upgrade
 
-print("Creating tables (if not exist)...")
-Base.metadata.create_all(bind=engine)
-print("Tables created.")
+print("Creating tables and applying migrations...")
+version = upgrade(engine)
+print(f"Tables ready (schema version {version}).")
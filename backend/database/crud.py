@@ -1,8 +1,154 @@
 # backend/database/crud.py
+from sqlalchemy import Integer, String, select, insert, update, and_, or_, func, case, column, tuple_, values
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import Session
-from database.models import User as ORMUser, Task as ORMTask, TaskLog
-from datetime import datetime
-from typing import List, Dict
+from sqlalchemy.sql.expression import Values
+from sqlalchemy.orm.attributes import set_committed_value
+from database.models import (User as ORMUser, Task as ORMTask, TaskLog, TaskLogArchive, DailyRollup, DayEvent,
+                             Achievement, AchievementCounter, UserStatsAgg)
+from database import cache, leaderboard
+from database import routing
+from database.routing import replica_read
+from database import log_archive, user_versions
+from streax import achievements, levels, stats
+import json
+from datetime import date, datetime
+from typing import List, Dict, Optional, Tuple
+
+class StaleUserError(Exception):
+    """A user row changed between read and write (users.version did not match)."""
+
+# -------------------------
+# Statement builders for the hot read queries
+# (shared with database/migrate.py `check`, which EXPLAINs them)
+# -------------------------
+def user_by_username_stmt(username: str):
+    return select(ORMUser).where(ORMUser.username == username).limit(1)
+
+def task_by_name_stmt(user_id: int, name: str):
+    return select(ORMTask).where(ORMTask.user_id == user_id, ORMTask.name == name).order_by(ORMTask.id.asc()).limit(1)
+
+def tasks_by_keys_stmt(keys: List[Tuple[int, str]]):
+    # tasks joined against the pairs as a VALUES list: one ix_tasks_user_id_name lookup per pair.
+    # (user_id IN (...) AND name IN (...) probes every combination; a row-value IN is a full
+    # index scan on SQLite.) Callers keep the oldest id per pair.
+    pairs = (
+        values(column("user_id", Integer), column("name", String), name="task_keys")
+        .data(sorted(set(keys)))
+        .cte("task_keys")
+    )
+    return (
+        select(ORMTask.user_id, ORMTask.name, ORMTask.id)
+        .join(pairs, and_(ORMTask.user_id == pairs.c.user_id, ORMTask.name == pairs.c.name))
+    )
+
+@compiles(Values, "mysql")
+def _mysql_values(element, compiler, visiting_cte=None, **kw):
+    """MySQL (8.0.19+) writes a table value constructor as VALUES ROW(...), ROW(...)."""
+    if visiting_cte is None or visiting_cte.element is not element:
+        return compiler.visit_values(element, visiting_cte=visiting_cte, **kw)
+    kw.setdefault("literal_binds", element.literal_binds)
+    rows = (compiler.process(tuple_(*row, types=element._column_types).self_group(), **kw)
+            for chunk in element._data for row in chunk)
+    return "VALUES " + ", ".join("ROW" + r for r in rows)
+
+# plain columns of the list endpoints (list_task_rows / list_log_rows)
+TASK_COLUMNS = ("id", "user_id", "name", "type", "base_xp", "required_daily", "created_at")
+LOG_COLUMNS = ("id", "task_id", "user_id", "date", "xp_awarded", "streak_at_time", "is_full_day", "created_at")
+
+def tasks_for_user_stmt(user_id: int, after_id: int = None, columns: bool = False):
+    q = select(*[getattr(ORMTask, c) for c in TASK_COLUMNS]) if columns else select(ORMTask)
+    q = q.where(ORMTask.user_id == user_id)
+    if after_id is not None:
+        q = q.where(ORMTask.id > after_id)
+    return q.order_by(ORMTask.id.asc())
+
+def logs_for_user_stmt(user_id: int, after_id: int = None, date_from: str = None, date_to: str = None,
+                       after_date: str = None, cold: bool = False, columns: bool = False):
+    """
+    Newest first. Without a date range: ordered by id desc (ix_task_logs_user_id_id), keyset on id.
+    With a date range: ordered by (date desc, id desc) (ix_task_logs_user_id_date), keyset on (date, id),
+    because imported history does not have ids in date order.
+    cold=True reads task_logs_archive instead (same indexes). columns=True selects LOG_COLUMNS, not entities.
+    """
+    model = TaskLogArchive if cold else TaskLog
+    q = select(*[getattr(model, c) for c in LOG_COLUMNS]) if columns else select(model)
+    q = q.where(model.user_id == user_id)
+    if date_from is None and date_to is None:
+        if after_id is not None:
+            q = q.where(model.id < after_id)
+        return q.order_by(model.id.desc())
+    if date_from is not None:
+        q = q.where(model.date >= date_from)
+    if date_to is not None:
+        q = q.where(model.date <= date_to)
+    if after_id is not None and after_date is not None:
+        q = q.where(or_(model.date < after_date, and_(model.date == after_date, model.id < after_id)))
+    return q.order_by(model.date.desc(), model.id.desc())
+
+EXPORT_COLUMNS = ("id", "user_id", "task_id", "task_name", "date", "xp_awarded", "streak_at_time",
+                  "is_full_day", "created_at")
+
+def logs_export_stmt(user_id: int = None, date_from: str = None, date_to: str = None, include_cold: bool = False):
+    """
+    Task log rows (with the task name) oldest first, as plain columns for streaming.
+    Per user: ordered by id (ix_task_logs_user_id_id), or by (date, id) with a date range
+    (ix_task_logs_user_id_date). Without user_id the whole table is read in primary key order.
+    include_cold: task_logs_archive rows too (log_archive.all_logs); archived rows of a deleted task keep
+    the name stored at archive time.
+    """
+    def where(model):
+        cond = []
+        if user_id is not None:
+            cond.append(model.user_id == user_id)
+        if date_from is not None:
+            cond.append(model.date >= date_from)
+        if date_to is not None:
+            cond.append(model.date <= date_to)
+        return cond
+
+    if include_cold:
+        logs = log_archive.all_logs(where, names=("id", "user_id", "task_id", "task_name", "date", "xp_awarded",
+                                                  "streak_at_time", "is_full_day", "created_at"))
+        q = (
+            select(logs.c.id, logs.c.user_id, logs.c.task_id,
+                   func.coalesce(ORMTask.name, logs.c.task_name).label("task_name"), logs.c.date,
+                   logs.c.xp_awarded, logs.c.streak_at_time, logs.c.is_full_day, logs.c.created_at)
+            .outerjoin(ORMTask, ORMTask.id == logs.c.task_id)
+        )
+    else:
+        logs = TaskLog.__table__
+        q = (
+            select(TaskLog.id, TaskLog.user_id, TaskLog.task_id, ORMTask.name.label("task_name"), TaskLog.date,
+                   TaskLog.xp_awarded, TaskLog.streak_at_time, TaskLog.is_full_day, TaskLog.created_at)
+            .outerjoin(ORMTask, ORMTask.id == TaskLog.task_id)
+            .where(*where(TaskLog))
+        )
+    if user_id is not None and (date_from is not None or date_to is not None):
+        return q.order_by(logs.c.date.asc(), logs.c.id.asc())
+    return q.order_by(logs.c.id.asc())
+
+def day_event_stmt(user_id: int, date_iso: str, idempotency_key: str = None):
+    # both branches are covered by a unique index (uq_day_events_user_id_date / _key)
+    cond = DayEvent.date == date_iso
+    if idempotency_key:
+        cond = or_(cond, DayEvent.idempotency_key == idempotency_key)
+    return select(DayEvent.event).where(DayEvent.user_id == user_id, cond).limit(1)
+
+def user_stats_stmt(user_id: int):
+    """users row and its user_stats_agg row (primary-key lookups, one round trip)."""
+    return (
+        select(ORMUser, UserStatsAgg)
+        .outerjoin(UserStatsAgg, UserStatsAgg.user_id == ORMUser.id)
+        .where(ORMUser.id == user_id)
+    )
+
+def activity_stmt(user_id: int, date_from: str, date_to: str):
+    return (
+        select(DailyRollup.date, DailyRollup.task_count, DailyRollup.scored_count, DailyRollup.xp_sum)
+        .where(DailyRollup.user_id == user_id, DailyRollup.date >= date_from, DailyRollup.date <= date_to)
+        .order_by(DailyRollup.date.asc())
+    )
 
 def create_user(db: Session, username: str, user_id: int = None) -> ORMUser:
     """Create a user row. If user_id provided and exists, return it instead."""
@@ -12,23 +158,58 @@ def create_user(db: Session, username: str, user_id: int = None) -> ORMUser:
             return u
     user = ORMUser(username=username)
     db.add(user)
+    db.flush()
+    leaderboard.record_scores(db, user.id, 0, 0)
     db.commit()
     db.refresh(user)
     return user
 
+@replica_read
 def get_user(db: Session, user_id: int):
     return db.get(ORMUser, user_id)
 
+@replica_read
+def get_user_profile(db: Session, user_id: int):
+    """
+    User row as a plain dict (read-through cached; see database/cache.py).
+    "data_version" is the users.data_version the dict was loaded at (for ETags; not part of the API body).
+    """
+    return cache.get_or_load(f"user:{user_id}", lambda: profile_dict(db.get(ORMUser, user_id)),
+                             store=not routing.on_replica(db))
+
+def profile_dict(u: Optional[ORMUser]) -> Optional[dict]:
+    """The cached profile dict of a users row (None for None)."""
+    if not u:
+        return None
+    return {
+        "id": u.id,
+        "username": u.username,
+        "total_xp": u.total_xp,
+        "current_level": u.current_level,
+        "streak_days": u.streak_days,
+        "last_active_date": u.last_active_date,
+        "consecutive_misses": u.consecutive_misses,
+        "data_version": u.data_version,
+    }
+
+def get_usernames(db: Session, user_ids: List[int]) -> Dict[int, str]:
+    """{user_id: username} for the given ids in one query."""
+    if not user_ids:
+        return {}
+    rows = db.execute(select(ORMUser.id, ORMUser.username).where(ORMUser.id.in_(set(user_ids)))).all()
+    return dict(rows)
+
 def get_user_by_username(db: Session, username: str):
-    return db.query(ORMUser).filter(ORMUser.username == username).first()
+    return db.execute(user_by_username_stmt(username)).scalars().first()
 
 def ensure_task(db: Session, user_id: int, name: str, type_: str, base_xp: int, required_daily: bool):
     """Ensure a task exists for the user; create if missing. Return ORMTask."""
-    t = db.query(ORMTask).filter(ORMTask.user_id == user_id, ORMTask.name == name).first()
+    t = db.execute(task_by_name_stmt(user_id, name)).scalars().first()
     if t:
         return t
     t = ORMTask(user_id=user_id, name=name, type=type_, base_xp=base_xp, required_daily=required_daily)
     db.add(t)
+    cache.invalidate_user(db, user_id)
     db.commit()
     db.refresh(t)
     return t
@@ -49,6 +230,7 @@ def create_task_logs(db: Session, user_id: int, task_awards: List[Dict]):
         )
         db.add(log)
         logs.append(log)
+    cache.invalidate_user(db, user_id)
     db.commit()
     # refresh logs
     for l in logs:
@@ -64,31 +246,580 @@ def update_user_after_event(db: Session, user: ORMUser, event: dict):
     user.streak_days = event.get("streak_days", user.streak_days)
     user.consecutive_misses = event.get("consecutive_misses", user.consecutive_misses)
     user.last_active_date = event.get("date", user.last_active_date)
+    user.version = ORMUser.version + 1
     db.add(user)
+    cache.invalidate_user(db, user.id)
+    leaderboard.record_scores(db, user.id, user.total_xp, user.streak_days)
     db.commit()
     db.refresh(user)
     return user
 
+# -------------------------
+# Bulk write helpers (no commit; caller owns the transaction)
+# -------------------------
+TASK_LOOKUP_CHUNK = 2000   # (user_id, name) pairs per task lookup
+WRITE_CHUNK = 5000         # rows per multi-row INSERT
+USER_UPDATE_CHUNK = 500    # users per CASE-based UPDATE
+
+def _chunks(seq: List, size: int):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+def get_users(db: Session, user_ids: List[int], chunk: int = 1000) -> Dict[int, ORMUser]:
+    """{user_id: ORMUser} for the given ids, loaded with chunked IN (...) queries."""
+    out = {}
+    ids = list(set(user_ids))
+    for part in _chunks(ids, chunk):
+        for u in db.execute(select(ORMUser).where(ORMUser.id.in_(part))).scalars():
+            out[u.id] = u
+    return out
+
+def ensure_users_bulk(db: Session, usernames: List[str], chunk: int = 1000) -> Dict[str, int]:
+    """
+    {username: user_id}, inserting the missing users with one multi-row INSERT per chunk.
+    New users are not pushed to the leaderboard (callers rebuild it). Does not commit.
+    """
+    out = {}
+    names = list(dict.fromkeys(usernames))
+    for part in _chunks(names, chunk):
+        lookup = lambda ns: db.execute(select(ORMUser.username, ORMUser.id).where(ORMUser.username.in_(ns))).all()
+        found = dict(lookup(part))
+        missing = [n for n in part if n not in found]
+        if missing:
+            db.execute(insert(ORMUser), [{"username": n} for n in missing])
+            found.update(lookup(missing))
+        out.update(found)
+    return out
+
+def ensure_tasks_bulk(db: Session, specs: List[Dict]) -> Dict[Tuple[int, str], int]:
+    """
+    specs: list of dicts with keys: user_id, name, type, base_xp, required_daily
+    Looks up all (user_id, name) pairs in one query and inserts the missing ones
+    in one multi-row INSERT. Returns {(user_id, name): task_id}. Does not commit.
+    """
+    wanted = {}
+    for s in specs:
+        wanted.setdefault((s["user_id"], s["name"]), s)
+    if not wanted:
+        return {}
+
+    def lookup(keys):
+        found = {}
+        rows = db.execute(tasks_by_keys_stmt(keys)).all()
+        for uid, name, tid in rows:
+            found[(uid, name)] = min(tid, found.get((uid, name), tid))  # oldest task wins, like ensure_task
+        return found
+
+    ids = lookup(wanted.keys())
+    missing = [k for k in wanted if k not in ids]
+    if missing:
+        db.execute(insert(ORMTask), [{
+            "user_id": k[0],
+            "name": k[1],
+            "type": wanted[k]["type"],
+            "base_xp": wanted[k]["base_xp"],
+            "required_daily": wanted[k].get("required_daily", False),
+        } for k in missing])
+        # MySQL has no INSERT ... RETURNING, so read the new ids back in one query
+        ids.update(lookup(missing))
+        for uid in {k[0] for k in missing}:
+            cache.invalidate_user(db, uid)
+    return ids
+
+def create_task_logs_bulk(db: Session, rows: List[Dict]):
+    """
+    rows: list of dicts with keys: task_id, user_id, date, xp_awarded, streak_at_time, is_full_day
+    Inserts all rows with one executemany. Does not commit.
+    """
+    if not rows:
+        return 0
+    db.execute(insert(TaskLog.__table__), [{  # Core insert: skips the ORM bulk-insert bookkeeping
+        "task_id": r["task_id"],
+        "user_id": r["user_id"],
+        "date": r["date"],
+        "xp_awarded": r.get("xp_awarded", 0),
+        "streak_at_time": r.get("streak_at_time", 0),
+        "is_full_day": r.get("is_full_day", False),
+    } for r in rows])
+    for uid in {r["user_id"] for r in rows}:
+        cache.invalidate_user(db, uid)
+    return len(rows)
+
+def apply_user_event(db: Session, user: ORMUser, event: dict):
+    """Single UPDATE of the user row from an engine event; keeps the ORM object in sync. Does not commit."""
+    apply_user_events_bulk(db, [(user, event)])
+    return user
+
+def _event_values(user: ORMUser, event: dict) -> dict:
+    return {
+        "total_xp": event.get("total_xp", user.total_xp),
+        "current_level": event.get("current_level", user.current_level),
+        "streak_days": event.get("streak_days", user.streak_days),
+        "consecutive_misses": event.get("consecutive_misses", user.consecutive_misses),
+        "last_active_date": event.get("date", user.last_active_date),
+    }
+
+def apply_user_events_bulk(db: Session, pairs: List[Tuple[ORMUser, dict]], chunk: int = USER_UPDATE_CHUNK):
+    """
+    Write engine results for many users: one UPDATE ... SET col = CASE id ... END WHERE id IN (...)
+    per chunk (a plain UPDATE for a single user). A user listed twice keeps its last event.
+    The same UPDATE bumps the users' data versions (database/user_versions.py), so the commit hook
+    does not issue a second UPDATE for them.
+    Each row is only written if users.version still matches the version the event was computed
+    from (event["base_version"]; default: the loaded user's) and the version is bumped; otherwise
+    StaleUserError is raised and the caller should roll back and recompute. Pass base_version when
+    `user` may have been reloaded since the event was computed: a rollback expires the ORM object,
+    so user.version would then be the concurrent writer's, and the check would pass on stale values.
+    Keeps the ORM objects in sync. Does not commit.
+    """
+    latest = {}
+    for user, event in pairs:
+        expected = event.get("base_version")
+        latest[user.id] = (user, _event_values(user, event), user.version if expected is None else expected)
+    items = list(latest.values())
+    for part in _chunks(items, chunk):
+        if len(part) == 1:
+            user, values, expected = part[0]
+            stmt = (
+                update(ORMUser)
+                .where(ORMUser.id == user.id, ORMUser.version == expected)
+                .values(version=ORMUser.version + 1, **values, **user_versions.bump_values())
+            )
+        else:
+            ids = [u.id for u, _, _ in part]
+            stmt = (
+                update(ORMUser)
+                .where(ORMUser.id.in_(ids), ORMUser.version == case({u.id: e for u, _, e in part}, value=ORMUser.id))
+                .values({col: case({u.id: v[col] for u, v, _ in part}, value=ORMUser.id) for col in part[0][1]})
+                .values(version=ORMUser.version + 1, **user_versions.bump_values())
+            )
+        result = db.execute(stmt.execution_options(synchronize_session=False))
+        if result.rowcount != len(part):
+            raise StaleUserError(f"{len(part) - result.rowcount} of {len(part)} users changed concurrently")
+        user_versions.mark_bumped(db, [item[0].id for item in part])
+    for user, values, expected in items:
+        cache.invalidate_user(db, user.id)
+        leaderboard.record_scores(db, user.id, values["total_xp"], values["streak_days"])
+        # the session only tracks the row through `user`, so set attributes without a refresh SELECT
+        for k, v in values.items():
+            set_committed_value(user, k, v)
+        set_committed_value(user, "version", expected + 1)
+
+
+def refresh_read_models(db: Session, user_ids, chunk: int = 1000):
+    """
+    After a bulk job rewrote users rows behind the ORM (import, rebuild): drop their cached
+    read models and push their current scores to the leaderboard. Commits.
+    """
+    for part in _chunks(sorted(set(user_ids)), chunk):
+        rows = db.execute(select(ORMUser.id, ORMUser.total_xp, ORMUser.streak_days).where(ORMUser.id.in_(part))).all()
+        for uid, total_xp, streak_days in rows:
+            cache.invalidate_user(db, uid)
+            leaderboard.record_scores(db, uid, total_xp, streak_days)
+        db.commit()
+
+def _upsert_rollups(db: Session, rows: List[Dict], chunk: int = WRITE_CHUNK):
+    """
+    rows: list of dicts with keys: user_id, date, task_count, scored_count, xp_sum
+    Adds the counts onto existing daily_rollups rows (INSERT ... ON DUPLICATE KEY UPDATE on MySQL,
+    ON CONFLICT on SQLite). Does not commit.
+    """
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(DailyRollup)
+        stmt = stmt.on_duplicate_key_update(
+            task_count=DailyRollup.task_count + stmt.inserted.task_count,
+            scored_count=DailyRollup.scored_count + stmt.inserted.scored_count,
+            xp_sum=DailyRollup.xp_sum + stmt.inserted.xp_sum,
+        )
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(DailyRollup)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DailyRollup.user_id, DailyRollup.date],
+            set_={
+                "task_count": DailyRollup.task_count + stmt.excluded.task_count,
+                "scored_count": DailyRollup.scored_count + stmt.excluded.scored_count,
+                "xp_sum": DailyRollup.xp_sum + stmt.excluded.xp_sum,
+            },
+        )
+    for part in _chunks(rows, chunk):
+        db.execute(stmt, part)
+
+def add_to_daily_rollups(db: Session, log_rows: List[Dict]):
+    """Fold TaskLog-shaped rows (user_id, date, xp_awarded) into daily_rollups. Does not commit."""
+    totals = {}
+    for r in log_rows:
+        key = (r["user_id"], r["date"])
+        cnt, scored, xp = totals.get(key, (0, 0, 0))
+        awarded = r.get("xp_awarded") or 0
+        totals[key] = (cnt + 1, scored + (awarded > 0), xp + awarded)
+    _upsert_rollups(db, [
+        {"user_id": uid, "date": d, "task_count": cnt, "scored_count": scored, "xp_sum": xp}
+        for (uid, d), (cnt, scored, xp) in totals.items()
+    ])
+
+def persist_day(db: Session, user: ORMUser, entries: List[Dict], event: dict, day_event: Dict = None):
+    """
+    Persist one processed day in a single transaction:
+    one task lookup, bulk insert of missing tasks and all TaskLog rows, daily_rollups upsert,
+    one user UPDATE, one commit.
+    entries: list of dicts with keys: name, type, base_xp, required_daily, xp_awarded, streak_at_time, is_full_day, date
+    event: same keys as update_user_after_event, plus optional base_version (see apply_user_events_bulk)
+    day_event: optional dict with keys: event (engine event), idempotency_key; recorded in day_events
+    Returns (user, {task name: task_id}).
+    """
+    task_ids = persist_days(db, [(user, entries, event)],
+                            [dict(day_event, user_id=user.id, date=event["date"])] if day_event else None)
+    return user, {name: tid for (_, name), tid in task_ids.items()}
+
+def persist_days(db: Session, days: List[Tuple[ORMUser, List[Dict], dict]],
+                 day_events: List[Dict] = None) -> Dict[Tuple[int, str], int]:
+    """
+    Multi-user version of persist_day, still one transaction: task lookups/inserts, TaskLog inserts,
+    daily_rollups and user_stats_agg upserts and user updates are all issued as chunked bulk statements,
+    then one commit.
+    days: list of (user, entries, event) as for persist_day. Returns {(user_id, task name): task_id}.
+    day_events: rows for record_day_events; each event gets an "achievements" list (names unlocked by the day).
+    Raises IntegrityError (duplicate day) or StaleUserError (concurrent update) after rolling back.
+    """
+    try:
+        unlocked = award_achievements(db, days)
+        for r in day_events or ():
+            r["event"]["achievements"] = unlocked.get(r["user_id"], [])
+        if day_events:
+            record_day_events(db, day_events)
+        specs = [dict(e, user_id=user.id) for user, entries, _ in days for e in entries]
+        task_ids = {}
+        for part in _chunks(specs, TASK_LOOKUP_CHUNK):
+            task_ids.update(ensure_tasks_bulk(db, part))
+        log_rows = [dict(e, user_id=user.id, task_id=task_ids[(user.id, e["name"])])
+                    for user, entries, _ in days for e in entries]
+        for part in _chunks(log_rows, WRITE_CHUNK):
+            create_task_logs_bulk(db, part)
+        add_to_daily_rollups(db, log_rows)
+        update_stats_aggs(db, days)
+        apply_user_events_bulk(db, [(user, event) for user, _, event in days])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return task_ids
+
+# -------------------------
+# Achievements (rules in streax/achievements.py)
+# -------------------------
+ENGINE_FIELDS = ("streak_days", "total_xp", "current_level")
+
+def _dialect_insert(db: Session, model):
+    if db.get_bind().dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(model)
+
+def insert_achievements_ignore(db: Session, rows: List[Dict], chunk: int = WRITE_CHUNK):
+    """rows: dicts with user_id, name. Existing (user_id, name) pairs are skipped. Does not commit."""
+    if not rows:
+        return
+    stmt = _dialect_insert(db, Achievement)
+    stmt = stmt.prefix_with("IGNORE") if db.get_bind().dialect.name == "mysql" else stmt.on_conflict_do_nothing()
+    now = datetime.utcnow()
+    for part in _chunks(rows, chunk):
+        db.execute(stmt, [dict(r, unlocked_at=r.get("unlocked_at", now)) for r in part])
+
+def upsert_achievement_counters(db: Session, rows: List[Dict], add: bool = True, chunk: int = WRITE_CHUNK):
+    """rows: dicts with user_id, name, value; added to (add=True) or replacing the stored value. Does not commit."""
+    if not rows:
+        return
+    stmt = _dialect_insert(db, AchievementCounter)
+    if db.get_bind().dialect.name == "mysql":
+        new = stmt.inserted.value
+        stmt = stmt.on_duplicate_key_update(value=AchievementCounter.value + new if add else new)
+    else:
+        new = stmt.excluded.value
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AchievementCounter.user_id, AchievementCounter.name],
+            set_={"value": AchievementCounter.value + new if add else new},
+        )
+    for part in _chunks(rows, chunk):
+        db.execute(stmt, part)
+
+def award_achievements(db: Session, days: List[Tuple[ORMUser, List[Dict], dict]],
+                       rules: achievements.RuleIndex = None) -> Dict[int, List[str]]:
+    """
+    Evaluate achievement rules for processed days, before the users rows are updated (user still holds
+    the old values, event the new ones). Completion counters are bumped from the entries' task types.
+    Only rules whose threshold was crossed are checked against stored unlocks.
+    Returns {user_id: [newly unlocked names]}. Does not commit.
+    """
+    rules = rules or achievements.default_index
+    deltas = {user.id: achievements.counter_fields(e["type"] for e in entries) for user, entries, _ in days}
+    counter_names = {n for d in deltas.values() for n in d}
+    old_counts = {}
+    if counter_names:
+        for part in _chunks([uid for uid, d in deltas.items() if d], 1000):
+            rows = db.execute(select(AchievementCounter.user_id, AchievementCounter.name, AchievementCounter.value)
+                              .where(AchievementCounter.user_id.in_(part),
+                                     AchievementCounter.name.in_(sorted(counter_names)))).all()
+            old_counts.update({(uid, name): value for uid, name, value in rows})
+        upsert_achievement_counters(db, [{"user_id": uid, "name": n, "value": v}
+                                         for uid, d in deltas.items() for n, v in d.items()])
+
+    candidates = {}
+    for user, _, event in days:
+        changes = {f: (getattr(user, f), event[f]) for f in ENGINE_FIELDS if f in event}
+        for n, v in deltas[user.id].items():
+            old = old_counts.get((user.id, n), 0)
+            changes[n] = (old, old + v)
+        for rule in rules.evaluate(changes):
+            candidates.setdefault(user.id, []).append(rule.name)
+    if not candidates:
+        return {}
+    have = set(db.execute(select(Achievement.user_id, Achievement.name)
+                          .where(Achievement.user_id.in_(list(candidates)),
+                                 Achievement.name.in_({n for ns in candidates.values() for n in ns}))).all())
+    unlocked = {uid: [n for n in names if (uid, n) not in have] for uid, names in candidates.items()}
+    unlocked = {uid: names for uid, names in unlocked.items() if names}
+    insert_achievements_ignore(db, [{"user_id": uid, "name": n} for uid, names in unlocked.items() for n in names])
+    return unlocked
+
+def list_achievements(db: Session, user_id: int):
+    return db.execute(select(Achievement.name, Achievement.unlocked_at)
+                      .where(Achievement.user_id == user_id)
+                      .order_by(Achievement.unlocked_at.asc(), Achievement.id.asc())).all()
+
+# -------------------------
+# Per-user statistics (running counters in streax/stats.py)
+# -------------------------
+STATS_AGG_JSON = ("by_type", "by_task")
+
+def _agg_from_row(row: UserStatsAgg) -> dict:
+    agg = stats.empty()
+    if row is not None:
+        for k in agg:
+            v = getattr(row, k)
+            agg[k] = json.loads(v) if k in STATS_AGG_JSON else v
+    return agg
+
+def _agg_to_row(user_id: int, agg: dict) -> dict:
+    row = {k: json.dumps(v) if k in STATS_AGG_JSON else v for k, v in agg.items()}
+    row["user_id"] = user_id
+    return row
+
+def load_stats_aggs(db: Session, user_ids: List[int], chunk: int = 1000) -> Dict[int, dict]:
+    """{user_id: aggregate dict}; users without a row get stats.empty()."""
+    out = {uid: stats.empty() for uid in user_ids}
+    for part in _chunks(sorted(set(user_ids)), chunk):
+        for row in db.execute(select(UserStatsAgg).where(UserStatsAgg.user_id.in_(part))).scalars():
+            out[row.user_id] = _agg_from_row(row)
+    return out
+
+def upsert_stats_aggs(db: Session, aggs: Dict[int, dict], chunk: int = WRITE_CHUNK):
+    """Write aggregates, replacing stored rows. Does not commit."""
+    if not aggs:
+        return
+    stmt = _dialect_insert(db, UserStatsAgg)
+    cols = list(stats.empty())
+    if db.get_bind().dialect.name == "mysql":
+        stmt = stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in cols})
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=[UserStatsAgg.user_id],
+                                          set_={c: stmt.excluded[c] for c in cols})
+    for part in _chunks([_agg_to_row(uid, agg) for uid, agg in aggs.items()], chunk):
+        db.execute(stmt, part)
+
+def update_stats_aggs(db: Session, days: List[Tuple[ORMUser, List[Dict], dict]]):
+    """
+    Fold processed days into user_stats_agg: one read and one upsert for all users with completions.
+    Zero-task days cannot change any counter and are skipped. Runs in the caller's transaction, whose
+    users.version check (apply_user_events_bulk) rejects a concurrent read-modify-write. Does not commit.
+    """
+    active = [(user, entries, event) for user, entries, event in days if entries]
+    if not active:
+        return
+    aggs = load_stats_aggs(db, [user.id for user, _, _ in active])
+    for user, entries, event in active:
+        stats.fold_day(aggs[user.id], event["date"], entries, event.get("streak_days"))
+    upsert_stats_aggs(db, aggs)
+
+# -------------------------
+# Processed days (idempotency)
+# -------------------------
+def record_day_events(db: Session, rows: List[Dict]):
+    """
+    rows: list of dicts with keys: user_id, date, event (dict), idempotency_key (optional)
+    The unique (user_id, date) and (user_id, idempotency_key) constraints reject a second
+    processing with IntegrityError. Does not commit.
+    """
+    for part in _chunks(rows, WRITE_CHUNK):
+        db.execute(insert(DayEvent), [{
+            "user_id": r["user_id"],
+            "date": r["date"],
+            "idempotency_key": r.get("idempotency_key"),
+            "event": json.dumps(r["event"]),
+        } for r in part])
+
+def insert_day_events_ignore(db: Session, rows: List[Dict]):
+    """rows as for record_day_events; days the user already has in day_events are skipped. Does not commit."""
+    if not rows:
+        return
+    stmt = _dialect_insert(db, DayEvent)
+    stmt = stmt.prefix_with("IGNORE") if db.get_bind().dialect.name == "mysql" else stmt.on_conflict_do_nothing()
+    for part in _chunks(rows, WRITE_CHUNK):
+        db.execute(stmt, [{
+            "user_id": r["user_id"],
+            "date": r["date"],
+            "idempotency_key": r.get("idempotency_key"),
+            "event": json.dumps(r["event"]),
+        } for r in part])
+
+def get_day_event(db: Session, user_id: int, date_iso: str, idempotency_key: str = None) -> Optional[dict]:
+    """The recorded event for user_id on date_iso (or under idempotency_key), else None."""
+    raw = db.execute(day_event_stmt(user_id, date_iso, idempotency_key)).scalar()
+    return json.loads(raw) if raw is not None else None
+
+def get_day_events(db: Session, user_ids: List[int], date_iso: str, chunk: int = 1000) -> Dict[int, dict]:
+    """{user_id: event} for the users that already processed date_iso."""
+    out = {}
+    ids = list(set(user_ids))
+    for part in _chunks(ids, chunk):
+        rows = db.execute(select(DayEvent.user_id, DayEvent.event)
+                          .where(DayEvent.user_id.in_(part), DayEvent.date == date_iso)).all()
+        for uid, raw in rows:
+            out[uid] = json.loads(raw)
+    return out
+
 # -------------------------
 # New listing helpers
 # -------------------------
-def list_tasks_for_user(db: Session, user_id: int, limit: int = 100, offset: int = 0):
-    q = db.query(ORMTask).filter(ORMTask.user_id == user_id).order_by(ORMTask.id.asc()).limit(limit).offset(offset)
-    return q.all()
+@replica_read
+def list_tasks_for_user(db: Session, user_id: int, limit: int = 100, offset: int = 0, after_id: int = None):
+    """
+    Tasks in id order. Pass the last id of the previous page as after_id (keyset pagination);
+    offset is kept for old callers but scans every skipped row.
+    """
+    q = tasks_for_user_stmt(user_id, after_id=after_id).limit(limit)
+    if offset:
+        q = q.offset(offset)
+    return db.execute(q).scalars().all()
+
+def _row_dicts(result) -> List[Dict]:
+    keys = list(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+@replica_read
+def list_task_rows(db: Session, user_id: int, limit: int = 100, offset: int = 0, after_id: int = None) -> List[Dict]:
+    """
+    list_tasks_for_user as plain dicts (TASK_COLUMNS) from a column-only select: no ORM objects,
+    identity map or attribute instrumentation on the read endpoints.
+    """
+    q = tasks_for_user_stmt(user_id, after_id=after_id, columns=True).limit(limit)
+    if offset:
+        q = q.offset(offset)
+    return _row_dicts(db.execute(q))
+
+@replica_read
+def list_logs_for_user(db: Session, user_id: int, limit: int = 100, offset: int = 0, after_id: int = None,
+                       date_from: str = None, date_to: str = None, after_date: str = None,
+                       include_cold: bool = False):
+    """
+    Logs newest first, optionally limited to date_from..date_to (inclusive, ISO dates).
+    Keyset pagination: pass the last row's id as after_id (and its date as after_date when a date range is used).
+    offset is kept for old callers but scans every skipped row.
+    Only hot logs (task_logs) unless include_cold: then the same page is also read from task_logs_archive
+    and both are merged in page order (archived rows also carry task_name).
+    """
+    kwargs = dict(after_id=after_id, date_from=date_from, date_to=date_to, after_date=after_date)
+    return _page_logs(db, user_id, limit, offset, include_cold, lambda q: db.execute(q).scalars().all(),
+                      lambda l: (l.date, l.id), **kwargs)
+
+@replica_read
+def list_log_rows(db: Session, user_id: int, limit: int = 100, offset: int = 0, after_id: int = None,
+                  date_from: str = None, date_to: str = None, after_date: str = None,
+                  include_cold: bool = False) -> List[Dict]:
+    """list_logs_for_user as plain dicts (LOG_COLUMNS) from column-only selects."""
+    kwargs = dict(after_id=after_id, date_from=date_from, date_to=date_to, after_date=after_date, columns=True)
+    return _page_logs(db, user_id, limit, offset, include_cold, lambda q: _row_dicts(db.execute(q)),
+                      lambda l: (l["date"], l["id"]), **kwargs)
+
+def _page_logs(db: Session, user_id: int, limit: int, offset: int, include_cold: bool, fetch, date_id, **kwargs):
+    if not include_cold:
+        q = logs_for_user_stmt(user_id, **kwargs).limit(limit)
+        if offset:
+            q = q.offset(offset)
+        return fetch(q)
+    rows = []
+    for cold in (False, True):
+        rows.extend(fetch(logs_for_user_stmt(user_id, cold=cold, **kwargs).limit(offset + limit)))
+    if kwargs["date_from"] is None and kwargs["date_to"] is None:
+        rows.sort(key=lambda l: date_id(l)[1], reverse=True)
+    else:
+        rows.sort(key=date_id, reverse=True)
+    return rows[offset:offset + limit]
+
+def iter_logs_export(db: Session, batch: int = 1000, user_id: int = None, date_from: str = None,
+                     date_to: str = None, include_cold: bool = False):
+    """
+    Yield lists of up to `batch` export rows (see logs_export_stmt) read through a server-side
+    cursor (yield_per => stream_results), so memory does not grow with the history size.
+    """
+    result = db.execute(logs_export_stmt(user_id, date_from, date_to, include_cold).execution_options(yield_per=batch))
+    try:
+        for part in result.partitions():
+            yield part
+    finally:
+        result.close()
+
+@replica_read
+def get_activity(db: Session, user_id: int, date_from: str, date_to: str):
+    """
+    Per-day task counts and XP sums for date_from..date_to (inclusive, ISO dates) from daily_rollups.
+    "scored" counts only the logs that awarded XP (what the Streaks grid shows).
+    """
+    rows = db.execute(activity_stmt(user_id, date_from, date_to)).all()
+    return [{"date": d, "count": cnt, "scored": scored, "xp": xp} for d, cnt, scored, xp in rows]
 
-def list_logs_for_user(db: Session, user_id: int, limit: int = 100, offset: int = 0):
-    q = db.query(TaskLog).filter(TaskLog.user_id == user_id).order_by(TaskLog.id.desc()).limit(limit).offset(offset)
-    return q.all()
+def rebuild_daily_rollups(db: Session, user_id: int = None, user_ids: List[int] = None):
+    """Recompute daily_rollups from task_logs and task_logs_archive (all users, one, or user_ids). Commits."""
+    ids = [user_id] if user_id is not None else user_ids
+    delete_q = DailyRollup.__table__.delete()
+    logs = log_archive.all_logs(None if ids is None else lambda m: [m.user_id.in_(ids)])
+    src = select(
+        logs.c.user_id, logs.c.date, func.count(logs.c.id),
+        func.coalesce(func.sum(case((logs.c.xp_awarded > 0, 1), else_=0)), 0),
+        func.coalesce(func.sum(logs.c.xp_awarded), 0),
+    ).group_by(logs.c.user_id, logs.c.date)
+    if ids is not None:
+        delete_q = delete_q.where(DailyRollup.user_id.in_(ids))
+    db.execute(delete_q)
+    db.execute(insert(DailyRollup).from_select(["user_id", "date", "task_count", "scored_count", "xp_sum"], src))
+    db.commit()
 
+@replica_read
 def get_user_stats(db: Session, user_id: int):
     """
-    Return a simple stats dict: total_xp, current_level, streak_days, last_active_date, xp_to_next_level
-    xp_to_next_level uses simple formula: next_level_threshold = (current_level + 1) * 100
+    Return a stats dict: total_xp, current_level, streak_days, last_active_date, xp_to_next_level
+    next_level_threshold comes from the level curve (streax/levels.py): total XP at which current_level + 1 starts
+    plus the user_stats_agg values (best streak, XP this week / month, per-type completion rates, ...;
+    see streax.stats.summarize), all from one primary-key read.
+    Read-through cached; invalidated by the write helpers below. Carries "data_version" like get_user_profile.
     """
-    u = db.get(ORMUser, user_id)
-    if not u:
+    return cache.get_or_load(f"stats:{user_id}", lambda: _load_user_stats(db, user_id),
+                             store=not routing.on_replica(db))
+
+def _load_user_stats(db: Session, user_id: int):
+    return stats_dict(db.execute(user_stats_stmt(user_id)).first())
+
+def stats_dict(found) -> Optional[dict]:
+    """The cached stats dict of a user_stats_stmt row (None if there is no such user)."""
+    if not found:
         return None
-    next_threshold = (u.current_level + 1) * 100
+    u, agg = found
+    next_threshold = levels.curve.threshold(u.current_level + 1)
     xp_to_next = max(0, next_threshold - u.total_xp)
     return {
         "id": u.id,
@@ -99,7 +830,9 @@ def get_user_stats(db: Session, user_id: int):
         "last_active_date": u.last_active_date,
         "consecutive_misses": u.consecutive_misses,
         "xp_to_next_level": xp_to_next,
-        "next_level_threshold": next_threshold
+        "next_level_threshold": next_threshold,
+        **stats.summarize(_agg_from_row(agg), date.today()),
+        "data_version": u.data_version,
     }
 
 # -------------------------
@@ -111,6 +844,7 @@ def get_task(db: Session, task_id: int):
 def create_task(db: Session, user_id: int, name: str, type_: str, base_xp: int, required_daily: bool = False):
     t = ORMTask(user_id=user_id, name=name, type=type_, base_xp=base_xp, required_daily=required_daily)
     db.add(t)
+    cache.invalidate_user(db, user_id)
     db.commit()
     db.refresh(t)
     return t
@@ -123,6 +857,7 @@ def update_task(db: Session, task_id: int, **fields):
         if hasattr(t, k):
             setattr(t, k, v)
     db.add(t)
+    cache.invalidate_user(db, t.user_id)
     db.commit()
     db.refresh(t)
     return t
@@ -131,6 +866,10 @@ def delete_task(db: Session, task_id: int):
     t = db.get(ORMTask, task_id)
     if not t:
         return False
+    # task_logs has no foreign keys (monthly partitions), so its rows go explicitly
+    db.execute(TaskLog.__table__.delete().where(TaskLog.task_id == task_id))
+    db.execute(TaskLogArchive.__table__.delete().where(TaskLogArchive.task_id == task_id))
     db.delete(t)
+    cache.invalidate_user(db, t.user_id)
     db.commit()
     return True
@@ -0,0 +1,75 @@
+# backend/database/engine_glue.py
+"""
+Engine glue shared by /process-day, /process-day/batch (app/main.py) and the write-behind
+worker (database/write_queue.py): users row -> engine state, engine result -> the entries
+and user event crud.persist_day(s) writes, and the payload of a queued day.
+"""
+from dataclasses import asdict
+from typing import List, Optional
+
+from streax.engine import process_day
+from streax.models import Task as DataTask, UserState as DataUserState
+
+DAILY_TARGET_COUNT = 2
+
+def engine_state(orm_user) -> DataUserState:
+    """Lightweight UserState object for the engine from the DB row."""
+    return DataUserState(
+        user_id=orm_user.id,
+        total_xp=orm_user.total_xp,
+        current_level=orm_user.current_level,
+        streak_days=orm_user.streak_days,
+        last_active_date=orm_user.last_active_date or "",
+        consecutive_misses=orm_user.consecutive_misses
+    )
+
+def day_entries(data_tasks: List[DataTask], event: dict, streak_days: int, today_iso: str) -> List[dict]:
+    """TaskLog entries for crud.persist_day(s): the day's XP split across tasks by base_xp."""
+    total_base = sum(t.base_xp for t in data_tasks) or 1
+    entries = []
+    for t in data_tasks:
+        xp_awarded = int(round(event["day_xp"] * (t.base_xp / total_base)))
+        entries.append({
+            "name": t.name,
+            "type": t.type,
+            "base_xp": t.base_xp,
+            "required_daily": t.required_daily,
+            "xp_awarded": xp_awarded,
+            "streak_at_time": streak_days,
+            "is_full_day": False,
+            "date": today_iso
+        })
+    return entries
+
+def state_event(state: DataUserState, today_iso: str, base_version: Optional[int] = None) -> dict:
+    """
+    Engine result in the shape crud.persist_day / update_user_after_event expect.
+    base_version: users.version of the row the state was computed from (checked by the UPDATE).
+    """
+    return {
+        "total_xp": state.total_xp,
+        "current_level": state.current_level,
+        "streak_days": state.streak_days,
+        "consecutive_misses": state.consecutive_misses,
+        "date": today_iso,
+        "base_version": base_version,
+    }
+
+def entry_tasks(entries: List[dict]) -> List[DataTask]:
+    """The day's tasks back from its entries (ids are not kept: persist looks tasks up by name)."""
+    return [DataTask(0, e["name"], e["type"], e["base_xp"], e["required_daily"]) for e in entries]
+
+def queued_day(state: DataUserState, data_tasks: List[DataTask], today_iso: str,
+               base_version: Optional[int], after: Optional[int] = None) -> dict:
+    """
+    Payload of a write-behind job: the day computed on top of state (which starts at users.version
+    base_version). after: id of the queued job the state was chained on, if any.
+    """
+    new_state, event = process_day(state, data_tasks, today_iso, daily_target_count=DAILY_TARGET_COUNT)
+    return {
+        "entries": day_entries(data_tasks, event, new_state.streak_days, today_iso),
+        "user_event": state_event(new_state, today_iso, base_version),
+        "event": event,
+        "state": asdict(new_state),
+        "after": after,
+    }
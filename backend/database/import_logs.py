@@ -0,0 +1,299 @@
+# backend/database/import_logs.py
+"""
+Bulk import of historical task completions (e.g. when moving users over from another tracker).
+
+Input is CSV (with a header row) or NDJSON, one completion per row:
+
+    username or user_id, task (or task_name), date (ISO yyyy-mm-dd), xp
+
+`username` rows create missing users; `user_id` rows must reference existing users.
+`xp` is the task's base XP (before streak and full-day bonuses), not the XP the old tracker
+awarded: a task that does not exist yet is created with the xp of its first imported row
+(type "imported"), and a row whose xp differs from its task's base XP is rejected.
+
+Rows are read as a stream and written in chunks, one transaction per chunk: users and
+tasks are resolved with one lookup and one multi-row INSERT for the missing ones, task
+logs with one multi-row INSERT, daily_rollups with one upsert. Imported logs are written
+with streak_at_time = REPLAY_PENDING (-1), which marks them as not replayed yet.
+
+Afterwards every imported user's total_xp / streak_days / consecutive_misses /
+current_level / last_active_date is recomputed from the recorded history with
+database/rebuild_users.py (streax.replay, same rules as streax.engine.process_day). The
+imported logs (those still marked) then get the replayed awards: xp_awarded is the day's XP
+split across the day's tasks by base_xp, plus streak_at_time and is_full_day, as if every
+day had gone through /process-day. Logs the app wrote are left as they are. Each imported
+day gets a day_events row with the replayed event, unless the user already has one for
+that date, so /process-day answers a resubmitted day as a duplicate and rebuild_users
+replays it. The users' daily_rollups and user_stats_agg rows are recomputed, so logs,
+heatmaps, stats and users.total_xp agree. Their achievement counters and unlocks are
+backfilled (database/backfill_achievements.py); finally their cached read models are
+dropped and their leaderboard scores pushed (crud.refresh_read_models). Days without
+completions count as missed days unless fill_gaps is off. If an import stops after
+writing logs, rewrite_awards(engine, user_ids) finishes the marked ones.
+
+Bad rows are skipped and reported; progress (rows/s) is printed per chunk.
+
+Usage (from backend/):
+    python database/import_logs.py history.csv [--format csv|ndjson] [--chunk 20000] [--no-fill-gaps]
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+here = Path(__file__).resolve().parents[1]
+if str(here) not in sys.path:
+    sys.path.insert(0, str(here))
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+
+from database.connection import engine as default_engine
+from database import cache, crud
+from database.backfill_achievements import backfill
+from database.models import Task, TaskLog
+from database.rebuild_users import DAILY_TARGET_COUNT, load_user_days, rebuild, user_id_chunks
+from database.rebuild_stats import rebuild_stats
+from streax.replay import replay_days
+
+IMPORT_CHUNK = 20000
+REPLAY_PENDING = -1  # streak_at_time of imported logs until rewrite_awards gives them the replayed awards
+REWRITE_CHUNK_USERS = 1000  # users per replay / log rewrite transaction
+MAX_REPORTED_ERRORS = 20
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []  # first MAX_REPORTED_ERRORS "line N: reason"
+        self.user_ids = set()
+        self.users_rebuilt = 0
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def reject(self, line: int, reason: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line}: {reason}")
+
+    def rows_per_sec(self) -> float:
+        return self.rows / max(time.perf_counter() - self.started, 1e-9)
+
+    def as_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "users": len(self.user_ids),
+            "users_rebuilt": self.users_rebuilt,
+            "seconds": round(self.seconds, 3),
+            "rows_per_sec": round(self.rows / max(self.seconds, 1e-9)),
+        }
+
+# -------------------------
+# Parsing
+# -------------------------
+def read_rows(text, fmt: str):
+    """Yield (line number, dict) from a text stream; lines that are not a JSON object yield (n, None)."""
+    if fmt == "csv":
+        for n, row in enumerate(csv.DictReader(text), start=2):
+            yield n, row
+        return
+    for n, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield n, row if isinstance(row, dict) else None
+
+def parse_row(row: dict):
+    """(user_id or None, username or None, task name, ISO date, xp); ValueError with a reason on bad input."""
+    if row is None:
+        raise ValueError("not a JSON object")
+    user_id = row.get("user_id")
+    user_id = int(user_id) if user_id not in (None, "") else None
+    username = str(row.get("username") or "").strip() or None
+    if user_id is None and username is None:
+        raise ValueError("needs username or user_id")
+    name = str(row.get("task") or row.get("task_name") or "").strip()
+    if not name:
+        raise ValueError("missing task")
+    day = date.fromisoformat(str(row.get("date") or "").strip()).isoformat()
+    xp = int(row.get("xp") or 0)
+    if xp < 0:
+        raise ValueError("negative xp")
+    return user_id, username, name, day, xp
+
+# -------------------------
+# Writing
+# -------------------------
+class _ChunkWriter:
+    """Resolves users and tasks (remembered across chunks) and writes one chunk per transaction."""
+
+    def __init__(self, db: Session, report: ImportReport):
+        self.db = db
+        self.report = report
+        self.usernames = {}   # username -> user id
+        self.user_ids = set() # user_id values that exist
+        self.tasks = {}       # (user_id, task name) -> (task id, base_xp)
+
+    def write(self, parsed):
+        """parsed: list of (line, user_id, username, task name, date, xp)."""
+        db = self.db
+        names = {p[2] for p in parsed if p[1] is None and p[2] not in self.usernames}
+        if names:
+            self.usernames.update(crud.ensure_users_bulk(db, list(names)))
+        ids = {p[1] for p in parsed if p[1] is not None and p[1] not in self.user_ids}
+        if ids:
+            self.user_ids.update(crud.get_usernames(db, list(ids)))
+
+        rows = []
+        for line, user_id, username, name, day, xp in parsed:
+            if user_id is not None and user_id not in self.user_ids:
+                self.report.reject(line, f"unknown user_id {user_id}")
+                continue
+            uid = user_id if user_id is not None else self.usernames[username]
+            rows.append({"line": line, "user_id": uid, "name": name, "date": day, "xp_awarded": xp,
+                         "streak_at_time": REPLAY_PENDING, "type": "imported", "base_xp": xp,
+                         "required_daily": False})
+
+        specs = [r for r in rows if (r["user_id"], r["name"]) not in self.tasks]
+        found = {}
+        for part in crud._chunks(specs, crud.TASK_LOOKUP_CHUNK):
+            found.update(crud.ensure_tasks_bulk(db, part))
+        for part in crud._chunks(list(found.items()), crud.TASK_LOOKUP_CHUNK):
+            base = dict(db.execute(select(Task.id, Task.base_xp).where(Task.id.in_([tid for _, tid in part]))).all())
+            self.tasks.update((key, (tid, base[tid])) for key, tid in part)
+        kept = []
+        for r in rows:
+            r["task_id"], base_xp = self.tasks[(r["user_id"], r["name"])]
+            if r["base_xp"] != base_xp:
+                self.report.reject(r["line"], f"xp {r['base_xp']} differs from the task's base XP {base_xp}")
+                continue
+            kept.append(r)
+        rows = kept
+        for part in crud._chunks(rows, crud.WRITE_CHUNK):
+            crud.create_task_logs_bulk(db, part)
+        crud.add_to_daily_rollups(db, rows)
+        db.commit()
+        self.report.imported += len(rows)
+        self.report.user_ids.update(r["user_id"] for r in rows)
+
+def rewrite_awards(engine, user_ids, fill_gaps: bool = True, chunk_users: int = REWRITE_CHUNK_USERS) -> int:
+    """
+    Give the users' imported logs (streak_at_time = REPLAY_PENDING) the replayed day: the day's XP
+    split across its tasks by base_xp, as engine_glue.day_entries does. Records a day_events row per
+    imported day the user has none for, and recomputes the users' daily_rollups. Returns logs rewritten.
+    """
+    logs_tbl = TaskLog.__table__
+    stmt = (
+        update(logs_tbl)
+        .where(logs_tbl.c.id == bindparam("b_id"), logs_tbl.c.date == bindparam("b_date"))
+        .values(xp_awarded=bindparam("b_xp"), streak_at_time=bindparam("b_streak"),
+                is_full_day=bindparam("b_full"))
+    )
+    rewritten = 0
+    with Session(bind=engine) as db:
+        for lo, hi, ids in user_id_chunks(db.connection(), chunk_users, user_ids):
+            conn = db.connection()
+            pending = conn.execute(
+                select(TaskLog.id, TaskLog.user_id, TaskLog.date, Task.base_xp)
+                .join(Task, Task.id == TaskLog.task_id)
+                .where(TaskLog.user_id.in_(ids), TaskLog.streak_at_time == REPLAY_PENDING)
+            ).all()
+            if not pending:
+                continue
+            cols = load_user_days(conn, lo, hi, ids)
+            r = replay_days(daily_target_count=DAILY_TARGET_COUNT, fill_gaps=fill_gaps, **cols)
+            logged = r.order >= 0
+            replayed = {
+                (int(u), d): (int(xp), int(total), int(streak), int(misses), int(level), bool(full), int(base))
+                for u, d, xp, total, streak, misses, level, full, base in zip(
+                    r.user_ids[logged], r.days[logged].astype("datetime64[D]").astype(str), r.day_xp[logged],
+                    r.total_xp[logged], r.streak_days[logged], r.consecutive_misses[logged],
+                    r.current_level[logged], r.full_day[logged], cols["base_xp"][r.order[logged]])
+            }
+            rows, days = [], {}
+            for log_id, uid, day, base_xp in pending:
+                iso = day.isoformat()
+                day_xp, total_xp, streak, misses, level, full, total_base = replayed[(uid, iso)]
+                rows.append({"b_id": log_id, "b_date": day, "b_streak": streak, "b_full": full,
+                             "b_xp": int(round(day_xp * ((base_xp or 0) / (total_base or 1))))})
+                days[(uid, iso)] = {"date": iso, "day_xp": day_xp, "total_xp": total_xp, "streak_days": streak,
+                                    "consecutive_misses": misses, "current_level": level, "achievements": []}
+            for part in crud._chunks(rows, crud.WRITE_CHUNK):
+                db.execute(stmt, part)
+            crud.insert_day_events_ignore(db, [{"user_id": uid, "date": iso, "event": event}
+                                               for (uid, iso), event in sorted(days.items())])
+            for uid in ids:
+                cache.invalidate_user(db, uid)
+            crud.rebuild_daily_rollups(db, user_ids=ids)  # commits
+            rewritten += len(rows)
+    return rewritten
+
+def import_logs(text, fmt: str = "csv", engine=None, chunk: int = IMPORT_CHUNK, fill_gaps: bool = True,
+                log=print) -> ImportReport:
+    """
+    Import every row of the text stream, then rebuild the imported users' state and refresh their
+    cached read models and leaderboard scores. Progress lines go to log. Returns the report.
+    """
+    engine = engine or default_engine
+    report = ImportReport()
+    with Session(bind=engine) as db:
+        writer = _ChunkWriter(db, report)
+        parsed = []
+        for line, row in read_rows(text, fmt):
+            report.rows += 1
+            try:
+                parsed.append((line,) + parse_row(row))
+            except (ValueError, TypeError) as e:
+                report.reject(line, str(e) or "invalid value")
+            if len(parsed) >= chunk:
+                writer.write(parsed)
+                parsed = []
+                log(f"{report.rows} rows read, {report.imported} imported ({report.rows_per_sec():.0f} rows/s)")
+        if parsed:
+            writer.write(parsed)
+        log(f"{report.rows} rows read, {report.imported} imported ({report.rows_per_sec():.0f} rows/s)")
+    if report.user_ids:
+        report.users_rebuilt, _ = rebuild(engine, fill_gaps=fill_gaps, user_ids=report.user_ids, log=log)
+        rewrite_awards(engine, report.user_ids, fill_gaps=fill_gaps)
+        with Session(bind=engine) as db:
+            rebuild_stats(db, user_ids=report.user_ids, fill_gaps=fill_gaps, commit=True, log=log)
+        backfill(engine, fill_gaps=fill_gaps, user_ids=report.user_ids, log=log)
+        with Session(bind=engine) as db:
+            crud.refresh_read_models(db, report.user_ids)
+    report.seconds = time.perf_counter() - report.started
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import historical task logs and rebuild user state")
+    parser.add_argument("path", help="CSV or NDJSON file ('-' for stdin)")
+    parser.add_argument("--format", choices=("csv", "ndjson"), default=None,
+                        help="default: from the file extension (csv unless .ndjson/.jsonl)")
+    parser.add_argument("--chunk", type=int, default=IMPORT_CHUNK, help="rows per transaction")
+    parser.add_argument("--no-fill-gaps", action="store_true",
+                        help="do not treat days without completions as missed days when rebuilding")
+    args = parser.parse_args(argv)
+    fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    if args.path == "-":
+        report = import_logs(sys.stdin, fmt, chunk=args.chunk, fill_gaps=not args.no_fill_gaps)
+    else:
+        with open(args.path, encoding="utf-8", newline="") as f:
+            report = import_logs(f, fmt, chunk=args.chunk, fill_gaps=not args.no_fill_gaps)
+    r = report.as_dict()
+    print(f"Done: {r['imported']} of {r['rows']} rows imported for {r['users']} users "
+          f"in {r['seconds']}s ({r['rows_per_sec']} rows/s), {r['rejected']} rejected.")
+    for e in report.errors:
+        print("  " + e)
+    return 0 if not report.rejected else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+# backend/database/leaderboard.py
+"""
+Leaderboards by total_xp and streak_days.
+
+Backends keep one sorted set per board:
+  - InMemoryLeaderboard: streax.ranking.SkipListRanking per board, O(log n) update,
+    rank-of-user and top-N; per process. Only for a single API worker: each worker would
+    rank from its own board (and /users/{id}/stats ETags, which include the ranks, would
+    differ between them), so it refuses to start when WEB_CONCURRENCY (read by uvicorn
+    and gunicorn for their worker count) is above 1. Writes committed by other
+    processes (write-behind workers, the sweep, CLI tools) reach it at its next rebuild().
+  - RedisLeaderboard: a Redis sorted set per board (ZADD / ZREVRANK / ZREVRANGE),
+    shared by all workers; any Redis-compatible client works. Its calls are @offloaded
+    (database/offload.py), so under DB_MODE=async they do not block the event loop.
+
+The board is (re)built from the users table on first use (or via rebuild()).
+After that it is updated incrementally: crud.apply_user_event /
+update_user_after_event / create_user call record_scores(db, ...), and the new
+scores are pushed once that session commits (dropped on rollback), the same way
+database/cache.py invalidates.
+
+Config (env): LEADERBOARD_BACKEND memory (default; one API worker) | redis, REDIS_URL.
+"""
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from database.offload import offloaded
+from streax.ranking import SkipListRanking
+
+BOARDS = ("total_xp", "streak_days")
+
+class LeaderboardBackend(ABC):
+    """Interface. Ranks are 0-based, highest score first."""
+    name = "base"
+
+    @abstractmethod
+    def update(self, user_id: int, scores: dict):
+        ...
+
+    @abstractmethod
+    def remove(self, user_id: int):
+        ...
+
+    @abstractmethod
+    def rank(self, board: str, user_id: int) -> Optional[int]:
+        ...
+
+    @abstractmethod
+    def score(self, board: str, user_id: int) -> Optional[float]:
+        ...
+
+    @abstractmethod
+    def range(self, board: str, start: int, count: int) -> List[Tuple[int, float]]:
+        ...
+
+    @abstractmethod
+    def size(self, board: str) -> int:
+        ...
+
+    @abstractmethod
+    def load(self, rows):
+        """Replace all boards with rows of (user_id, total_xp, streak_days)."""
+
+class InMemoryLeaderboard(LeaderboardBackend):
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._boards = {b: SkipListRanking() for b in BOARDS}
+
+    def update(self, user_id, scores):
+        with self._lock:
+            for b, v in scores.items():
+                if b in self._boards and v is not None:
+                    self._boards[b].update(user_id, v)
+
+    def remove(self, user_id):
+        with self._lock:
+            for sl in self._boards.values():
+                sl.remove(user_id)
+
+    def rank(self, board, user_id):
+        with self._lock:
+            return self._boards[board].rank(user_id)
+
+    def score(self, board, user_id):
+        with self._lock:
+            return self._boards[board].score(user_id)
+
+    def range(self, board, start, count):
+        with self._lock:
+            return self._boards[board].range(start, count)
+
+    def size(self, board):
+        with self._lock:
+            return len(self._boards[board])
+
+    def load(self, rows):
+        boards = {b: SkipListRanking() for b in BOARDS}
+        for uid, total_xp, streak_days in rows:
+            boards["total_xp"].update(uid, total_xp or 0)
+            boards["streak_days"].update(uid, streak_days or 0)
+        with self._lock:
+            self._boards = boards
+
+class RedisLeaderboard(LeaderboardBackend):
+    """Sorted set per board. Redis breaks score ties by member, descending in ZREVRANK order."""
+    name = "redis"
+
+    def __init__(self, client, prefix: str = "streax:lb:"):
+        self.client = client
+        self.prefix = prefix
+
+    def _k(self, board):
+        return self.prefix + board
+
+    @offloaded
+    def update(self, user_id, scores):
+        for b, v in scores.items():
+            if b in BOARDS and v is not None:
+                self.client.zadd(self._k(b), {str(user_id): v})
+
+    @offloaded
+    def remove(self, user_id):
+        for b in BOARDS:
+            self.client.zrem(self._k(b), str(user_id))
+
+    @offloaded
+    def rank(self, board, user_id):
+        return self.client.zrevrank(self._k(board), str(user_id))
+
+    @offloaded
+    def score(self, board, user_id):
+        return self.client.zscore(self._k(board), str(user_id))
+
+    @offloaded
+    def range(self, board, start, count):
+        if count <= 0:
+            return []
+        rows = self.client.zrevrange(self._k(board), start, start + count - 1, withscores=True)
+        return [(int(m), s) for m, s in rows]
+
+    @offloaded
+    def size(self, board):
+        return self.client.zcard(self._k(board))
+
+    @offloaded
+    def load(self, rows, batch: int = 10000):
+        for b in BOARDS:
+            self.client.delete(self._k(b))
+        buf = []
+        for row in rows:
+            buf.append(row)
+            if len(buf) >= batch:
+                self._load_batch(buf)
+                buf = []
+        if buf:
+            self._load_batch(buf)
+
+    def _load_batch(self, rows):
+        self.client.zadd(self._k("total_xp"), {str(uid): xp or 0 for uid, xp, _ in rows})
+        self.client.zadd(self._k("streak_days"), {str(uid): sd or 0 for uid, _, sd in rows})
+
+def _backend_from_env() -> LeaderboardBackend:
+    kind = os.getenv("LEADERBOARD_BACKEND", "memory").lower()
+    if kind == "redis":
+        try:
+            import redis  # optional dependency
+        except ImportError:
+            raise RuntimeError("LEADERBOARD_BACKEND=redis needs the redis package (pip install redis)")
+        return RedisLeaderboard(redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0")))
+    workers = int(os.getenv("WEB_CONCURRENCY") or 1)
+    if workers > 1:
+        raise RuntimeError(f"LEADERBOARD_BACKEND=memory keeps one board per process, so {workers} workers "
+                           "(WEB_CONCURRENCY) would rank differently; set LEADERBOARD_BACKEND=redis")
+    return InMemoryLeaderboard()
+
+backend: LeaderboardBackend = _backend_from_env()
+_rebuild_lock = threading.Lock()  # one rebuild at a time
+_load_lock = threading.Lock()     # _loaded and _pending (held briefly, also by the commit hook)
+_loaded = False
+_pending = None  # updates that committed while a rebuild was reading the users table
+
+def set_backend(new_backend: LeaderboardBackend):
+    global backend, _loaded
+    backend = new_backend
+    _loaded = False
+
+def rebuild(db: Session, chunk: int = 10000, force: bool = True):
+    """Reload every board from the users table (streamed in chunks)."""
+    global _loaded, _pending
+    from database.models import User
+    with _rebuild_lock:
+        with _load_lock:
+            if _loaded and not force:
+                return
+            _pending = {}
+        q = select(User.id, User.total_xp, User.streak_days).execution_options(yield_per=chunk)
+        backend.load(tuple(r) for r in db.execute(q))
+        with _load_lock:
+            pending, _pending = _pending, None
+            for uid, scores in pending.items():
+                backend.update(uid, scores)
+            _loaded = True
+
+def loaded() -> bool:
+    """True once ensure_loaded() has built (or found) the boards."""
+    return _loaded
+
+def ensure_loaded(db: Session):
+    """Build the boards on first use. A shared backend (Redis) that already has data is reused as is."""
+    global _loaded
+    if _loaded:
+        return
+    if backend.name != "memory" and backend.size("total_xp") > 0:
+        with _load_lock:
+            _loaded = True
+        return
+    rebuild(db, force=False)
+
+# -------------------------
+# Incremental updates (applied after commit)
+# -------------------------
+def record_scores(db: Session, user_id: int, total_xp: int, streak_days: int):
+    """Queue the user's new scores; pushed to the board once `db` commits."""
+    db.info.setdefault("leaderboard_updates", {})[user_id] = {"total_xp": total_xp, "streak_days": streak_days}
+
+@event.listens_for(Session, "after_commit")
+def _flush_updates(session):
+    updates = session.info.pop("leaderboard_updates", None)
+    if not updates:
+        return
+    with _load_lock:
+        if _pending is not None:
+            _pending.update(updates)  # a rebuild is reading the table: it re-applies these after its load
+        if not _loaded:
+            return  # the first ensure_loaded() reads these from the table
+    for uid, scores in updates.items():
+        backend.update(uid, scores)
+
+@event.listens_for(Session, "after_rollback")
+def _drop_updates(session):
+    session.info.pop("leaderboard_updates", None)
+
+# -------------------------
+# Queries
+# -------------------------
+def top(db: Session, board: str, limit: int, offset: int = 0):
+    ensure_loaded(db)
+    return [(offset + i, uid, score) for i, (uid, score) in enumerate(backend.range(board, offset, limit))]
+
+def around(db: Session, board: str, user_id: int, limit: int):
+    """`limit` entries centred on user_id (or None if the user is not ranked)."""
+    ensure_loaded(db)
+    r = backend.rank(board, user_id)
+    if r is None:
+        return None
+    start = max(0, r - limit // 2)
+    return [(start + i, uid, score) for i, (uid, score) in enumerate(backend.range(board, start, limit))]
+
+def rank_of(db: Session, board: str, user_id: int) -> Optional[int]:
+    ensure_loaded(db)
+    return backend.rank(board, user_id)
+
+def among(db: Session, board: str, user_ids: List[int]):
+    """Ranking restricted to user_ids (e.g. a friends list); each entry keeps its global rank."""
+    ensure_loaded(db)
+    rows = []
+    for uid in dict.fromkeys(user_ids):
+        r = backend.rank(board, uid)
+        if r is not None:
+            rows.append((r, uid, backend.score(board, uid)))
+    rows.sort()
+    return rows
+
+def size(db: Session, board: str) -> int:
+    ensure_loaded(db)
+    return backend.size(board)
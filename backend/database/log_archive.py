@@ -0,0 +1,272 @@
+# backend/database/log_archive.py
+"""
+Monthly partitions for task_logs and archival of old months to task_logs_archive.
+
+MySQL: task_logs is partitioned with RANGE COLUMNS(date), one partition per month
+(p202401 holds dates before 2024-02-01 that no earlier partition takes, so the first
+partition also catches older imports) plus pmax for dates past the last month.
+Migration 8 partitions the table; `partitions` adds the coming months by splitting
+pmax (run it monthly, e.g. from cron). Date-ranged reads only touch the partitions
+of their range. SQLite (and other dialects) keep a plain table; the helpers below
+are no-ops there.
+
+Archival (`archive --months N`): every log dated before the first day of the month
+N months back is copied to task_logs_archive (same ids, plus the task name; InnoDB
+compressed rows), in id-ordered chunks with INSERT IGNORE / ON CONFLICT DO NOTHING,
+so an interrupted run can simply be repeated. Then the hot rows are removed: on MySQL
+by dropping the partitions that lie entirely before the cutoff (instant, no undo
+log; under LOCK TABLES, after copying the rows written since the chunked copy),
+elsewhere with chunked DELETEs of the rows the archive has (a log written after its
+chunk was copied stays hot until the next run). crud.list_logs_for_user and the export read the
+archive only when asked (include_cold). The users whose logs moved get their data version
+bumped (database/user_versions.py), so cached /task-logs pages are not revalidated as unchanged.
+
+daily_rollups, user_stats_agg, achievements and the users scores are not touched, so
+heatmaps and stats still cover all history. The readers that recompute them from the logs
+(rebuild_users.py, rebuild_stats.py, backfill_achievements.py, simulate.py,
+crud.rebuild_daily_rollups) read both tables through all_logs(). Do not run the archive
+while old history is being imported.
+
+Usage (from backend/):
+    python database/log_archive.py partitions [--ahead 3]
+    python database/log_archive.py archive --months 12 [--chunk 50000] [--today YYYY-MM-DD] [--dry-run]
+"""
+import argparse
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+here = Path(__file__).resolve().parents[1]
+if str(here) not in sys.path:
+    sys.path.insert(0, str(here))
+
+from sqlalchemy import String, cast, exists, func, inspect, null, select, text, union_all
+
+from database.connection import engine as default_engine
+from database.models import Task, TaskLog, TaskLogArchive
+from database import user_versions
+
+ARCHIVE_COLUMNS = ("id", "task_id", "user_id", "task_name", "date", "xp_awarded", "streak_at_time",
+                   "is_full_day", "created_at")
+
+def month_start(d: date) -> date:
+    return d.replace(day=1)
+
+def add_months(d: date, n: int) -> date:
+    """First day of the month n months after d's month."""
+    m = d.year * 12 + d.month - 1 + n
+    return date(m // 12, m % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"p{month:%Y%m}"
+
+def _partition_clause(first: date, last: date) -> str:
+    parts = []
+    m = month_start(first)
+    while m <= last:
+        parts.append(f"PARTITION {partition_name(m)} VALUES LESS THAN ('{add_months(m, 1).isoformat()}')")
+        m = add_months(m, 1)
+    parts.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+    return ",\n  ".join(parts)
+
+def all_logs(criteria=None, names=("id", "task_id", "user_id", "date", "xp_awarded")):
+    """
+    task_logs and task_logs_archive as one subquery ("logs", UNION ALL) with the columns `names`,
+    for readers of the whole history. criteria(model) returns WHERE clauses applied to each table
+    (so both sides use their own indexes). A row present in both tables (an archive run between its
+    copy and its delete) is read once, from task_logs. "task_name" is NULL on the task_logs side.
+    """
+    parts = []
+    for model in (TaskLog, TaskLogArchive):
+        cols = [cast(null(), String(255)).label(n) if n == "task_name" and model is TaskLog else getattr(model, n)
+                for n in names]
+        q = select(*cols)
+        if criteria is not None:
+            q = q.where(*criteria(model))
+        if model is TaskLogArchive:
+            q = q.where(~exists().where(TaskLog.id == TaskLogArchive.id, TaskLog.date == TaskLogArchive.date))
+        parts.append(q)
+    return union_all(*parts).subquery("logs")
+
+# -------------------------
+# MySQL partition maintenance
+# -------------------------
+def mysql_partitions(conn):
+    """[(name, upper bound as written in the DDL)] of task_logs in order; [] if not partitioned or not MySQL."""
+    if conn.dialect.name != "mysql":
+        return []
+    rows = conn.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'task_logs' AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION")).all()
+    return [(name, desc) for name, desc in rows]
+
+def align_log_tables(conn):
+    """
+    MySQL: the layout the models declare -- `date` DATE NOT NULL in task_logs and task_logs_archive,
+    primary key (id, date) on task_logs. Only alters what differs. Other dialects: no-op (SQLite
+    stores both dates as ISO text and keys task_logs by id alone, see models.py).
+    """
+    if conn.dialect.name != "mysql":
+        return
+    insp = inspect(conn)
+    for table in ("task_logs", "task_logs_archive"):
+        col = next(c for c in insp.get_columns(table) if c["name"] == "date")
+        if col["type"].__visit_name__.upper() != "DATE" or col["nullable"]:
+            conn.execute(text(f"ALTER TABLE {table} MODIFY date DATE NOT NULL"))
+    if insp.get_pk_constraint("task_logs")["constrained_columns"] != ["id", "date"]:
+        conn.execute(text("ALTER TABLE task_logs DROP PRIMARY KEY, ADD PRIMARY KEY (id, date)"))
+
+def partition_table(conn, months_ahead: int = 3, today: date = None):
+    """
+    MySQL: turn task_logs into the monthly partitioned layout (DATE column, primary key (id, date),
+    no foreign keys). Rewrites the table once; later runs are no-ops. Other dialects: no-op.
+    """
+    if conn.dialect.name != "mysql" or mysql_partitions(conn):
+        return
+    today = today or date.today()
+    for fk in inspect(conn).get_foreign_keys("task_logs"):
+        conn.execute(text(f"ALTER TABLE task_logs DROP FOREIGN KEY `{fk['name']}`"))
+    align_log_tables(conn)
+    first = conn.execute(select(func.min(TaskLog.date))).scalar() or today
+    clause = _partition_clause(first, add_months(month_start(today), months_ahead))
+    conn.execute(text(f"ALTER TABLE task_logs PARTITION BY RANGE COLUMNS(date) (\n  {clause}\n)"))
+
+def ensure_partitions(conn, months_ahead: int = 3, today: date = None):
+    """MySQL: split pmax so every month up to months_ahead from today has its partition. Returns new names."""
+    parts = mysql_partitions(conn)
+    if not parts:
+        return []
+    today = today or date.today()
+    last_bound = date.fromisoformat(parts[-2][1].strip("'")) if len(parts) > 1 else month_start(today)
+    target = add_months(month_start(today), months_ahead)
+    if last_bound > target:
+        return []
+    conn.execute(text(f"ALTER TABLE task_logs REORGANIZE PARTITION pmax INTO (\n  "
+                      f"{_partition_clause(last_bound, target)}\n)"))
+    added = []
+    m = last_bound
+    while m <= target:
+        added.append(partition_name(m))
+        m = add_months(m, 1)
+    return added
+
+# -------------------------
+# Archival
+# -------------------------
+def _archive_insert(conn):
+    if conn.dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        return dialect_insert(TaskLogArchive).prefix_with("IGNORE")
+    from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(TaskLogArchive).on_conflict_do_nothing()
+
+def _next_id_window(conn, cutoff: date, after_id: int, chunk: int):
+    """Largest id of the next `chunk` hot rows dated before cutoff, after after_id (None when done)."""
+    ids = (select(TaskLog.id).where(TaskLog.date < cutoff, TaskLog.id > after_id)
+           .order_by(TaskLog.id.asc()).limit(chunk).subquery())
+    return conn.execute(select(func.max(ids.c.id))).scalar()
+
+def _copy(conn, cutoff: date, after_id: int, upto: int = None):
+    """INSERT IGNORE the hot rows dated before cutoff with after_id < id <= upto. Returns (rows, user ids)."""
+    window = [TaskLog.date < cutoff, TaskLog.id > after_id]
+    if upto is not None:
+        window.append(TaskLog.id <= upto)
+    src = (
+        select(TaskLog.id, TaskLog.task_id, TaskLog.user_id, Task.name, TaskLog.date, TaskLog.xp_awarded,
+               TaskLog.streak_at_time, TaskLog.is_full_day, TaskLog.created_at)
+        .outerjoin(Task, Task.id == TaskLog.task_id)
+        .where(*window)
+    )
+    conn.execute(_archive_insert(conn).from_select(list(ARCHIVE_COLUMNS), src))
+    rows = conn.execute(select(func.count()).select_from(TaskLog).where(*window)).scalar()
+    users = set(conn.execute(select(TaskLog.user_id).where(*window).distinct()).scalars())
+    return rows, users
+
+def _drop_partitions(conn, names, cutoff: date, after_id: int):
+    """
+    MySQL: drop the partitions `names` (all dated before cutoff). Logs can still be written into
+    them after the chunked copy (a late /process-day, an import), so with the tables locked the
+    rows above the last copied id are copied too, then the partitions go. Returns (rows, user ids).
+    """
+    conn.execute(text("LOCK TABLES task_logs WRITE, task_logs_archive WRITE, tasks READ"))
+    try:
+        rows, users = _copy(conn, cutoff, after_id)
+        conn.execute(text(f"ALTER TABLE task_logs DROP PARTITION {', '.join(names)}"))
+    finally:
+        conn.execute(text("UNLOCK TABLES"))
+    return rows, users
+
+def archive(engine=None, months: int = 12, today: date = None, chunk: int = 50000, dry_run: bool = False,
+            log=print):
+    """Move logs dated before the first day of the month `months` back to task_logs_archive. Returns rows moved."""
+    engine = engine or default_engine
+    cutoff = add_months(month_start(today or date.today()), -months)
+    copied = 0
+    moved_users = set()
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        if dry_run:
+            n = conn.execute(select(func.count()).select_from(TaskLog).where(TaskLog.date < cutoff)).scalar()
+            log(f"{n} logs dated before {cutoff} would be archived")
+            return n
+
+        after_id = 0
+        while True:
+            upto = _next_id_window(conn, cutoff, after_id, chunk)
+            if upto is None:
+                break
+            rows, users = _copy(conn, cutoff, after_id, upto)
+            conn.commit()
+            copied += rows
+            moved_users.update(users)
+            after_id = upto
+            log(f"copied up to id {upto}: {copied} rows ({copied / max(time.perf_counter() - started, 1e-9):.0f} rows/s)")
+
+        dropped = [name for name, bound in mysql_partitions(conn)[:-1] if date.fromisoformat(bound.strip("'")) <= cutoff]
+        if dropped:
+            rows, users = _drop_partitions(conn, dropped, cutoff, after_id)
+            copied += rows
+            moved_users.update(users)
+            log(f"dropped partitions {', '.join(dropped)} (copied {rows} late rows first)")
+        # only rows already in the archive: a log written after its chunk was copied stays hot
+        # until the next run
+        archived = exists().where(TaskLogArchive.id == TaskLog.id, TaskLogArchive.date == TaskLog.date)
+        after_id = 0
+        while True:
+            upto = _next_id_window(conn, cutoff, after_id, chunk)
+            if upto is None:
+                break
+            conn.execute(TaskLog.__table__.delete().where(TaskLog.date < cutoff, TaskLog.id > after_id,
+                                                          TaskLog.id <= upto, archived))
+            conn.commit()
+            after_id = upto
+        user_versions.bump_users(conn, moved_users)
+        conn.commit()
+    log(f"archived {copied} logs dated before {cutoff}")
+    return copied
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="task_logs partitions and cold archival")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("partitions", help="add monthly partitions ahead (MySQL)")
+    p.add_argument("--ahead", type=int, default=3, help="months after the current one")
+    a = sub.add_parser("archive", help="move old logs to task_logs_archive")
+    a.add_argument("--months", type=int, required=True, help="hot window in whole months before the current one")
+    a.add_argument("--chunk", type=int, default=50000, help="rows per copy / delete transaction")
+    a.add_argument("--today", type=date.fromisoformat, default=None, help="default: today")
+    a.add_argument("--dry-run", action="store_true", help="count the logs that would move")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "partitions":
+        with default_engine.begin() as conn:
+            added = ensure_partitions(conn, args.ahead)
+        print(f"Added partitions: {', '.join(added) or 'none'}.")
+        return 0
+    n = archive(months=args.months, today=args.today, chunk=args.chunk, dry_run=args.dry_run)
+    print(f"Done: {n} logs {'to archive' if args.dry_run else 'archived'}.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
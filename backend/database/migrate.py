@@ -0,0 +1,263 @@
+# backend/database/migrate.py
+"""
+Versioned schema upgrades.
+
+`Base.metadata.create_all` only creates missing tables; it never adds indexes,
+columns or constraints to tables that already exist. Each migration below runs
+once, in order, and the applied version is recorded in `schema_version`.
+
+Usage (from backend/):
+    python database/migrate.py upgrade     # apply pending migrations
+    python database/migrate.py current     # print applied / latest version
+    python database/migrate.py check       # EXPLAIN the crud queries, fail if one does not use an index
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Ensure backend folder is on sys.path so absolute imports work
+here = Path(__file__).resolve().parents[1]
+if str(here) not in sys.path:
+    sys.path.insert(0, str(here))
+
+from sqlalchemy import Column, Integer, Table, func, inspect, select, text
+from sqlalchemy.exc import DBAPIError
+from database.connection import engine as default_engine, Base
+from database import models  # noqa: F401  (registers all tables on Base.metadata)
+from database import crud
+
+schema_version = Table(
+    "schema_version",
+    Base.metadata,
+    Column("version", Integer, primary_key=True),
+)
+
+MIGRATIONS = []  # list of (version, description, fn(conn))
+
+def migration(version: int, description: str):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+# -------------------------
+# Helpers usable from migrations
+# -------------------------
+def create_missing_indexes(conn, table_name: str):
+    """Create every Index declared on the model's table that the database does not have yet."""
+    table = Base.metadata.tables[table_name]
+    existing = {ix["name"] for ix in inspect(conn).get_indexes(table_name)}
+    for ix in table.indexes:
+        if ix.name not in existing:
+            print(f"  creating index {ix.name} on {table_name}")
+            ix.create(conn)
+
+def add_missing_columns(conn, table_name: str):
+    """ALTER TABLE ... ADD COLUMN for model columns the database table does not have yet (needs a server_default if NOT NULL)."""
+    table = Base.metadata.tables[table_name]
+    existing = {c["name"] for c in inspect(conn).get_columns(table_name)}
+    for col in table.columns:
+        if col.name in existing:
+            continue
+        print(f"  adding column {col.name} to {table_name}")
+        ddl = f"ALTER TABLE {table_name} ADD COLUMN {col.name} {col.type.compile(dialect=conn.dialect)}"
+        if col.server_default is not None:
+            ddl += f" DEFAULT {col.server_default.arg}"
+        if not col.nullable:
+            ddl += " NOT NULL"
+        conn.execute(text(ddl))
+
+# -------------------------
+# Migrations
+# -------------------------
+@migration(1, "baseline tables (create missing)")
+def _m1_baseline(conn):
+    Base.metadata.create_all(conn)
+
+@migration(2, "backfill daily_rollups from task_logs")
+def _m2_daily_rollups(conn):
+    already = conn.execute(select(models.DailyRollup.user_id).limit(1)).first()
+    if already:
+        return
+    from sqlalchemy.orm import Session
+    with Session(bind=conn) as db:
+        # the session joins conn's transaction, so its commit() is left to engine.begin()
+        crud.rebuild_daily_rollups(db)
+
+@migration(3, "composite indexes for crud query patterns")
+def _m3_query_indexes(conn):
+    create_missing_indexes(conn, "tasks")
+    create_missing_indexes(conn, "task_logs")
+
+@migration(4, "day_events (one processing per user and date) and users.version")
+def _m4_day_events(conn):
+    models.DayEvent.__table__.create(conn, checkfirst=True)
+    add_missing_columns(conn, "users")
+
+@migration(5, "achievement_counters, unique (user_id, name) on achievements")
+def _m5_achievements(conn):
+    models.AchievementCounter.__table__.create(conn, checkfirst=True)
+    a = models.Achievement.__table__
+    # derived table: MySQL cannot select from the table a DELETE targets
+    keep = select(func.min(a.c.id).label("id")).group_by(a.c.user_id, a.c.name).subquery("keep")
+    dropped = conn.execute(a.delete().where(a.c.id.not_in(select(keep.c.id)))).rowcount
+    if dropped:
+        print(f"  removed {dropped} duplicate achievements")
+    create_missing_indexes(conn, "achievements")
+
+@migration(6, "recompute users.current_level with the configured level curve")
+def _m6_levels(conn):
+    from database.recompute_levels import recompute_levels
+    recompute_levels(conn, log=lambda _msg: None, bump_data_versions=False)
+
+@migration(7, "user_stats_agg, filled from task_logs")
+def _m7_user_stats_agg(conn):
+    models.UserStatsAgg.__table__.create(conn, checkfirst=True)
+    from sqlalchemy.orm import Session
+    from database.rebuild_stats import rebuild_stats
+    with Session(bind=conn) as db:
+        rebuild_stats(db, log=lambda _msg: None)
+
+@migration(8, "task_logs.date as DATE, monthly partitions (MySQL), task_logs_archive")
+def _m8_log_partitions(conn):
+    from database.log_archive import partition_table
+    models.TaskLogArchive.__table__.create(conn, checkfirst=True)
+    create_missing_indexes(conn, "task_logs")
+    partition_table(conn)
+
+@migration(9, "users.data_version / data_updated_at (conditional GETs)")
+def _m9_user_data_versions(conn):
+    add_missing_columns(conn, "users")
+
+@migration(10, "task_logs / task_logs_archive: DATE date columns, primary key (id, date) (MySQL)")
+def _m10_log_tables(conn):
+    from database.log_archive import align_log_tables
+    align_log_tables(conn)
+
+@migration(11, "daily_rollups.scored_count (logs that awarded XP), refilled from the logs")
+def _m11_rollup_scored_count(conn):
+    add_missing_columns(conn, "daily_rollups")
+    from sqlalchemy.orm import Session
+    with Session(bind=conn) as db:
+        # the session joins conn's transaction, so its commit() is left to engine.begin()
+        crud.rebuild_daily_rollups(db)
+
+# -------------------------
+# Runner
+# -------------------------
+def current_version(conn) -> int:
+    if not inspect(conn).has_table("schema_version"):
+        return 0
+    v = conn.execute(select(schema_version.c.version).order_by(schema_version.c.version.desc()).limit(1)).scalar()
+    return v or 0
+
+def latest_version() -> int:
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+def upgrade(engine=None, target: int = None):
+    """Apply pending migrations up to `target` (default: latest). Each migration commits on its own."""
+    engine = engine or default_engine
+    target = latest_version() if target is None else target
+    with engine.connect() as conn:
+        schema_version.create(conn, checkfirst=True)
+        conn.commit()
+        applied = current_version(conn)
+    for version, description, fn in MIGRATIONS:
+        if version <= applied or version > target:
+            continue
+        print(f"Applying migration {version}: {description}")
+        with engine.begin() as conn:
+            fn(conn)
+            conn.execute(schema_version.insert().values(version=version))
+    return target
+
+# -------------------------
+# EXPLAIN check
+# -------------------------
+def sample_queries():
+    """(name, statement) for every hot crud query, built with the same builders crud uses."""
+    return [
+        ("get_user_by_username", crud.user_by_username_stmt("someone")),
+        ("ensure_task", crud.task_by_name_stmt(1, "task")),
+        ("ensure_tasks_bulk", crud.tasks_by_keys_stmt([(1, "a"), (1, "b"), (2, "a")])),
+        ("list_tasks_for_user", crud.tasks_for_user_stmt(1, after_id=500).limit(100)),
+        ("list_logs_for_user", crud.logs_for_user_stmt(1, after_id=500).limit(100)),
+        ("list_logs_for_user (date range)", crud.logs_for_user_stmt(
+            1, date_from="2024-01-01", date_to="2024-12-31", after_date="2024-06-01", after_id=500).limit(100)),
+        ("list_logs_for_user (cold, date range)", crud.logs_for_user_stmt(
+            1, date_from="2020-01-01", date_to="2020-12-31", after_date="2020-06-01", after_id=500,
+            cold=True).limit(100)),
+        ("get_activity", crud.activity_stmt(1, "2024-01-01", "2024-12-31")),
+        ("export_task_logs (user, date range)", crud.logs_export_stmt(1, "2024-01-01", "2024-12-31")),
+        ("get_day_event", crud.day_event_stmt(1, "2024-01-01", "retry-key")),
+        ("get_user_stats", crud.user_stats_stmt(1)),
+    ]
+
+def _plan_problems(conn, sql: str):
+    """Return (plan lines, problems) for one statement on the current dialect."""
+    dialect = conn.dialect.name
+    # only scans of real tables count: the query's own VALUES lists and CTEs are scanned by design
+    tables = set(Base.metadata.tables)
+    if dialect == "sqlite":
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql).all()
+        lines = [r[-1] for r in rows]
+        problems = [d for d in lines if (d.startswith("SCAN ") and " USING " not in d and d.split()[1] in tables)
+                    or "TEMP B-TREE" in d]
+        return lines, problems
+    if dialect == "mysql":
+        result = conn.exec_driver_sql("EXPLAIN " + sql)
+        cols = list(result.keys())
+        lines, problems = [], []
+        for r in result.all():
+            row = dict(zip(cols, r))
+            lines.append(f"table={row.get('table')} type={row.get('type')} key={row.get('key')} extra={row.get('Extra')}")
+            scan = row.get("table") in tables and (row.get("type") == "ALL" or row.get("key") is None)
+            if scan or "filesort" in (row.get("Extra") or ""):
+                problems.append(lines[-1])
+        return lines, problems
+    raise RuntimeError(f"EXPLAIN check not implemented for dialect {dialect!r}")
+
+def check(engine=None) -> bool:
+    """EXPLAIN each crud query; print its plan and return False if any one scans or sorts without an index."""
+    engine = engine or default_engine
+    ok = True
+    with engine.connect() as conn:
+        for name, stmt in sample_queries():
+            sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+            try:
+                lines, problems = _plan_problems(conn, sql)
+            except DBAPIError as e:
+                # e.g. table missing because `upgrade` has not been run yet
+                lines, problems = [str(e.orig)], [str(e.orig)]
+            status = "OK " if not problems else "BAD"
+            print(f"[{status}] {name}")
+            for line in lines:
+                print(f"        {line}")
+            ok = ok and not problems
+    return ok
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="StreaX schema migrations")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    up = sub.add_parser("upgrade", help="apply pending migrations")
+    up.add_argument("--to", type=int, default=None, help="target version (default latest)")
+    sub.add_parser("current", help="show applied and latest schema version")
+    sub.add_parser("check", help="EXPLAIN crud queries and verify they use indexes")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "upgrade":
+        v = upgrade(target=args.to)
+        print(f"Schema at version {v}.")
+    elif args.cmd == "current":
+        with default_engine.connect() as conn:
+            print(f"applied={current_version(conn)} latest={latest_version()}")
+    elif args.cmd == "check":
+        if not check():
+            print("Some queries do not use an index.")
+            return 1
+        print("All crud queries use an index.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
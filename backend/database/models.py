@@ -1,22 +1,59 @@
 # backend/database/models.py
-from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, Text, ForeignKey
-from sqlalchemy.orm import relationship
-from datetime import datetime
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, Text, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import relationship, foreign
+from sqlalchemy.schema import CreateColumn, PrimaryKeyConstraint
+from sqlalchemy.types import TypeDecorator
+from datetime import date, datetime
 from .connection import Base
 
+class LogDate(TypeDecorator):
+    """DATE column that also accepts ISO yyyy-mm-dd strings (what the write paths and query params carry)."""
+    impl = Date
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, str):
+            return date.fromisoformat(value)
+        return value
+
+# SQLite cannot autoincrement a column of a composite primary key. A table whose key is
+# (autoincrement id, other columns) -- task_logs, (id, date) for the MySQL partitions -- is
+# created there with the id alone as its key (the rowid), which is unique by itself anyway.
+def _rowid_key(table):
+    auto = table._autoincrement_column
+    return auto if auto is not None and len(table.primary_key.columns) > 1 else None
+
+@compiles(CreateColumn, "sqlite")
+def _sqlite_column(element, compiler, **kw):
+    column = element.element
+    if column is _rowid_key(column.table):
+        return f"{compiler.preparer.format_column(column)} INTEGER NOT NULL"
+    return compiler.visit_create_column(element, **kw)
+
+@compiles(PrimaryKeyConstraint, "sqlite")
+def _sqlite_primary_key(constraint, compiler, **kw):
+    key = _rowid_key(constraint.table)
+    if key is not None:
+        return f"PRIMARY KEY ({compiler.preparer.format_column(key)})"
+    return compiler.visit_primary_key_constraint(constraint, **kw)
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
-    username = Column(String(100), unique=True, nullable=False)
+    username = Column(String(100), unique=True, nullable=False)  # unique => indexed (get_user_by_username)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     total_xp = Column(Integer, default=0, nullable=False)
     current_level = Column(Integer, default=0, nullable=False)
     streak_days = Column(Integer, default=0, nullable=False)
     last_active_date = Column(String(20), default="", nullable=True)
     consecutive_misses = Column(Integer, default=0, nullable=False)
+    version = Column(Integer, default=0, server_default="0", nullable=False)  # bumped on every engine write (optimistic lock)
+    data_version = Column(Integer, default=0, server_default="0", nullable=False)  # ETags; database/user_versions.py
+    data_updated_at = Column(DateTime, default=datetime.utcnow, nullable=True)  # Last-Modified
 
     tasks = relationship("Task", back_populates="owner")
-    logs = relationship("TaskLog", back_populates="user")
+    logs = relationship("TaskLog", back_populates="user", primaryjoin="User.id == foreign(TaskLog.user_id)")
     achievements = relationship("Achievement", back_populates="user")
 
 class Task(Base):
@@ -31,18 +68,58 @@ class Task(Base):
 
     owner = relationship("User", back_populates="tasks")
 
+    __table_args__ = (
+        Index("ix_tasks_user_id_name", "user_id", "name"),  # ensure_task / ensure_tasks_bulk
+        Index("ix_tasks_user_id_id", "user_id", "id"),  # list_tasks_for_user (ordered by id)
+    )
+
 class TaskLog(Base):
+    """
+    Hot task history. On MySQL the table is RANGE partitioned by month on `date` (primary key
+    (id, date), no foreign keys: partitioned InnoDB tables cannot have them); see
+    database/log_archive.py, which also moves old months to task_logs_archive.
+    Logs of a deleted task are removed by crud.delete_task.
+    """
     __tablename__ = "task_logs"
-    id = Column(Integer, primary_key=True, index=True)
-    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    date = Column(String(20), nullable=False)  # ISO yyyy-mm-dd
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    task_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    date = Column(LogDate, primary_key=True, nullable=False)  # in the key for the partitions (SQLite: id alone)
     xp_awarded = Column(Integer, default=0)
     streak_at_time = Column(Integer, default=0)
     is_full_day = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
-    user = relationship("User", back_populates="logs")
+    user = relationship("User", back_populates="logs", primaryjoin="foreign(TaskLog.user_id) == User.id")
+
+    __table_args__ = (
+        Index("ix_task_logs_user_id_id", "user_id", "id"),  # list_logs_for_user (ordered by id desc)
+        Index("ix_task_logs_user_id_date", "user_id", "date", "id"),  # date-ranged reads
+        Index("ix_task_logs_task_id", "task_id"),  # delete_task
+    )
+
+class TaskLogArchive(Base):
+    """
+    Cold task history: task_logs rows older than the hot window, moved by database/log_archive.py.
+    Same ids and columns plus the task name (the task may be deleted later); compressed rows on MySQL.
+    """
+    __tablename__ = "task_logs_archive"
+    id = Column(Integer, primary_key=True, autoincrement=False)  # the task_logs id
+    task_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    task_name = Column(String(255), nullable=True)
+    date = Column(LogDate, nullable=False)
+    xp_awarded = Column(Integer, default=0)
+    streak_at_time = Column(Integer, default=0)
+    is_full_day = Column(Boolean, default=False)
+    created_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_task_logs_archive_user_id_id", "user_id", "id"),
+        Index("ix_task_logs_archive_user_id_date", "user_id", "date", "id"),
+        Index("ix_task_logs_archive_task_id", "task_id"),
+        {"mysql_row_format": "COMPRESSED", "mysql_key_block_size": "8"},
+    )
 
 class Achievement(Base):
     __tablename__ = "achievements"
@@ -52,3 +129,57 @@ class Achievement(Base):
     unlocked_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="achievements")
+
+    __table_args__ = (
+        Index("uq_achievements_user_id_name", "user_id", "name", unique=True),  # idempotent unlocks
+    )
+
+class AchievementCounter(Base):
+    """Cumulative completion counters ("tasks", "tasks:<type>") that achievement rules watch."""
+    __tablename__ = "achievement_counters"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    name = Column(String(100), primary_key=True)
+    value = Column(Integer, default=0, nullable=False)
+
+class UserStatsAgg(Base):
+    """Running per-user statistics (streax/stats.py), maintained by the /process-day write path."""
+    __tablename__ = "user_stats_agg"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    best_streak = Column(Integer, default=0, nullable=False)
+    active_days = Column(Integer, default=0, nullable=False)
+    first_date = Column(String(20), nullable=True)  # ISO yyyy-mm-dd
+    last_date = Column(String(20), nullable=True)
+    tasks = Column(Integer, default=0, nullable=False)
+    xp = Column(Integer, default=0, nullable=False)
+    week_start = Column(String(20), nullable=True)  # Monday of the week the week_* counters belong to
+    week_tasks = Column(Integer, default=0, nullable=False)
+    week_xp = Column(Integer, default=0, nullable=False)
+    month = Column(String(7), nullable=True)  # yyyy-mm
+    month_tasks = Column(Integer, default=0, nullable=False)
+    month_xp = Column(Integer, default=0, nullable=False)
+    by_type = Column(Text, nullable=False, default="{}")  # JSON {type: [completions, xp, days]}
+    by_task = Column(Text, nullable=False, default="{}")  # JSON {task name: completions}
+
+class DailyRollup(Base):
+    """Per-user, per-day activity totals maintained by the /process-day write path (heatmap reads)."""
+    __tablename__ = "daily_rollups"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    date = Column(String(20), primary_key=True)  # ISO yyyy-mm-dd (task_logs.date is a DATE)
+    task_count = Column(Integer, default=0, nullable=False)
+    scored_count = Column(Integer, default=0, server_default="0", nullable=False)  # logs with xp_awarded > 0
+    xp_sum = Column(Integer, default=0, nullable=False)
+
+class DayEvent(Base):
+    """One processed day per user: the engine event returned to the client, replayed for duplicate submissions."""
+    __tablename__ = "day_events"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    date = Column(String(20), nullable=False)  # ISO yyyy-mm-dd
+    idempotency_key = Column(String(100), nullable=True)
+    event = Column(Text, nullable=False)  # JSON
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "date", name="uq_day_events_user_id_date"),
+        UniqueConstraint("user_id", "idempotency_key", name="uq_day_events_user_id_key"),
+    )
@@ -0,0 +1,53 @@
+# backend/database/offload.py
+"""
+Blocking calls on the request path under DB_MODE=async.
+
+app/async_routes.py runs the (sync) handler bodies through AsyncSession.run_sync: a greenlet
+on the event loop thread, in which database I/O is awaited but anything else that blocks
+(a Redis round trip, the write-behind queue's SQLite file and its busy timeout, a CPU-bound
+loop) stalls every request of the worker.
+
+blocking(fn, ...) runs fn on a worker thread (anyio's, like starlette's run_in_threadpool)
+and suspends the calling greenlet until it returns, so the loop keeps serving meanwhile.
+Anywhere else (DB_MODE=sync threadpool handlers, the queue worker, CLI scripts) it is a plain
+call. fn must not use the session: only the greenlet may touch it.
+
+Decorate a method with @offloaded to make every call of it go through blocking().
+
+The hot reads under DB_MODE=async are plain `async def` handlers (app/async_routes.py), not
+greenlets: they `await call(fn, ...)`, which runs an @offloaded fn on a worker thread and
+anything else inline.
+"""
+import functools
+
+import greenlet
+from sqlalchemy.util import await_only
+
+def in_async_session() -> bool:
+    """True inside AsyncSession.run_sync / greenlet_spawn (the event loop thread)."""
+    return bool(getattr(greenlet.getcurrent(), "__sqlalchemy_greenlet_provider__", False))
+
+def blocking(fn, *args, **kwargs):
+    """fn(*args, **kwargs), off the event loop when called from an async session's greenlet."""
+    if not in_async_session():
+        return fn(*args, **kwargs)
+    from anyio import to_thread
+    return await_only(to_thread.run_sync(functools.partial(fn, *args, **kwargs)))
+
+def offloaded(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return blocking(fn, *args, **kwargs)
+    wrapper.offloaded = True
+    return wrapper
+
+async def in_thread(fn, *args, **kwargs):
+    """await fn(*args, **kwargs) on a worker thread (from an async def handler)."""
+    from anyio import to_thread
+    return await to_thread.run_sync(functools.partial(fn, *args, **kwargs))
+
+async def call(fn, *args, **kwargs):
+    """From an async def handler: fn(*args, **kwargs), on a worker thread if fn is @offloaded."""
+    if getattr(fn, "offloaded", False):
+        return await in_thread(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
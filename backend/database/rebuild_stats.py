@@ -0,0 +1,130 @@
+# backend/database/rebuild_stats.py
+"""
+Recompute user_stats_agg (streax/stats.py) from task_logs and task_logs_archive.
+
+/process-day keeps the aggregates up to date; run this after importing or editing history
+(deleted tasks drop their logs, but not their counts), or after a restore. Migration 7 runs
+it once to fill the table.
+
+Per chunk of user ids: one GROUP BY per (user, task type), one per (user, task name), one per
+user with conditional sums for the current week and month, and the longest streak from the
+vectorized replay (streax.replay; days without logs count as missed days unless
+--no-fill-gaps). Each user's row is replaced; one transaction per chunk.
+
+Task types and names are the tasks table's current ones.
+
+Usage (from backend/):
+    python database/rebuild_stats.py [--chunk-users 10000] [--today YYYY-MM-DD] [--no-fill-gaps] [--dry-run]
+"""
+import argparse
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+here = Path(__file__).resolve().parents[1]
+if str(here) not in sys.path:
+    sys.path.insert(0, str(here))
+
+from sqlalchemy import select, func, case
+from sqlalchemy.orm import Session
+
+from database.connection import engine as default_engine
+from database.models import User, Task
+from database import cache, crud
+from database.backfill_achievements import max_streaks
+from database.log_archive import all_logs
+from database.rebuild_users import user_id_chunks
+from streax import stats
+
+def _in_chunk(col, lo: int, hi: int, ids):
+    cond = [col >= lo, col < hi]
+    if ids is not None:
+        cond.append(col.in_(ids))
+    return cond
+
+def chunk_aggregates(conn, lo: int, hi: int, ids, today: date, fill_gaps: bool) -> dict:
+    """{user_id: aggregate dict} for the users in the chunk."""
+    week, month = stats.week_start(today), stats.month_of(today)
+    month_first = f"{month}-01"
+    logs = all_logs(lambda m: _in_chunk(m.user_id, lo, hi, ids))
+    xp = func.coalesce(logs.c.xp_awarded, 0)
+    aggs = {}
+    for uid, streak_days in conn.execute(
+            select(User.id, User.streak_days).where(*_in_chunk(User.id, lo, hi, ids))):
+        agg = aggs[uid] = stats.empty()
+        agg.update(best_streak=streak_days or 0, week_start=week, month=month)
+
+    for uid, first, last, days, tasks, xp_sum, w_tasks, w_xp, m_tasks, m_xp in conn.execute(
+        select(
+            logs.c.user_id, func.min(logs.c.date), func.max(logs.c.date),
+            func.count(func.distinct(logs.c.date)), func.count(logs.c.id), func.sum(xp),
+            func.sum(case((logs.c.date >= week, 1), else_=0)), func.sum(case((logs.c.date >= week, xp), else_=0)),
+            func.sum(case((logs.c.date >= month_first, 1), else_=0)),
+            func.sum(case((logs.c.date >= month_first, xp), else_=0)),
+        )
+        .group_by(logs.c.user_id)
+    ):
+        if uid in aggs:
+            aggs[uid].update(first_date=str(first), last_date=str(last), active_days=days, tasks=tasks, xp=int(xp_sum),
+                             week_tasks=int(w_tasks), week_xp=int(w_xp), month_tasks=int(m_tasks),
+                             month_xp=int(m_xp))
+
+    for uid, type_, n, xp_sum, days in conn.execute(
+        select(logs.c.user_id, Task.type, func.count(logs.c.id), func.sum(xp), func.count(func.distinct(logs.c.date)))
+        .join(Task, Task.id == logs.c.task_id)
+        .group_by(logs.c.user_id, Task.type)
+    ):
+        if uid in aggs:
+            aggs[uid]["by_type"][type_] = [n, int(xp_sum), days]
+
+    for uid, name, n in conn.execute(
+        select(logs.c.user_id, Task.name, func.count(logs.c.id))
+        .join(Task, Task.id == logs.c.task_id)
+        .group_by(logs.c.user_id, Task.name)
+    ):
+        if uid in aggs:
+            aggs[uid]["by_task"][name] = n
+
+    for uid, best in max_streaks(conn, lo, hi, fill_gaps, ids).items():
+        if uid in aggs:
+            aggs[uid]["best_streak"] = max(aggs[uid]["best_streak"], best)
+    return aggs
+
+def rebuild_stats(db: Session, chunk_users: int = 10000, user_ids=None, today: date = None,
+                  fill_gaps: bool = True, dry_run: bool = False, commit: bool = False, log=print) -> int:
+    """
+    Replace the aggregates of every user (or of user_ids). Returns the number of users.
+    commit=True commits per chunk and drops the users' cached stats; otherwise the caller commits.
+    """
+    today = today or date.today()
+    seen = 0
+    started = time.perf_counter()
+    for lo, hi, ids in user_id_chunks(db.connection(), chunk_users, user_ids):
+        aggs = chunk_aggregates(db.connection(), lo, hi, ids, today, fill_gaps)
+        seen += len(aggs)
+        if not dry_run:
+            crud.upsert_stats_aggs(db, aggs)
+            for uid in aggs:
+                cache.invalidate_user(db, uid)
+            if commit:
+                db.commit()
+        log(f"users {lo}..{hi - 1}: {len(aggs)} aggregates ({seen / max(time.perf_counter() - started, 1e-9):.0f} users/s)")
+    return seen
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute user_stats_agg from task_logs")
+    parser.add_argument("--chunk-users", type=int, default=10000, help="user id range per chunk")
+    parser.add_argument("--today", type=date.fromisoformat, default=None,
+                        help="date whose week and month the period counters cover (default: today)")
+    parser.add_argument("--no-fill-gaps", action="store_true", help="do not treat days without logs as missed days")
+    parser.add_argument("--dry-run", action="store_true", help="compute without writing")
+    args = parser.parse_args(argv)
+    with Session(bind=default_engine) as db:
+        seen = rebuild_stats(db, chunk_users=args.chunk_users, today=args.today,
+                             fill_gaps=not args.no_fill_gaps, dry_run=args.dry_run, commit=True)
+    print(f"Done: {seen} users{' (dry run)' if args.dry_run else ''}.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+# backend/database/rebuild_users.py
+"""
+Recompute users.total_xp / streak_days / consecutive_misses / current_level / last_active_date
+from the recorded history (task_logs plus task_logs_archive, and day_events), using the
+vectorized replay in streax.replay (same rules as streax.engine.process_day).
+
+Run after changing XP rules. Works in chunks of user ids: one GROUP BY query per chunk,
+one replay over the chunk's user-days, one executemany UPDATE, one commit. The UPDATE is
+version-checked, so it is safe alongside live /process-day traffic (see rebuild()).
+
+Usage (from backend/):
+    python database/rebuild_users.py [--chunk-users 10000] [--no-fill-gaps] [--dry-run]
+
+Notes:
+- Logs are grouped per (user, date): several /process-day calls on one date replay as one day.
+- A day's base XP is the sum of the tasks' *current* base_xp (logs store only awarded XP).
+- Zero-task /process-day calls leave no task_logs rows but a day_events row, and replay as
+  zero-task days. Days nobody processed are the missed-day sweeper's: by default every missing
+  day between two recorded days, and up to the stored last_active_date after the last one, is
+  replayed as a zero-task day (streak reset), as the sweeper applied it. --no-fill-gaps
+  replays recorded days only.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+here = Path(__file__).resolve().parents[1]
+if str(here) not in sys.path:
+    sys.path.insert(0, str(here))
+
+import numpy as np
+from sqlalchemy import select, update, func, case, bindparam, null, union_all
+
+from database.connection import engine as default_engine
+from database.models import User, Task, DayEvent
+from database.log_archive import all_logs
+from database import user_versions
+from database.engine_glue import DAILY_TARGET_COUNT  # the value /process-day passes to process_day
+from streax.replay import replay_days
+
+def day_index(dates) -> np.ndarray:
+    """ISO date strings (or date objects) -> days since 1970-01-01."""
+    return np.array([str(d) for d in dates], dtype="datetime64[D]").astype(np.int64)
+
+def day_iso(day: int) -> str:
+    return str(np.datetime64(int(day), "D"))
+
+def load_user_days(conn, uid_lo: int, uid_hi: int, user_ids=None):
+    """
+    Columnar per-(user, date) aggregates for users with uid_lo <= id < uid_hi (and in user_ids, if given),
+    over task_logs and task_logs_archive. Days in day_events without logs (zero-task /process-day
+    calls) are included with completed = 0.
+    """
+    def in_chunk(model):
+        cond = [model.user_id >= uid_lo, model.user_id < uid_hi]
+        if user_ids is not None:
+            cond.append(model.user_id.in_(user_ids))
+        return cond
+
+    logs = all_logs(in_chunk, names=("id", "task_id", "user_id", "date"))
+    days = union_all(
+        select(logs.c.id, logs.c.task_id, logs.c.user_id, logs.c.date),
+        select(null(), null(), DayEvent.user_id, DayEvent.date).where(*in_chunk(DayEvent)),
+    ).subquery("days")
+    q = (
+        select(
+            days.c.user_id,
+            days.c.date,
+            func.count(days.c.id),
+            func.coalesce(func.sum(func.coalesce(Task.base_xp, 0)), 0),
+            func.coalesce(func.sum(case((Task.required_daily, 1), else_=0)), 0),
+        )
+        .outerjoin(Task, Task.id == days.c.task_id)
+        .group_by(days.c.user_id, days.c.date)
+    )
+    rows = conn.execute(q).all()
+    if not rows:
+        return None
+    cols = list(zip(*rows))
+    return {
+        "user_ids": np.array(cols[0], dtype=np.int64),
+        "days": day_index(cols[1]),
+        "completed": np.array(cols[2], dtype=np.int64),
+        "base_xp": np.array(cols[3], dtype=np.int64),
+        "required_completed": np.array(cols[4], dtype=np.int64),
+    }
+
+def with_swept_days(cols: dict, last_active: dict) -> dict:
+    """
+    cols plus a zero-task day on each user's stored last_active_date ({user_id: ISO date}) where
+    that is after the user's last recorded day: the days the missed-day sweep applied after it.
+    Replayed with fill_gaps, they give the sweep's consecutive_misses += k, streak_days = 0.
+    """
+    last_day = {}
+    for uid, day in zip(cols["user_ids"].tolist(), cols["days"].tolist()):
+        last_day[uid] = max(day, last_day.get(uid, day))
+    extra = [(uid, stored) for uid, stored in
+             ((uid, int(day_index([last_active[uid]])[0])) for uid in last_day if last_active.get(uid))
+             if stored > last_day[uid]]
+    if not extra:
+        return cols
+    n = len(extra)
+    return {
+        "user_ids": np.concatenate([cols["user_ids"], np.array([u for u, _ in extra], dtype=np.int64)]),
+        "days": np.concatenate([cols["days"], np.array([d for _, d in extra], dtype=np.int64)]),
+        "completed": np.concatenate([cols["completed"], np.zeros(n, dtype=np.int64)]),
+        "base_xp": np.concatenate([cols["base_xp"], np.zeros(n, dtype=np.int64)]),
+        "required_completed": np.concatenate([cols["required_completed"], np.zeros(n, dtype=np.int64)]),
+    }
+
+def user_id_chunks(conn, chunk_users: int, user_ids=None):
+    """(lo, hi, ids or None) per chunk: id ranges over the whole table, or chunks of the given ids."""
+    if user_ids is not None:
+        ids = sorted(set(user_ids))
+        for i in range(0, len(ids), chunk_users):
+            part = ids[i:i + chunk_users]
+            yield part[0], part[-1] + 1, part
+        return
+    users_tbl = User.__table__
+    lo_id, hi_id = conn.execute(select(func.min(users_tbl.c.id), func.max(users_tbl.c.id))).one()
+    if lo_id is None:
+        return
+    for lo in range(lo_id, hi_id + 1, chunk_users):
+        yield lo, lo + chunk_users, None
+
+REBUILD_ATTEMPTS = 3  # replays of a chunk whose rows keep changing under the rebuild
+
+def rebuild(engine=None, chunk_users: int = 10000, fill_gaps: bool = True, dry_run: bool = False,
+            user_ids=None, log=print):
+    """
+    Returns (users_seen, users_changed). With user_ids, only those users are rebuilt
+    (chunks of chunk_users ids instead of id ranges). Written rows get users.version and their data
+    version (database/user_versions.py) bumped.
+    Each UPDATE repeats the users.version read before the replay, so a row a /process-day wrote
+    meanwhile is not overwritten: the chunk is replayed again from the fresh rows (rows already
+    rebuilt no longer differ), up to REBUILD_ATTEMPTS times; rows still changing after that are
+    skipped and reported (rerun with their ids).
+    """
+    engine = engine or default_engine
+    users_tbl = User.__table__
+    stmt = (
+        update(users_tbl)
+        .where(users_tbl.c.id == bindparam("b_id"), users_tbl.c.version == bindparam("b_version"))
+        .values(
+            total_xp=bindparam("b_total_xp"),
+            streak_days=bindparam("b_streak_days"),
+            consecutive_misses=bindparam("b_consecutive_misses"),
+            current_level=bindparam("b_current_level"),
+            last_active_date=bindparam("b_last_active_date"),
+            version=users_tbl.c.version + 1,
+        )
+    )
+    seen = changed = skipped = 0
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        for lo, hi, ids in user_id_chunks(conn, chunk_users, user_ids):
+            chunk_seen = None
+            for _ in range(REBUILD_ATTEMPTS):
+                n_seen, diff, replayed = _chunk_diff(conn, lo, hi, ids, fill_gaps)
+                chunk_seen = n_seen if chunk_seen is None else chunk_seen
+                written = len(diff)
+                if diff and not dry_run:
+                    written = conn.execute(stmt.values(**user_versions.bump_values()), diff).rowcount
+                conn.commit()  # also ends the read snapshot: a retry must see the rows that moved on
+                changed += written
+                if written == len(diff):
+                    break
+            else:
+                skipped += len(diff) - written
+                log(f"users {lo}..{hi - 1}: {len(diff) - written} users kept changing, skipped: "
+                    f"{sorted(d['b_id'] for d in diff)[:20]}")
+            seen += chunk_seen
+            elapsed = time.perf_counter() - started
+            log(f"users {lo}..{hi - 1}: {replayed} user-days replayed, {changed} changed so far "
+                f"({seen / max(elapsed, 1e-9):.0f} users/s)")
+    if skipped:
+        log(f"{skipped} users skipped (written concurrently on every attempt); rerun to include them")
+    return seen, changed
+
+def _chunk_diff(conn, lo: int, hi: int, ids, fill_gaps: bool):
+    """
+    Replay one chunk: (users with history, UPDATE parameters of the users whose row differs from
+    the replay, user-days replayed). Rows are read before the history, so a day committed in
+    between makes the version check fail rather than go missing.
+    """
+    users_tbl = User.__table__
+    cond = [users_tbl.c.id >= lo, users_tbl.c.id < hi]
+    if ids is not None:
+        cond.append(users_tbl.c.id.in_(ids))
+    current = {row[0]: tuple(row[1:]) for row in conn.execute(
+        select(users_tbl.c.id, users_tbl.c.version, users_tbl.c.total_xp, users_tbl.c.streak_days,
+               users_tbl.c.consecutive_misses, users_tbl.c.current_level, users_tbl.c.last_active_date)
+        .where(*cond))}
+    cols = load_user_days(conn, lo, hi, ids)
+    if cols is None:
+        return 0, [], 0
+    if fill_gaps:
+        cols = with_swept_days(cols, {uid: row[-1] for uid, row in current.items()})
+    r = replay_days(daily_target_count=DAILY_TARGET_COUNT, fill_gaps=fill_gaps, **cols)
+    diff = []
+    last = r.final_rows()
+    for i in last:
+        uid = int(r.user_ids[i])
+        values = (int(r.total_xp[i]), int(r.streak_days[i]), int(r.consecutive_misses[i]),
+                  int(r.current_level[i]), day_iso(r.days[i]))
+        if uid in current and current[uid][1:] != values:
+            diff.append({"b_id": uid, "b_version": current[uid][0], "b_total_xp": values[0],
+                         "b_streak_days": values[1], "b_consecutive_misses": values[2],
+                         "b_current_level": values[3], "b_last_active_date": values[4]})
+    return len(last), diff, len(r.day_xp)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild users table state from task_logs")
+    parser.add_argument("--chunk-users", type=int, default=10000, help="user id range per chunk")
+    parser.add_argument("--no-fill-gaps", dest="fill_gaps", action="store_false",
+                        help="replay only recorded days (default: days without a record are zero-task days)")
+    parser.add_argument("--dry-run", action="store_true", help="report differences without writing")
+    args = parser.parse_args(argv)
+    seen, changed = rebuild(chunk_users=args.chunk_users, fill_gaps=args.fill_gaps, dry_run=args.dry_run)
+    verb = "would change" if args.dry_run else "updated"
+    print(f"Done: {seen} users with history, {verb} {changed}.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+# backend/database/recompute_levels.py
+"""
+Recompute users.current_level from users.total_xp with the configured level curve
+(streax/levels.py, LEVEL_CURVE env). Run after changing the curve; migration 6 runs it once.
+
+Users are read in id order in chunks (keyset on id); only rows whose level changes are
+written, with one executemany UPDATE per chunk that also bumps users.version and the user's
+data version (database/user_versions.py).
+Cached profiles pick the new level up after CACHE_TTL_SECONDS. Newly reached level
+achievements are awarded by database/backfill_achievements.py.
+
+Usage (from backend/):
+    python database/recompute_levels.py [--chunk 10000] [--dry-run]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+here = Path(__file__).resolve().parents[1]
+if str(here) not in sys.path:
+    sys.path.insert(0, str(here))
+
+from sqlalchemy import select, update, bindparam
+
+from database.connection import engine as default_engine
+from database.models import User
+from database import user_versions
+from streax import levels
+
+def recompute_levels(conn, chunk: int = 10000, dry_run: bool = False, commit: bool = False, log=print,
+                     bump_data_versions: bool = True):
+    """
+    Returns (users_seen, users_changed). commit=True commits per chunk (CLI); otherwise the caller does.
+    bump_data_versions=False is for migration 6, which runs before users.data_version exists.
+    """
+    users_tbl = User.__table__
+    stmt = (
+        update(users_tbl)
+        .where(users_tbl.c.id == bindparam("b_id"))
+        .values(current_level=bindparam("b_level"), version=users_tbl.c.version + 1)
+    )
+    curve = levels.curve
+    seen = changed = 0
+    after_id = 0
+    started = time.perf_counter()
+    while True:
+        rows = conn.execute(
+            select(users_tbl.c.id, users_tbl.c.total_xp, users_tbl.c.current_level)
+            .where(users_tbl.c.id > after_id)
+            .order_by(users_tbl.c.id.asc())
+            .limit(chunk)
+        ).all()
+        if not rows:
+            break
+        after_id = rows[-1][0]
+        diff = []
+        for uid, total_xp, level in rows:
+            new = curve.level_for(total_xp or 0)
+            if new != level:
+                diff.append({"b_id": uid, "b_level": new})
+        seen += len(rows)
+        changed += len(diff)
+        if diff and not dry_run:
+            conn.execute(stmt.values(**user_versions.bump_values()) if bump_data_versions else stmt, diff)
+            if commit:
+                conn.commit()
+        log(f"up to id {after_id}: {len(diff)} levels changed "
+            f"({seen / max(time.perf_counter() - started, 1e-9):.0f} users/s)")
+    return seen, changed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute users.current_level with the configured level curve")
+    parser.add_argument("--chunk", type=int, default=10000, help="users per chunk")
+    parser.add_argument("--dry-run", action="store_true", help="count changes without writing")
+    args = parser.parse_args(argv)
+    print(f"Level curve: {levels.curve.describe()}")
+    with default_engine.connect() as conn:
+        seen, changed = recompute_levels(conn, chunk=args.chunk, dry_run=args.dry_run, commit=True)
+    verb = "would change" if args.dry_run else "changed"
+    print(f"Done: {seen} users, {verb} {changed} levels.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
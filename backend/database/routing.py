@@ -0,0 +1,238 @@
+# backend/database/routing.py
+"""
+Read-replica routing for the read-only crud functions.
+
+With MYSQL_REPLICA_URLS set (comma-separated; each gets its own pool, same DB_POOL_*
+settings as the primary), the crud functions decorated with @replica_read
+(get_user, get_user_profile, list_tasks_for_user / list_task_rows,
+list_logs_for_user / list_log_rows, get_activity, get_user_stats, and the ETag
+lookup user_versions.current) run on a replica, picked round-robin per session
+(connection.RoutingSession). Everything else goes to the primary.
+
+A replica read happens only when all of these hold:
+  - the session was opened for a read-only request (app get_db: GET / HEAD calls
+    allow_replica_reads); write endpoints read what they are about to write from
+    the primary, so /process-day never computes from a lagging row
+  - the session has no writes pending in its transaction (new / dirty / deleted
+    objects, or users already marked by cache.invalidate_user)
+  - the user has not written in the last REPLICA_STICKY_SECONDS (default 5): a
+    commit that changed a user's data (every crud write marks the user with
+    cache.invalidate_user) makes that user's reads stick to the primary, so a
+    client sees its own writes. Set the window above the usual replica lag.
+
+Rows loaded from a replica are not put into the read-through cache (database/cache.py):
+a lagging replica could otherwise re-cache a row that a commit has just invalidated.
+
+Sticky marks are kept per process; with CACHE_BACKEND=redis they are also written
+to the shared cache backend, so every worker (and the write-behind workers' commits)
+sees them.
+
+Local testing: point MYSQL_URL and MYSQL_REPLICA_URLS at SQLite files and copy the
+primary into the replicas with `python database/routing.py copy-sqlite` (a stand-in
+for replication), or at two local MySQL instances.
+
+Usage (from backend/):
+    python database/routing.py status
+    python database/routing.py copy-sqlite
+"""
+import argparse
+import functools
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable
+
+here = Path(__file__).resolve().parents[1]
+if str(here) not in sys.path:
+    sys.path.insert(0, str(here))
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from database import cache
+from database.connection import engine as primary_engine, replica_engines
+
+STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+
+class RoutingStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.replica_reads = 0
+        self.primary_reads_sticky = 0     # user wrote within the sticky window
+        self.primary_reads_writing = 0    # session has writes in its transaction
+
+    def incr(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self) -> dict:
+        return {
+            "replicas": len(replica_engines),
+            "sticky_seconds": STICKY_SECONDS,
+            "replica_reads": self.replica_reads,
+            "primary_reads_sticky": self.primary_reads_sticky,
+            "primary_reads_writing": self.primary_reads_writing,
+        }
+
+class StickyUsers:
+    """user_id -> monotonic time until which the user's reads go to the primary."""
+
+    def __init__(self, seconds: float, max_entries: int = 100000):
+        self.seconds = seconds
+        self.max_entries = max_entries
+        self._until = {}
+        self._lock = threading.Lock()
+
+    def mark(self, user_ids: Iterable[int]):
+        until = time.monotonic() + self.seconds
+        with self._lock:
+            for uid in user_ids:
+                self._until[uid] = until
+            if len(self._until) > self.max_entries:
+                now = time.monotonic()
+                self._until = {u: t for u, t in self._until.items() if t > now}
+        if cache.backend.name == "redis":
+            for uid in user_ids:
+                cache.backend.set(f"primary:{uid}", {"sticky": True}, self.seconds)
+
+    def is_sticky(self, user_id: int) -> bool:
+        until = self._until.get(user_id)
+        if until is not None and until > time.monotonic():
+            return True
+        return cache.backend.name == "redis" and cache.backend.get(f"primary:{user_id}") is not None
+
+stats = RoutingStats()
+sticky = StickyUsers(STICKY_SECONDS)
+
+def allow_replica_reads(db: Session):
+    """Let @replica_read functions use a replica in this session (read-only requests)."""
+    db.info["replica_ok"] = True
+
+def on_replica(db: Session) -> bool:
+    """True while a @replica_read function runs on a replica (crud does not cache what it loads then)."""
+    return bool(db.info.get("replica_reads"))
+
+def _has_writes(db: Session) -> bool:
+    return bool(db.new or db.dirty or db.deleted or cache.pending_invalidations(db))
+
+def replica_allowed(db: Session) -> bool:
+    """The session has replicas and was opened for a read-only request."""
+    return bool(getattr(db, "replicas", None) and db.info.get("replica_ok"))
+
+def choose_replica(db: Session, user_id: int, is_sticky) -> bool:
+    """
+    Whether a read of user_id goes to a replica (replica_allowed(db) already holds); counted in stats.
+    is_sticky(user_id) is asked once per session and user: the ETag lookup and the body of one
+    request must not come from the primary and then a lagging replica because the window ran out
+    in between.
+    """
+    if _has_writes(db):
+        stats.incr("primary_reads_writing")
+        return False
+    decided = db.info.setdefault("replica_users", {})
+    if user_id not in decided:
+        decided[user_id] = not is_sticky(user_id)
+    if not decided[user_id]:
+        stats.incr("primary_reads_sticky")
+        return False
+    stats.incr("replica_reads")
+    return True
+
+@contextmanager
+def reading_replica(db: Session):
+    """Send the session's statements to its replica inside the block (connection.RoutingSession)."""
+    db.info["replica_reads"] = db.info.get("replica_reads", 0) + 1
+    try:
+        yield
+    finally:
+        db.info["replica_reads"] -= 1
+
+def replica_read(fn):
+    """Run a read-only crud function `fn(db, user_id, ...)` on a replica when allowed (see module doc)."""
+    @functools.wraps(fn)
+    def wrapper(db, *args, **kwargs):
+        if not replica_allowed(db):
+            return fn(db, *args, **kwargs)
+        user_id = kwargs["user_id"] if "user_id" in kwargs else args[0]
+        if not choose_replica(db, user_id, sticky.is_sticky):
+            return fn(db, *args, **kwargs)
+        with reading_replica(db):
+            return fn(db, *args, **kwargs)
+    return wrapper
+
+# -------------------------
+# Sticky marks (after commit)
+# -------------------------
+if replica_engines:
+    @event.listens_for(Session, "before_commit")
+    def _collect_writers(session):
+        user_ids = cache.pending_invalidations(session)
+        if user_ids:
+            session.info["routing_written"] = set(user_ids)
+
+    @event.listens_for(Session, "after_commit")
+    def _mark_writers(session):
+        user_ids = session.info.pop("routing_written", None)
+        if user_ids:
+            sticky.mark(user_ids)
+
+    @event.listens_for(Session, "after_rollback")
+    def _drop_writers(session):
+        session.info.pop("routing_written", None)
+
+# -------------------------
+# CLI
+# -------------------------
+def status():
+    from database.models import User
+    for name, eng in [("primary", primary_engine)] + [(f"replica{i}", e) for i, e in enumerate(replica_engines)]:
+        try:
+            with eng.connect() as conn:
+                users = conn.execute(select(func.count()).select_from(User)).scalar()
+                lag = ""
+                if name != "primary" and conn.dialect.name == "mysql":
+                    row = conn.exec_driver_sql("SHOW REPLICA STATUS").mappings().first()
+                    lag = f", Seconds_Behind_Source={row.get('Seconds_Behind_Source') if row else 'n/a'}"
+            print(f"{name}: {eng.url.render_as_string(hide_password=True)} users={users}{lag}")
+        except Exception as e:  # report every database, even if one is down
+            print(f"{name}: {eng.url.render_as_string(hide_password=True)} ERROR {e}")
+
+def copy_sqlite():
+    """Copy the primary SQLite database into every replica file (sqlite3 backup API)."""
+    import sqlite3
+    engines = [primary_engine] + replica_engines
+    if any(e.dialect.name != "sqlite" for e in engines):
+        raise SystemExit("copy-sqlite needs SQLite primary and replica URLs")
+    src = sqlite3.connect(primary_engine.url.database)
+    try:
+        for e in replica_engines:
+            e.dispose()
+            dst = sqlite3.connect(e.url.database)
+            try:
+                src.backup(dst)
+            finally:
+                dst.close()
+            print(f"copied {primary_engine.url.database} -> {e.url.database}")
+    finally:
+        src.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read replica status and local SQLite replica copies")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status", help="connect to the primary and every replica")
+    sub.add_parser("copy-sqlite", help="copy the primary SQLite file into the replica files")
+    args = parser.parse_args(argv)
+    if not replica_engines:
+        print("MYSQL_REPLICA_URLS is not set.")
+        return 1
+    if args.cmd == "status":
+        status()
+    else:
+        copy_sqlite()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+# backend/database/simulate.py
+"""
+XP rule-change simulation over the real task log history, and per-user XP projections
+(streax/simulate.py does the math; nothing is written).
+
+    replay   replay every user's history under the baseline rules (what the engine
+             applies now) and a candidate rule set, in user-id chunks (same chunks and
+             per-(user, date) query as rebuild_users.py) spread over a process pool;
+             a running Summary (XP, level and best-streak histograms, per-user change)
+             is reported after every finished chunk
+    project  Monte Carlo projection of one user N days forward under both rule sets,
+             from the user's activity in the last --window days
+
+The history is task_logs plus task_logs_archive (months moved by log_archive.py).
+baseline_mismatch_users counts users whose stored total_xp the baseline replay does
+not reproduce (e.g. rules changed without rebuild_users.py).
+
+Usage (from backend/):
+    python database/simulate.py replay --streak-cap 0.5 [--workers 4] [--chunk-users 5000] [--no-fill-gaps]
+    python database/simulate.py project --user-id 42 --days 90 --full-day-bonus 0.2 [--runs 1000] [--seed 7]
+
+SIMULATE_WORKERS sets the default pool size (default: CPU count, at most 4).
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from datetime import date
+from pathlib import Path
+from typing import Iterator, Optional
+
+here = Path(__file__).resolve().parents[1]
+if str(here) not in sys.path:
+    sys.path.insert(0, str(here))
+
+from sqlalchemy import select
+
+from database.connection import engine as default_engine
+from database.models import User
+from database.rebuild_users import DAILY_TARGET_COUNT, day_index, load_user_days, user_id_chunks
+from streax.simulate import Rules, Summary, project, summarize_replay
+
+BASELINE = Rules(daily_target_count=DAILY_TARGET_COUNT)
+WORKERS = int(os.getenv("SIMULATE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+def _replay_chunk(task) -> Summary:
+    """One user-id chunk (runs in a pool worker, which has its own engine)."""
+    lo, hi, ids, baseline, candidate, fill_gaps = task
+    users_tbl = User.__table__
+    with default_engine.connect() as conn:
+        cols = load_user_days(conn, lo, hi, ids)
+        if cols is None:
+            return Summary()
+        q = select(users_tbl.c.id, users_tbl.c.total_xp).where(users_tbl.c.id >= lo, users_tbl.c.id < hi)
+        if ids is not None:
+            q = q.where(users_tbl.c.id.in_(ids))
+        stored = dict(conn.execute(q).all())
+    return summarize_replay(cols, baseline, candidate, fill_gaps=fill_gaps, stored_total_xp=stored)
+
+def simulate_history(candidate: Rules, baseline: Rules = BASELINE, workers: int = None,
+                     chunk_users: int = 5000, fill_gaps: bool = True, user_ids=None) -> Iterator[dict]:
+    """
+    Yield the running summary (Summary.as_dict() plus progress) after every finished chunk;
+    the last one has "done": True. Chunks finish in any order; histograms merge by addition.
+    """
+    workers = WORKERS if workers is None else workers
+    with default_engine.connect() as conn:
+        chunks = list(user_id_chunks(conn, chunk_users, user_ids))
+    tasks = [(lo, hi, ids, baseline, candidate, fill_gaps) for lo, hi, ids in chunks]
+    total = Summary()
+    started = time.perf_counter()
+
+    def report(done: int) -> dict:
+        elapsed = time.perf_counter() - started
+        return {"chunks_done": done, "chunks_total": len(tasks), "done": done == len(tasks),
+                "elapsed_s": round(elapsed, 3), "users_per_s": round(total.users / max(elapsed, 1e-9), 1),
+                "baseline_rules": baseline.as_dict(), "candidate_rules": candidate.as_dict(),
+                **total.as_dict()}
+
+    if not tasks:
+        yield report(0)
+        return
+    if workers <= 1 or len(tasks) == 1:
+        for done, task in enumerate(tasks, 1):
+            total.merge(_replay_chunk(task))
+            yield report(done)
+        return
+    # spawn: workers must not inherit the parent's open pool connections
+    pool = mp.get_context("spawn").Pool(min(workers, len(tasks)))
+    try:
+        for done, part in enumerate(pool.imap_unordered(_replay_chunk, tasks), 1):
+            total.merge(part)
+            yield report(done)
+    finally:
+        # also reached when a streaming client disconnects: drop the chunks still queued
+        pool.terminate()
+        pool.join()
+
+def project_user(user_id: int, days: int = 90, runs: int = 1000, candidate: Rules = BASELINE,
+                 baseline: Rules = BASELINE, window_days: int = 90, seed: Optional[int] = None,
+                 today: date = None) -> Optional[dict]:
+    """Projection of one user (see streax.simulate.project); None if there is no such user."""
+    today_idx = int(day_index([(today or date.today()).isoformat()])[0])
+    users_tbl = User.__table__
+    with default_engine.connect() as conn:
+        row = conn.execute(
+            select(users_tbl.c.total_xp, users_tbl.c.streak_days, users_tbl.c.consecutive_misses)
+            .where(users_tbl.c.id == user_id)
+        ).first()
+        if row is None:
+            return None
+        cols = load_user_days(conn, user_id, user_id + 1)
+    state = {"total_xp": row[0] or 0, "streak_days": row[1] or 0, "consecutive_misses": row[2] or 0}
+    profile = {"completed": [], "base_xp": [], "required_completed": []}
+    active_rate = 0.0
+    if cols is not None:
+        recent = (cols["days"] > today_idx - window_days) & (cols["completed"] > 0)
+        profile = {name: cols[name][recent] for name in profile}
+        # a user who started within the window is measured over the days since their first log
+        observed = min(window_days, today_idx - int(cols["days"].min()) + 1)
+        active_rate = min(1.0, int(recent.sum()) / max(observed, 1))
+    out = project(state, profile, active_rate, days, runs,
+                  {"baseline": baseline, "candidate": candidate}, seed=seed)
+    out["user_id"] = user_id
+    out["window_days"] = window_days
+    return out
+
+# -------------------------
+# CLI
+# -------------------------
+def _rule_args(parser):
+    g = parser.add_argument_group("candidate rules (default: the current rules)")
+    g.add_argument("--streak-step", type=float, help=f"multiplier added per streak day ({BASELINE.streak_step})")
+    g.add_argument("--streak-cap", type=float, help=f"cap of the streak bonus ({BASELINE.streak_cap})")
+    g.add_argument("--full-day-bonus", type=float, help=f"bonus when the daily target is met ({BASELINE.full_day_bonus})")
+    g.add_argument("--daily-target", type=int, help=f"required tasks for a full day ({BASELINE.daily_target_count})")
+    g.add_argument("--curve", choices=["linear", "power"], help="level curve (default: LEVEL_CURVE)")
+    g.add_argument("--curve-base", type=int)
+    g.add_argument("--curve-exponent", type=float)
+
+def _candidate(args) -> Rules:
+    return BASELINE.replace(streak_step=args.streak_step, streak_cap=args.streak_cap,
+                            full_day_bonus=args.full_day_bonus, daily_target_count=args.daily_target,
+                            curve=args.curve, curve_base=args.curve_base, curve_exponent=args.curve_exponent)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate XP rule changes on the task log history")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("replay", help="replay all history under the current and the candidate rules")
+    _rule_args(p)
+    p.add_argument("--workers", type=int, default=WORKERS, help="worker processes (1: run inline)")
+    p.add_argument("--chunk-users", type=int, default=5000, help="user id range per chunk")
+    p.add_argument("--no-fill-gaps", action="store_true", help="do not treat days without logs as zero-task days")
+    p = sub.add_parser("project", help="project one user forward under the current and the candidate rules")
+    _rule_args(p)
+    p.add_argument("--user-id", type=int, required=True)
+    p.add_argument("--days", type=int, default=90)
+    p.add_argument("--runs", type=int, default=1000)
+    p.add_argument("--window", type=int, default=90, help="days of history the activity is sampled from")
+    p.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+    if args.curve_exponent is not None and not 0.5 <= args.curve_exponent <= 4:
+        parser.error("--curve-exponent must be in 0.5..4 (the level table is int64)")
+    candidate = _candidate(args)
+
+    if args.cmd == "project":
+        result = project_user(args.user_id, args.days, args.runs, candidate,
+                              window_days=args.window, seed=args.seed)
+        if result is None:
+            print(f"No user {args.user_id}.")
+            return 1
+        print(json.dumps(result, indent=2))
+        return 0
+
+    summary = None
+    for summary in simulate_history(candidate, workers=args.workers, chunk_users=args.chunk_users,
+                                    fill_gaps=not args.no_fill_gaps):
+        print(f"chunks {summary['chunks_done']}/{summary['chunks_total']}: {summary['users']} users, "
+              f"{summary['user_days']} user-days ({summary['users_per_s']:.0f} users/s)", file=sys.stderr)
+    print(json.dumps(summary, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
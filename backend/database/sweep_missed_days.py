@@ -0,0 +1,138 @@
+# backend/database/sweep_missed_days.py
+"""
+Nightly missed-day sweep: apply the process_day zero-task transition for every day a
+user did not process, so stored streaks are never stale.
+
+For a user whose last_active_date is before yesterday, each missing day up to and
+including yesterday is a zero-task day: no XP, streak_days -> 0, consecutive_misses + 1,
+last_active_date -> that day. Applied k times that is
+
+    streak_days = 0, consecutive_misses += k, last_active_date = yesterday
+
+so users are grouped by last_active_date and each group gets one set-based UPDATE.
+Users are walked in id order in chunks (keyset on id), one transaction per chunk.
+
+Safe alongside live traffic: each UPDATE repeats `last_active_date = <value read>` in
+its WHERE, so a user who processed a day in the meantime is left alone, and it bumps
+users.version, so an in-flight /process-day that read the old row recomputes. Rerunning
+is harmless (swept users are no longer before yesterday), so an interrupted run can be
+restarted, or resumed from the last printed id with --after-id.
+
+Users who never processed a day (empty last_active_date) are skipped, and so are users
+with days still in the write-behind queue (WRITE_BEHIND=1, database/write_queue.py): their
+last day was processed, only not written yet. Run the sweep where it sees that queue file.
+The UPDATE also bumps the users' data versions (database/user_versions.py). Cache
+entries and leaderboard scores follow the usual after-commit hooks; with the
+per-process memory backends, API workers see the new streaks after the cache TTL and
+their next leaderboard rebuild.
+
+Usage (from backend/), e.g. from cron shortly after midnight:
+    python database/sweep_missed_days.py [--today YYYY-MM-DD] [--chunk 5000] [--after-id N] [--dry-run]
+"""
+import argparse
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+here = Path(__file__).resolve().parents[1]
+if str(here) not in sys.path:
+    sys.path.insert(0, str(here))
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from database.connection import engine as default_engine
+from database.models import User
+from database import cache, leaderboard, user_versions, write_queue
+
+def missed_days(last_active_date: str, yesterday: date) -> int:
+    """Zero-task days to apply for a user last active on last_active_date (0 if none or unparseable)."""
+    try:
+        last = date.fromisoformat(last_active_date)
+    except (TypeError, ValueError):
+        return 0
+    return max(0, (yesterday - last).days)
+
+def sweep(engine=None, today: date = None, chunk: int = 5000, after_id: int = 0, dry_run: bool = False):
+    """Returns (users_swept, missed_days_applied)."""
+    engine = engine or default_engine
+    yesterday = (today or date.today()) - timedelta(days=1)
+    yesterday_iso = yesterday.isoformat()
+    users_tbl = User.__table__
+    swept = days_applied = 0
+    started = time.perf_counter()
+    with Session(bind=engine) as db:
+        while True:
+            rows = db.execute(
+                select(users_tbl.c.id, users_tbl.c.last_active_date)
+                .where(users_tbl.c.id > after_id,
+                       users_tbl.c.last_active_date < yesterday_iso,
+                       users_tbl.c.last_active_date != "")
+                .order_by(users_tbl.c.id.asc())
+                .limit(chunk)
+            ).all()
+            if not rows:
+                break
+            after_id = rows[-1][0]
+
+            queued = write_queue.get_queue().users_in_flight(uid for uid, _ in rows) if write_queue.ENABLED else ()
+            groups = {}
+            for uid, last in rows:
+                if uid in queued:
+                    continue
+                k = missed_days(last, yesterday)
+                if k:
+                    groups.setdefault((last, k), []).append(uid)
+
+            chunk_swept = 0
+            for (last, k), ids in groups.items():
+                if dry_run:
+                    chunk_swept += len(ids)
+                    days_applied += k * len(ids)
+                    continue
+                result = db.execute(
+                    update(users_tbl)
+                    .where(users_tbl.c.id.in_(ids), users_tbl.c.last_active_date == last)
+                    .values(streak_days=0,
+                            consecutive_misses=users_tbl.c.consecutive_misses + k,
+                            last_active_date=yesterday_iso,
+                            version=users_tbl.c.version + 1,
+                            **user_versions.bump_values())
+                )
+                chunk_swept += result.rowcount
+                days_applied += k * result.rowcount
+
+            if not dry_run and groups:
+                # re-read instead of trusting the first SELECT: rows skipped because of a
+                # concurrent /process-day must not get stale scores pushed to the leaderboard
+                ids = [uid for group in groups.values() for uid in group]
+                user_versions.mark_bumped(db, ids)  # by the UPDATE, or by the concurrent writer that beat it
+                for uid, total_xp, streak_days in db.execute(
+                        select(users_tbl.c.id, users_tbl.c.total_xp, users_tbl.c.streak_days)
+                        .where(users_tbl.c.id.in_(ids))):
+                    cache.invalidate_user(db, uid)
+                    leaderboard.record_scores(db, uid, total_xp, streak_days)
+                db.commit()
+
+            swept += chunk_swept
+            elapsed = time.perf_counter() - started
+            print(f"up to id {after_id}: {chunk_swept} users swept "
+                  f"({swept} total, {swept / max(elapsed, 1e-9):.0f} users/s)")
+    return swept, days_applied
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply zero-task days for users who missed days")
+    parser.add_argument("--today", type=date.fromisoformat, default=None,
+                        help="sweep days before this date (default: today)")
+    parser.add_argument("--chunk", type=int, default=5000, help="users per transaction")
+    parser.add_argument("--after-id", type=int, default=0, help="resume after this user id")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args(argv)
+    swept, days = sweep(today=args.today, chunk=args.chunk, after_id=args.after_id, dry_run=args.dry_run)
+    verb = "would sweep" if args.dry_run else "swept"
+    print(f"Done: {verb} {swept} users, {days} missed days.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+# backend/database/test_crud.py
+"""
+database/crud.py bulk helpers: ensure_tasks_bulk finds exactly the (user_id, name) pairs asked for.
+
+Run (from backend/):
+    python -m unittest database.test_crud      (or: python -m pytest database/test_crud.py)
+"""
+import unittest
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from database import testing
+from database.testing import engine
+from database import crud
+from database.models import Task
+
+def spec(user_id: int, name: str) -> dict:
+    return {"user_id": user_id, "name": name, "type": "habit", "base_xp": 10}
+
+class EnsureTasksBulkTest(unittest.TestCase):
+    def setUp(self):
+        testing.reset()
+        for uid in (1, 2):
+            testing.client().post("/users", json={"user_id": uid, "username": f"u{uid}"}).raise_for_status()
+        with engine.begin() as conn:
+            conn.execute(insert(Task), [spec(1, "read"), spec(2, "run"), spec(1, "read")])
+
+    def test_pairs_not_combinations(self):
+        with Session(bind=engine) as db:
+            ids = crud.ensure_tasks_bulk(db, [spec(1, "read"), spec(2, "run"), spec(1, "run")])
+            db.commit()
+        with engine.connect() as conn:
+            tasks = conn.execute(select(Task.user_id, Task.name, Task.id).order_by(Task.id)).all()
+        self.assertEqual([(uid, name) for uid, name, _ in tasks],
+                         [(1, "read"), (2, "run"), (1, "read"), (1, "run")])  # only (1, "run") was missing
+        self.assertEqual(ids, {(1, "read"): tasks[0].id, (2, "run"): tasks[1].id, (1, "run"): tasks[3].id})
+
+if __name__ == "__main__":
+    unittest.main()
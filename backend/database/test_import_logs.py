@@ -0,0 +1,88 @@
+# backend/database/test_import_logs.py
+"""
+database/import_logs.py: what an import does to the users' totals, to the logs the app
+wrote, and to day_events.
+
+Run (from backend/):
+    python -m unittest database.test_import_logs      (or: python -m pytest database/test_import_logs.py)
+"""
+import io
+import unittest
+from datetime import date, timedelta
+
+from sqlalchemy import select
+
+from database import testing
+from database.testing import engine, logs, process_day, user_row
+from database import rebuild_users
+from database.import_logs import REPLAY_PENDING, import_logs
+from database.models import TaskLog
+
+HISTORY = [("2024-03-01", [("read", 40), ("run", 60)]),
+           ("2024-03-02", [("read", 40)]),
+           ("2024-03-05", [("run", 60), ("write", 25), ("read", 40)]),
+           ("2024-03-06", [("write", 25)])]
+
+def as_csv(user_id: int, history) -> io.StringIO:
+    lines = ["user_id,task,date,xp"]
+    lines += [f"{user_id},{name},{day},{xp}" for day, tasks in history for name, xp in tasks]
+    return io.StringIO("\n".join(lines) + "\n")
+
+def through_api(user_id: int, history):
+    """The history through /process-day, day by day; days between its days are processed with no tasks."""
+    tasks = dict(history)
+    d, last = date.fromisoformat(history[0][0]), date.fromisoformat(history[-1][0])
+    while d <= last:
+        day = [(name, xp, False) for name, xp in tasks.get(d.isoformat(), [])]
+        process_day(user_id, d.isoformat(), day).raise_for_status()
+        d += timedelta(days=1)
+
+class ImportLogsTest(unittest.TestCase):
+    def setUp(self):
+        testing.reset()
+        for uid in (1, 2):
+            testing.client().post("/users", json={"user_id": uid, "username": f"u{uid}"}).raise_for_status()
+
+    def run_import(self, text):
+        return import_logs(text, "csv", engine=engine, log=lambda *a: None)
+
+    def test_import_matches_process_day(self):
+        through_api(1, HISTORY)
+        report = self.run_import(as_csv(2, HISTORY))
+        self.assertEqual((report.imported, report.rejected), (7, 0))
+        self.assertEqual(user_row(2), user_row(1))
+        self.assertEqual(logs(2), logs(1))
+        self.assertEqual(sum(xp for _, _, xp in logs(2)), user_row(2)[0])
+
+    def test_imported_days_are_recorded(self):
+        self.run_import(as_csv(2, HISTORY))
+        again = process_day(2, "2024-03-05", [("read", 40, False)]).json()
+        self.assertTrue(again["duplicate"])
+        self.assertEqual(len(logs(2)), 7)
+        self.assertEqual(rebuild_users.rebuild(engine, log=lambda *a: None), (1, 0))
+
+    def test_app_logs_are_left_alone(self):
+        through_api(2, [("2024-03-10", [("read", 40), ("run", 60)])])
+        app_logs = logs(2)
+        self.run_import(as_csv(2, HISTORY))
+        after = logs(2)
+        self.assertEqual([l for l in after if l[0] == "2024-03-10"], app_logs)
+        # the imported days come first: the totals now include them, replayed in date order
+        self.assertEqual(len(after), 9)
+        self.assertEqual(user_row(2)[4], "2024-03-10")
+        self.assertGreater(user_row(2)[0], sum(xp for _, _, xp in app_logs))
+        with engine.connect() as conn:
+            streaks = conn.execute(select(TaskLog.streak_at_time).where(TaskLog.user_id == 2)).scalars().all()
+        self.assertNotIn(REPLAY_PENDING, streaks)
+
+    def test_xp_must_match_the_tasks_base_xp(self):
+        through_api(2, [("2024-03-10", [("read", 40)])])
+        text = io.StringIO("user_id,task,date,xp\n2,read,2024-03-01,40\n2,read,2024-03-02,45\n"
+                           "2,new,2024-03-02,10\n2,new,2024-03-03,1000\n")
+        report = self.run_import(text)
+        self.assertEqual((report.imported, report.rejected), (2, 2))
+        self.assertEqual(report.errors, ["line 3: xp 45 differs from the task's base XP 40",
+                                         "line 5: xp 1000 differs from the task's base XP 10"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+# backend/database/test_leaderboard.py
+"""
+database/leaderboard.py: scores committed while a rebuild reads the users table are not lost,
+and the per-process memory backend refuses to run under several API workers.
+
+Run (from backend/):
+    python -m unittest database.test_leaderboard      (or: python -m pytest database/test_leaderboard.py)
+"""
+import os
+import unittest
+from unittest import mock
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from database import testing
+from database.testing import engine
+from database import leaderboard
+from database.models import User
+
+class LeaderboardTest(unittest.TestCase):
+    def setUp(self):
+        testing.reset()
+        for uid in (1, 2):
+            testing.client().post("/users", json={"user_id": uid, "username": f"u{uid}"}).raise_for_status()
+
+    def test_commit_during_rebuild_is_applied(self):
+        board = leaderboard.backend
+        load = board.load
+
+        def load_then_commit(rows):
+            rows = list(rows)  # the rebuild has read the table (user 2 at 0 xp)...
+            with Session(bind=engine) as db:  # ...when another request commits new scores
+                db.execute(update(User).where(User.id == 2).values(total_xp=500))
+                leaderboard.record_scores(db, 2, 500, 1)
+                db.commit()
+            load(rows)
+
+        with mock.patch.object(board, "load", load_then_commit), Session(bind=engine) as db:
+            leaderboard.rebuild(db)
+        self.assertTrue(leaderboard.loaded())
+        self.assertEqual(board.score("total_xp", 2), 500)
+        self.assertEqual(board.rank("total_xp", 2), 0)
+        self.assertIsNone(leaderboard._pending)
+
+    def test_memory_backend_needs_one_worker(self):
+        with mock.patch.dict(os.environ, {"LEADERBOARD_BACKEND": "memory", "WEB_CONCURRENCY": "4"}):
+            with self.assertRaises(RuntimeError):
+                leaderboard._backend_from_env()
+        with mock.patch.dict(os.environ, {"LEADERBOARD_BACKEND": "memory", "WEB_CONCURRENCY": "1"}):
+            self.assertEqual(leaderboard._backend_from_env().name, "memory")
+
+if __name__ == "__main__":
+    unittest.main()
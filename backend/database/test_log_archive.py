@@ -0,0 +1,60 @@
+# backend/database/test_log_archive.py
+"""
+database/log_archive.py `archive`: old months move to task_logs_archive, recent ones stay,
+and a log written while the archive runs is not lost.
+
+Run (from backend/):
+    python -m unittest database.test_log_archive      (or: python -m pytest database/test_log_archive.py)
+"""
+import unittest
+from datetime import date
+from unittest import mock
+
+from sqlalchemy import select
+
+from database import testing
+from database.testing import engine, process_day
+from database import log_archive
+from database.models import TaskLog, TaskLogArchive
+
+def rows(model) -> list:
+    with engine.connect() as conn:
+        return conn.execute(select(model.id, model.date).order_by(model.id)).all()
+
+class ArchiveTest(unittest.TestCase):
+    def setUp(self):
+        testing.reset()
+        testing.client().post("/users", json={"user_id": 1, "username": "u1"}).raise_for_status()
+        for day in ("2024-01-10", "2024-01-11", "2024-03-01"):
+            process_day(1, day, [("read", 40, True)]).raise_for_status()
+
+    def archive(self):
+        return log_archive.archive(engine, months=1, today=date(2024, 3, 15), chunk=1, log=lambda *a: None)
+
+    def test_old_months_move(self):
+        before = rows(TaskLog)
+        self.assertEqual(self.archive(), 2)
+        self.assertEqual(rows(TaskLogArchive), before[:2])
+        self.assertEqual(rows(TaskLog), before[2:])
+        self.assertEqual(self.archive(), 0)  # nothing left before the cutoff
+
+    def test_log_written_after_the_copy_stays_hot(self):
+        partitions = log_archive.mysql_partitions
+        late = []
+
+        def write_then_list(conn):
+            # a late /process-day for an old date lands between the copy and the delete
+            with engine.begin() as other:
+                late.append(other.execute(TaskLog.__table__.insert().values(
+                    task_id=1, user_id=1, date="2024-01-12", xp_awarded=40)).inserted_primary_key[0])
+            return partitions(conn)
+
+        with mock.patch.object(log_archive, "mysql_partitions", write_then_list):
+            self.assertEqual(self.archive(), 2)
+        self.assertIn(late[0], [i for i, _ in rows(TaskLog)])
+        self.assertNotIn(late[0], [i for i, _ in rows(TaskLogArchive)])
+        self.assertEqual(self.archive(), 1)  # the next run moves it
+        self.assertEqual([i for i, _ in rows(TaskLogArchive)][-1], late[0])
+
+if __name__ == "__main__":
+    unittest.main()
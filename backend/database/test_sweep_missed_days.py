@@ -0,0 +1,71 @@
+# backend/database/test_sweep_missed_days.py
+"""
+database/sweep_missed_days.py: k missed days per user, streak reset, data versions, reruns.
+
+Run (from backend/):
+    python -m unittest database.test_sweep_missed_days      (or: python -m pytest database/test_sweep_missed_days.py)
+"""
+import unittest
+from datetime import date
+
+from sqlalchemy import event, select
+
+from database import testing
+from database.testing import engine, process_day, user_row
+from database.models import User
+from database.sweep_missed_days import sweep
+
+def versions(user_id: int) -> tuple:
+    with engine.connect() as conn:
+        return tuple(conn.execute(select(User.version, User.data_version).where(User.id == user_id)).one())
+
+class SweepTest(unittest.TestCase):
+    def setUp(self):
+        testing.reset()
+        for uid in (1, 2, 3, 4):
+            testing.client().post("/users", json={"user_id": uid, "username": f"u{uid}"}).raise_for_status()
+        for uid, last in ((1, "2024-03-01"), (2, "2024-03-01"), (3, "2024-03-05")):
+            process_day(uid, "2024-02-29", [("read", 40, True)]).raise_for_status()
+            process_day(uid, last, [("read", 40, True)]).raise_for_status()
+        # user 4 never processed a day
+
+    def test_misses_are_applied(self):
+        before = {uid: user_row(uid) for uid in (1, 2, 3, 4)}
+        self.assertEqual(before[1][2:], (2, 0, "2024-03-01"))
+        swept, days = sweep(engine, today=date(2024, 3, 6))  # yesterday: 2024-03-05
+        self.assertEqual((swept, days), (2, 8))
+        for uid in (1, 2):
+            total_xp, level, streak, misses, last = user_row(uid)
+            self.assertEqual((total_xp, level), before[uid][:2])
+            self.assertEqual((streak, misses, last), (0, 4, "2024-03-05"))
+        self.assertEqual(user_row(3), before[3])  # active yesterday
+        self.assertEqual(user_row(4), before[4])  # never active
+
+    def test_rerun_changes_nothing(self):
+        sweep(engine, today=date(2024, 3, 6))
+        rows = {uid: (user_row(uid), versions(uid)) for uid in (1, 2, 3)}
+        self.assertEqual(sweep(engine, today=date(2024, 3, 6)), (0, 0))
+        self.assertEqual({uid: (user_row(uid), versions(uid)) for uid in (1, 2, 3)}, rows)
+        # the next night applies the one new missed day only
+        self.assertEqual(sweep(engine, today=date(2024, 3, 7)), (3, 3))
+        self.assertEqual(user_row(1)[2:], (0, 5, "2024-03-06"))
+        self.assertEqual(user_row(3)[2:], (0, 1, "2024-03-06"))
+
+    def test_one_update_per_group_bumps_both_versions(self):
+        before = versions(1)
+        updates = []
+
+        def count_updates(conn, cursor, statement, *args):
+            if statement.lstrip().upper().startswith("UPDATE USERS"):
+                updates.append(statement)
+
+        event.listen(engine, "before_cursor_execute", count_updates)
+        try:
+            sweep(engine, today=date(2024, 3, 6))
+        finally:
+            event.remove(engine, "before_cursor_execute", count_updates)
+        self.assertEqual(len(updates), 1)  # users 1 and 2 share (last_active_date, k)
+        self.assertEqual(versions(1), (before[0] + 1, before[1] + 1))
+
+if __name__ == "__main__":
+    unittest.main()
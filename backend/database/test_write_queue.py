@@ -0,0 +1,140 @@
+# backend/database/test_write_queue.py
+"""
+Write-behind /process-day (database/write_queue.py): draining, chaining, recomputing stale
+jobs, and failures.
+
+Run (from backend/):
+    python -m unittest database.test_write_queue      (or: python -m pytest database/test_write_queue.py)
+"""
+import unittest
+from datetime import date
+from unittest import mock
+
+from database import testing
+from database.testing import engine, logs, user_row
+from database import crud, write_queue
+from database.models import User
+from database.sweep_missed_days import sweep
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+DAYS = [("2024-03-01", [("read", 40, True), ("run", 60, True)]),
+        ("2024-03-02", [("read", 40, True)]),
+        ("2024-03-04", []),
+        ("2024-03-05", [("run", 60, True), ("write", 25, False), ("read", 40, True)])]
+
+def process(user_id: int, day: str, tasks) -> dict:
+    r = testing.process_day(user_id, day, tasks)
+    r.raise_for_status()
+    return r.json()
+
+def bump(user_id: int, xp: int):
+    """A bulk write (import, rebuild, ...) landing between enqueue and drain."""
+    with engine.begin() as conn:
+        conn.execute(update(User).where(User.id == user_id)
+                     .values(total_xp=User.total_xp + xp, version=User.version + 1))
+
+class WriteBehindTest(unittest.TestCase):
+    def setUp(self):
+        testing.reset()
+        self.queue = testing.new_queue()
+        patcher = mock.patch.object(write_queue, "ENABLED", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for uid in (1, 2):
+            testing.client().post("/users", json={"user_id": uid, "username": f"u{uid}"}).raise_for_status()
+
+    def drain(self):
+        done, failed, retry = {}, {}, []
+        while True:
+            jobs = self.queue.claim(worker=1, batch_users=100)
+            if not jobs:
+                return done, failed, retry
+            d, f, r = write_queue.persist_jobs(engine, jobs, self.queue)
+            self.queue.finish(d, f, r)
+            done.update(d), failed.update(f), retry.extend(r)
+            if r:
+                return done, failed, retry
+
+    def sync_reference(self, user_id: int, days) -> tuple:
+        with mock.patch.object(write_queue, "ENABLED", False):
+            for day, tasks in days:
+                process(user_id, day, tasks)
+        return user_row(user_id), logs(user_id)
+
+    def test_chained_days_drain_like_sync(self):
+        expected = self.sync_reference(1, DAYS)
+        for day, tasks in DAYS:  # queued on top of each other, nothing written yet
+            out = process(2, day, tasks)
+            self.assertTrue(out["queued"])
+        self.assertEqual(user_row(2)[0], 0)
+        done, failed, retry = self.drain()
+        self.assertEqual((len(done), failed, retry), (len(DAYS), {}, []))
+        self.assertEqual((user_row(2), logs(2)), expected)
+
+    def test_duplicate_day_answered_from_queue(self):
+        first = process(2, "2024-03-01", DAYS[0][1])
+        again = process(2, "2024-03-01", [])
+        self.assertTrue(again["duplicate"])
+        self.assertEqual(again["job_id"], first["job_id"])
+        self.drain()
+        self.assertEqual(len(logs(2)), 2)
+
+    def test_stale_job_is_recomputed_from_the_row(self):
+        out = process(2, "2024-03-01", DAYS[0][1])
+        bump(2, 1000)
+        done, failed, _ = self.drain()
+        self.assertEqual(failed, {})
+        event = done[out["job_id"]]
+        # the day is computed again on top of the bumped row, not failed and not overwriting it
+        self.assertEqual(event["total_xp"], 1000 + event["day_xp"])
+        self.assertEqual(user_row(2)[0], event["total_xp"])
+        status = testing.client().get("/process-day/status", params={"job_id": out["job_id"]}).json()
+        self.assertEqual((status["state"], status["event"]["total_xp"]), ("done", event["total_xp"]))
+
+    def test_day_after_failed_job_is_rechained(self):
+        first = process(2, "2024-03-01", DAYS[0][1])
+        second = process(2, "2024-03-02", DAYS[1][1])
+        # the first day failed in an earlier claim, then one unrelated bump made the row's version
+        # equal to the second job's base_version: its chained state must not be written as is
+        self.queue._conn().execute("UPDATE jobs SET state = ? WHERE id = ?", (write_queue.FAILED, first["job_id"]))
+        bump(2, 0)
+        done, failed, _ = self.drain()
+        self.assertEqual(list(done), [second["job_id"]])
+        expected = self.sync_reference(1, DAYS[1:2])
+        self.assertEqual((user_row(2), logs(2)), expected)
+
+    def test_failed_day_in_same_claim(self):
+        first = process(2, "2024-03-01", DAYS[0][1])
+        second = process(2, "2024-03-02", DAYS[1][1])
+        with Session(bind=engine) as db:  # another request's day 1
+            crud.record_day_events(db, [{"user_id": 2, "date": "2024-03-01", "event": {"day_xp": 1}}])
+            db.commit()
+        done, failed, _ = self.drain()
+        self.assertEqual(failed, {first["job_id"]: "day already processed by another request"})
+        self.assertEqual(list(done), [second["job_id"]])
+        self.assertEqual((user_row(2), logs(2)), self.sync_reference(1, DAYS[1:2]))
+
+    def test_day_already_covered_by_the_row_fails(self):
+        out = process(2, "2024-03-01", DAYS[0][1])
+        with engine.begin() as conn:
+            conn.execute(update(User).where(User.id == 2)
+                         .values(last_active_date="2024-03-01", version=User.version + 1))
+        done, failed, _ = self.drain()
+        self.assertEqual(done, {})
+        self.assertIn("not written", failed[out["job_id"]])
+
+    def test_sweep_skips_users_with_queued_days(self):
+        process(1, "2024-03-01", DAYS[0][1])
+        self.drain()
+        process(1, "2024-03-02", DAYS[1][1])
+        process(2, "2024-03-01", DAYS[0][1])
+        self.drain()
+        process(2, "2024-03-02", DAYS[1][1])
+        self.queue.claim(worker=1, batch_users=1)  # user 1's day claimed, user 2's pending
+        swept, _ = sweep(engine, today=date(2024, 3, 3))
+        self.assertEqual(swept, 0)
+        self.assertEqual(user_row(1)[3], 0)
+
+if __name__ == "__main__":
+    unittest.main()
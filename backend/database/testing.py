@@ -0,0 +1,110 @@
+# backend/database/testing.py
+"""
+Scratch database for the unittest modules next to the code (database/test_*.py).
+
+Import this module before anything that imports database.connection: it points MYSQL_URL
+at a fresh SQLite file in a temp directory (and the write-behind queue next to it), with
+the in-process cache and leaderboard, so a test run never touches the configured MySQL.
+
+    from database import testing          # first
+    from database import crud, ...
+
+    testing.reset()                       # empty tables, cache and boards (e.g. in setUp)
+    testing.process_day(1, "2024-03-01", [("read", 40, True)])   # POST /process-day on that date
+    testing.user_row(1), testing.logs(1)  # what got written
+"""
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+from unittest import mock
+
+here = Path(__file__).resolve().parents[1]
+if str(here) not in sys.path:
+    sys.path.insert(0, str(here))
+
+DIR = tempfile.mkdtemp(prefix="streax-test-")
+URL = "sqlite:///" + os.path.join(DIR, "streax.db")
+
+if "database.connection" in sys.modules:
+    if not sys.modules["database.connection"].DATABASE_URL.startswith("sqlite:///"):
+        raise RuntimeError("database.testing must be imported before database.connection")
+else:
+    os.environ.update({
+        "MYSQL_URL": URL,
+        "MYSQL_REPLICA_URLS": "",
+        "DB_MODE": "sync",
+        "CACHE_BACKEND": "memory",
+        "LEADERBOARD_BACKEND": "memory",
+        "WRITE_BEHIND": "0",
+        "WRITE_QUEUE_PATH": os.path.join(DIR, "write_queue.db"),
+    })
+
+from sqlalchemy import select  # noqa: E402
+
+from database.connection import engine, Base  # noqa: E402
+from database import cache, leaderboard  # noqa: E402
+from database.models import User, Task, TaskLog  # noqa: E402
+
+_queues = 0
+
+def reset():
+    """Empty every table and the cache and leaderboard backends."""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    cache.set_backend(cache.InProcessCache())
+    leaderboard.set_backend(leaderboard.InMemoryLeaderboard())
+
+def new_queue():
+    """A fresh, empty write-behind queue, installed as write_queue.get_queue()'s."""
+    global _queues
+    from database import write_queue
+    _queues += 1
+    write_queue._queue = write_queue.WriteQueue(os.path.join(DIR, f"write_queue_{_queues}.db"))
+    return write_queue._queue
+
+_client = None
+
+def client():
+    """TestClient of app/main.py's app (imported on first use)."""
+    global _client
+    if _client is None:
+        from fastapi.testclient import TestClient
+        from app.main import app
+        _client = TestClient(app)
+    return _client
+
+@contextmanager
+def today(iso: str):
+    """date.today() in app/main.py returns iso inside the block."""
+    class FakeDate(date):
+        @classmethod
+        def today(cls):
+            return date.fromisoformat(iso)
+    with mock.patch("app.main.date", FakeDate):
+        yield
+
+def process_day(user_id: int, day: str, tasks, idempotency_key: str = None):
+    """POST /process-day for user_id on day; tasks: [(name, base_xp, required_daily)]. Returns the response."""
+    headers = {"Idempotency-Key": idempotency_key} if idempotency_key else {}
+    with today(day):
+        return client().post("/process-day", headers=headers, json={
+            "user": {"user_id": user_id},
+            "tasks": [{"id": n, "name": name, "type": "small", "base_xp": xp, "required_daily": req}
+                      for n, (name, xp, req) in enumerate(tasks)]})
+
+def user_row(user_id: int) -> tuple:
+    """(total_xp, current_level, streak_days, consecutive_misses, last_active_date) as stored."""
+    with engine.connect() as conn:
+        return tuple(conn.execute(select(User.total_xp, User.current_level, User.streak_days,
+                                         User.consecutive_misses, User.last_active_date)
+                                  .where(User.id == user_id)).one())
+
+def logs(user_id: int) -> list:
+    """[(date, task name, xp_awarded)] of the user's task_logs, in date and id order."""
+    with engine.connect() as conn:
+        return [(str(d), name, xp) for d, name, xp in conn.execute(
+            select(TaskLog.date, Task.name, TaskLog.xp_awarded).join(Task, Task.id == TaskLog.task_id)
+            .where(TaskLog.user_id == user_id).order_by(TaskLog.date, TaskLog.id))]
@@ -0,0 +1,71 @@
+# backend/database/user_versions.py
+"""
+Per-user data versions for conditional GETs (ETag / Last-Modified, see app/conditional.py).
+
+users.data_version is incremented, and users.data_updated_at set, in the same
+transaction as every write that changes what a user's read endpoints return
+(/users/{id}, /users/{id}/stats, /tasks, /task-logs). A poll can then be answered
+with 304 from one primary-key read of users, without touching tasks or task_logs.
+
+Session writes need no extra call: crud marks every changed user with
+cache.invalidate_user(), and the before_commit hook below bumps those users with
+one UPDATE per chunk. Writes that already UPDATE the users row add bump_values()
+to that statement instead: crud.apply_user_events_bulk (the /process-day path)
+does, and calls mark_bumped() so the hook skips those users; scripts that write
+users do too (rebuild_users, recompute_levels, sweep_missed_days) or call
+bump_users() (log_archive).
+
+users.version is not reused: it is the optimistic lock of the engine write path,
+and bumping it for task edits would make in-flight /process-day requests retry.
+"""
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+
+from database import cache
+from database.routing import replica_read
+from database.models import User
+
+BUMP_CHUNK = 1000
+
+def now() -> datetime:
+    """UTC, whole seconds: HTTP dates have no fractions, so If-Modified-Since compares exactly."""
+    return datetime.utcnow().replace(microsecond=0)
+
+def bump_values() -> dict:
+    """Column values for an UPDATE of users that should count as a change of the user's data."""
+    users_tbl = User.__table__
+    return {"data_version": users_tbl.c.data_version + 1, "data_updated_at": now()}
+
+def bump_users(conn, user_ids: Iterable[int], chunk: int = BUMP_CHUNK):
+    """Bump the given users (Connection or Session; does not commit)."""
+    ids = sorted(set(user_ids))
+    users_tbl = User.__table__
+    for i in range(0, len(ids), chunk):
+        conn.execute(update(users_tbl).where(users_tbl.c.id.in_(ids[i:i + chunk])).values(**bump_values()))
+
+def current_stmt(user_id: int):
+    return select(User.data_version, User.data_updated_at).where(User.id == user_id)
+
+@replica_read
+def current(db: Session, user_id: int) -> Optional[Tuple[int, Optional[datetime]]]:
+    """(data_version, data_updated_at) of a user, or None if there is no such user."""
+    row = db.execute(current_stmt(user_id)).first()
+    return tuple(row) if row else None
+
+def mark_bumped(session: Session, user_ids: Iterable[int]):
+    """Users whose data version a statement of the session's transaction already bumped."""
+    session.info.setdefault("data_versions_bumped", set()).update(user_ids)
+
+@event.listens_for(Session, "before_commit")
+def _bump_pending(session):
+    bumped = session.info.pop("data_versions_bumped", None) or set()
+    user_ids = cache.pending_invalidations(session) - bumped
+    if user_ids:
+        bump_users(session, user_ids)
+
+@event.listens_for(Session, "after_rollback")
+def _drop_bumped(session):
+    session.info.pop("data_versions_bumped", None)
@@ -0,0 +1,488 @@
+# backend/database/write_queue.py
+"""
+Write-behind mode for /process-day (WRITE_BEHIND=1).
+
+The endpoint computes the engine event and appends the persistence work to a durable
+local queue (a SQLite file in WAL mode) instead of writing MySQL inside the request;
+a pool of worker processes drains the queue into the database.
+
+Queue rows ("jobs") carry everything crud.persist_days needs: the TaskLog entries,
+the new user values and the engine event. Per user, jobs form a chain: the engine
+state for a new day is the newest job still waiting for that user (pending/claimed),
+or the users row if there is none, so a day never starts from a state the database
+has not caught up with yet. Jobs are unique per (user, date) and per (user,
+Idempotency-Key), like day_events, so a duplicate submission is answered from the
+queue; /process-day/batch queues its days through the same path.
+
+A job also records the users.version its state starts from (the row's, or one past the
+previous job's in the chain) and the job it was chained on. The worker writes the day only
+if the row still has that version. If a bulk write landed between enqueue and drain (import,
+rebuild_users, recompute_levels, the missed-day sweep), the day is computed again from the
+row as it is now, with the queued tasks, like /process-day's retry after a concurrent update;
+so is a day chained on a job that failed. The recomputed event is what /process-day/status
+reports. The missed-day sweep leaves users with queued days alone (their last day is not
+missed, only not written yet).
+
+Workers claim all pending jobs of up to --batch-users users at a time (users with a
+job already claimed by another worker are skipped, so a user's days are written in
+order), then persist them in grouped transactions: one transaction per round, round
+n holding the n-th job of every claimed user (normally one round: one day per user).
+If a grouped transaction fails, its users are retried one by one; a day that is
+already in day_events with the job's own event (worker crashed after commit) is
+marked done, a different recorded day fails the job. Claims older
+than WRITE_QUEUE_CLAIM_TIMEOUT are handed out again. Done jobs are kept for
+WRITE_QUEUE_RETAIN_SECONDS for the status endpoint, then pruned. The API-side methods
+are @offloaded (database/offload.py): under DB_MODE=async the SQLite calls and their busy
+timeout run on a worker thread, not on the event loop.
+
+Config (env):
+    WRITE_BEHIND                 0 (default) | 1
+    WRITE_QUEUE_PATH             default backend/write_queue.db
+    WRITE_QUEUE_CLAIM_TIMEOUT    seconds, default 60
+    WRITE_QUEUE_RETAIN_SECONDS   default 3600
+
+Usage (from backend/):
+    python database/write_queue.py work [--workers 4] [--batch-users 500] [--poll 0.2]
+    python database/write_queue.py stats
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+here = Path(__file__).resolve().parents[1]
+if str(here) not in sys.path:
+    sys.path.insert(0, str(here))
+
+from database.offload import offloaded
+
+ENABLED = os.getenv("WRITE_BEHIND", "").strip().lower() in ("1", "true", "yes", "on")
+QUEUE_PATH = os.getenv("WRITE_QUEUE_PATH") or str(here / "write_queue.db")
+CLAIM_TIMEOUT = float(os.getenv("WRITE_QUEUE_CLAIM_TIMEOUT", "60"))
+RETAIN_SECONDS = float(os.getenv("WRITE_QUEUE_RETAIN_SECONDS", "3600"))
+LAG_WINDOW_SECONDS = 60  # recent done jobs averaged for the persist lag metric
+
+PENDING, CLAIMED, DONE, FAILED = "pending", "claimed", "done", "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    idempotency_key TEXT,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    enqueued_at REAL NOT NULL,
+    claimed_by INTEGER,
+    claimed_at REAL,
+    done_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    result TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_jobs_user_id_date ON jobs (user_id, date);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_jobs_user_id_key ON jobs (user_id, idempotency_key);
+CREATE INDEX IF NOT EXISTS ix_jobs_state_id ON jobs (state, id);
+CREATE INDEX IF NOT EXISTS ix_jobs_user_id_state ON jobs (user_id, state, id);
+"""
+
+class DuplicateJob(Exception):
+    """A job for this user and date (or Idempotency-Key) is already queued."""
+
+    def __init__(self, job: dict):
+        super().__init__(f"job {job['id']} already queued")
+        self.job = job
+
+class WriteQueue:
+    """SQLite-backed job queue; one connection per thread, safe to share across processes."""
+
+    def __init__(self, path: str = None):
+        self.path = path or QUEUE_PATH
+        self._local = threading.local()
+        self.enqueued = 0
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # WAL: durable across process crashes
+            self._local.conn = conn
+        return conn
+
+    # -------------------------
+    # API side
+    # -------------------------
+    @offloaded
+    def enqueue(self, user_id: int, date_iso: str, payload: dict, idempotency_key: str = None) -> int:
+        """Append a job; raises DuplicateJob if the user already has one for date_iso or the key."""
+        try:
+            cur = self._conn().execute(
+                "INSERT INTO jobs (user_id, date, idempotency_key, payload, enqueued_at) VALUES (?, ?, ?, ?, ?)",
+                (user_id, date_iso, idempotency_key, json.dumps(payload), time.time()))
+        except sqlite3.IntegrityError:
+            existing = self.find(user_id, date_iso, idempotency_key)
+            if existing is None:  # pruned between the INSERT and the lookup
+                raise
+            raise DuplicateJob(existing)
+        self.enqueued += 1
+        return cur.lastrowid
+
+    @offloaded
+    def find(self, user_id: int, date_iso: str, idempotency_key: str = None) -> Optional[dict]:
+        """The job for user_id on date_iso (or under idempotency_key), else None."""
+        q = "SELECT * FROM jobs WHERE user_id = ? AND (date = ?"
+        args = [user_id, date_iso]
+        if idempotency_key is not None:
+            q += " OR idempotency_key = ?"
+            args.append(idempotency_key)
+        row = self._conn().execute(q + ") ORDER BY id DESC LIMIT 1", args).fetchone()
+        return _job(row)
+
+    @offloaded
+    def get(self, job_id: int) -> Optional[dict]:
+        return _job(self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    @offloaded
+    def in_flight(self, user_id: int) -> Optional[dict]:
+        """The newest job of user_id that is not in the database yet (pending or claimed), else None."""
+        row = self._conn().execute(
+            "SELECT * FROM jobs WHERE user_id = ? AND state IN (?, ?) ORDER BY id DESC LIMIT 1",
+            (user_id, PENDING, CLAIMED)).fetchone()
+        return _job(row)
+
+    @offloaded
+    def latest(self, user_id: int) -> Optional[dict]:
+        """The newest retained job of user_id in any state, else None."""
+        return _job(self._conn().execute(
+            "SELECT * FROM jobs WHERE user_id = ? ORDER BY id DESC LIMIT 1", (user_id,)).fetchone())
+
+    # -------------------------
+    # Worker side
+    # -------------------------
+    def claim(self, worker: int, batch_users: int) -> List[dict]:
+        """
+        Claim every pending job of up to batch_users users, oldest first, skipping users that
+        have a job claimed elsewhere. Returns the jobs in id order.
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("UPDATE jobs SET state = ?, claimed_by = NULL WHERE state = ? AND claimed_at < ?",
+                         (PENDING, CLAIMED, now - CLAIM_TIMEOUT))
+            users = [r[0] for r in conn.execute(
+                "SELECT user_id FROM jobs WHERE state = ? AND user_id NOT IN "
+                "(SELECT user_id FROM jobs WHERE state = ?) GROUP BY user_id ORDER BY MIN(id) LIMIT ?",
+                (PENDING, CLAIMED, batch_users))]
+            if not users:
+                conn.execute("COMMIT")
+                return []
+            marks = ",".join("?" * len(users))
+            conn.execute(f"UPDATE jobs SET state = ?, claimed_by = ?, claimed_at = ?, attempts = attempts + 1 "
+                         f"WHERE state = ? AND user_id IN ({marks})", [CLAIMED, worker, now, PENDING] + users)
+            rows = conn.execute(f"SELECT * FROM jobs WHERE state = ? AND claimed_by = ? AND user_id IN ({marks}) "
+                                f"ORDER BY id", [CLAIMED, worker] + users).fetchall()
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return [_job(r) for r in rows]
+
+    def finish(self, done: Dict[int, dict], failed: Dict[int, str], retry: List[int] = ()):
+        """done: {job id: final event}; failed: {job id: error}; retry: job ids to hand out again."""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("UPDATE jobs SET state = ?, done_at = ?, result = ? WHERE id = ?",
+                             [(DONE, now, json.dumps(ev), jid) for jid, ev in done.items()])
+            conn.executemany("UPDATE jobs SET state = ?, done_at = ?, error = ? WHERE id = ?",
+                             [(FAILED, now, err, jid) for jid, err in failed.items()])
+            conn.executemany("UPDATE jobs SET state = ?, claimed_by = NULL WHERE id = ?",
+                             [(PENDING, jid) for jid in retry])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def failed_ids(self, job_ids) -> set:
+        """The ids among job_ids whose jobs failed."""
+        ids = list(job_ids)
+        if not ids:
+            return set()
+        marks = ",".join("?" * len(ids))
+        return {r[0] for r in self._conn().execute(
+            f"SELECT id FROM jobs WHERE state = ? AND id IN ({marks})", [FAILED] + ids)}
+
+    def users_in_flight(self, user_ids) -> set:
+        """The ids among user_ids that have a day not in the database yet (pending or claimed)."""
+        out = set()
+        ids = list(user_ids)
+        for start in range(0, len(ids), 500):
+            part = ids[start:start + 500]
+            marks = ",".join("?" * len(part))
+            out.update(r[0] for r in self._conn().execute(
+                f"SELECT DISTINCT user_id FROM jobs WHERE state IN (?, ?) AND user_id IN ({marks})",
+                [PENDING, CLAIMED] + part))
+        return out
+
+    def prune(self, retain_seconds: float = None) -> int:
+        retain = RETAIN_SECONDS if retain_seconds is None else retain_seconds
+        cur = self._conn().execute("DELETE FROM jobs WHERE state = ? AND done_at < ?", (DONE, time.time() - retain))
+        return cur.rowcount
+
+    # -------------------------
+    # Metrics
+    # -------------------------
+    @offloaded
+    def stats(self) -> dict:
+        conn = self._conn()
+        now = time.time()
+        counts = dict(conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        oldest = conn.execute("SELECT MIN(enqueued_at) FROM jobs WHERE state IN (?, ?)",
+                              (PENDING, CLAIMED)).fetchone()[0]
+        lag_avg, lag_max, recent = conn.execute(
+            "SELECT AVG(done_at - enqueued_at), MAX(done_at - enqueued_at), COUNT(*) FROM jobs "
+            "WHERE state = ? AND done_at >= ?", (DONE, now - LAG_WINDOW_SECONDS)).fetchone()
+        return {
+            "enabled": ENABLED,
+            "depth": counts.get(PENDING, 0) + counts.get(CLAIMED, 0),
+            "pending": counts.get(PENDING, 0),
+            "claimed": counts.get(CLAIMED, 0),
+            "done_retained": counts.get(DONE, 0),
+            "failed": counts.get(FAILED, 0),
+            "oldest_pending_age_seconds": round(now - oldest, 3) if oldest else 0.0,
+            "persist_lag_avg_seconds": round(lag_avg or 0.0, 3),
+            "persist_lag_max_seconds": round(lag_max or 0.0, 3),
+            "done_last_minute": recent,
+            "enqueued": self.enqueued,  # by this process
+        }
+
+def _job(row) -> Optional[dict]:
+    if row is None:
+        return None
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_queue() -> WriteQueue:
+    """Process-wide WriteQueue on QUEUE_PATH (created on first use)."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = WriteQueue()
+        return _queue
+
+# -------------------------
+# Persisting claimed jobs
+# -------------------------
+PERSIST_ATTEMPTS = 3  # recomputes of a job whose user row keeps changing, before it is handed out again
+
+def persist_jobs(engine, jobs: List[dict], queue: WriteQueue = None):
+    """
+    Write claimed jobs to the database.
+    Returns (done {job id: event}, failed {job id: error}, retry [job ids to hand out again]).
+    """
+    from sqlalchemy.exc import IntegrityError
+    from sqlalchemy.orm import Session
+    from database import crud
+
+    per_user = {}
+    for job in jobs:
+        per_user.setdefault(job["user_id"], []).append(job)
+    rounds = []
+    for user_jobs in per_user.values():
+        for n, job in enumerate(user_jobs):
+            if n == len(rounds):
+                rounds.append([])
+            rounds[n].append(job)
+    # predecessors outside this claim are done, pruned or failed (a user's pending jobs are claimed together)
+    outside = {j["payload"].get("after") for j in jobs} - {j["id"] for j in jobs} - {None}
+    unwritten = (queue or get_queue()).failed_ids(outside)
+
+    done, failed, retry = {}, {}, []
+    with Session(bind=engine) as db:
+        for round_jobs in rounds:
+            ready = []
+            for job in round_jobs:
+                if _waiting(job, per_user, retry):
+                    continue
+                if _broken_chain(job, failed, unwritten):
+                    try:
+                        job = _rechained(db, crud, job)
+                    except LookupError as e:
+                        failed[job["id"]] = str(e)[:500]
+                        continue
+                    unwritten.add(job["id"])  # its successors were chained on the state it no longer has
+                ready.append(job)
+            round_jobs = ready
+            try:
+                done.update(_persist_group(db, crud, round_jobs))
+                continue
+            except Exception:
+                pass  # one bad user must not hold back the others: retry them one by one
+            for job in round_jobs:
+                for attempt in range(PERSIST_ATTEMPTS):
+                    try:
+                        done.update(_persist_group(db, crud, [job]))
+                    except IntegrityError as e:
+                        # the day is already in day_events: if it is this job's day, an earlier attempt
+                        # wrote it (worker died before finish()); anything else is another request's day,
+                        # and this job's accepted day must be reported as lost, not as done
+                        recorded = crud.get_day_event(db, job["user_id"], job["date"])
+                        if recorded is not None and _same_event(recorded, job["payload"]["event"]):
+                            done[job["id"]] = recorded
+                        elif recorded is not None:
+                            failed[job["id"]] = "day already processed by another request"
+                        else:
+                            failed[job["id"]] = str(e.orig)[:500]
+                    except crud.StaleUserError:
+                        # a bulk write (import, rebuild_users, recompute_levels, sweep) changed the row
+                        # since the job was computed: compute the day again on top of the row as it is now
+                        try:
+                            job = _rechained(db, crud, job)
+                        except LookupError as e:
+                            failed[job["id"]] = str(e)[:500]
+                            break
+                        unwritten.add(job["id"])
+                        if attempt + 1 < PERSIST_ATTEMPTS:
+                            continue
+                        retry.append(job["id"])
+                    except LookupError as e:
+                        failed[job["id"]] = str(e)[:500]
+                    except Exception:
+                        retry.append(job["id"])  # e.g. lost connection: leave it for the next claim
+                    break
+    return done, failed, retry
+
+def _waiting(job: dict, per_user: dict, retry: list) -> bool:
+    """Later days of a user wait for the user's earlier days that are handed out again."""
+    if any(j["id"] in retry for j in per_user[job["user_id"]] if j["id"] < job["id"]):
+        retry.append(job["id"])
+        return True
+    return False
+
+def _broken_chain(job: dict, failed: dict, unwritten: set) -> bool:
+    """
+    True if the job's state was chained on a job whose day was not written as queued: failed (in
+    this claim or an earlier one) or recomputed. Its base_version might still match the row by
+    coincidence (one unrelated bump), so it is recomputed rather than trusted.
+    """
+    after = job["payload"].get("after")
+    return after is not None and (after in failed or after in unwritten)
+
+def _rechained(db, crud, job: dict) -> dict:
+    """
+    The job computed again, with the same tasks, on top of the users row as it is now.
+    Raises LookupError if the user is gone, or if the row already covers the job's date
+    (a later day, or the missed-day sweep): the day would be counted twice.
+    """
+    from database.engine_glue import engine_state, entry_tasks, queued_day
+
+    db.expire_all()
+    user = crud.get_user(db, job["user_id"])
+    if user is None:
+        raise LookupError(f"users not found: [{job['user_id']}]")
+    if (user.last_active_date or "") >= job["date"]:
+        raise LookupError(f"user already has days up to {user.last_active_date}; "
+                          f"the queued day {job['date']} was not written")
+    payload = queued_day(engine_state(user), entry_tasks(job["payload"]["entries"]), job["date"], user.version)
+    return dict(job, payload=payload)
+
+def _same_event(recorded: dict, event: dict) -> bool:
+    """recorded (day_events) is `event` as written; only "achievements" is added on write."""
+    return {k: v for k, v in recorded.items() if k != "achievements"} == \
+        {k: v for k, v in event.items() if k != "achievements"}
+
+def _persist_group(db, crud, jobs: List[dict]) -> Dict[int, dict]:
+    """
+    One transaction for jobs of distinct users. Each user row must still have the job's
+    base_version (the version its state was computed from, see app/main.py _enqueue_day):
+    if another writer changed the row, StaleUserError is raised and nothing is overwritten.
+    """
+    if not jobs:
+        return {}
+    users = crud.get_users(db, [j["user_id"] for j in jobs])
+    missing = [j["user_id"] for j in jobs if j["user_id"] not in users]
+    if missing:
+        raise LookupError(f"users not found: {missing}")
+    days = [(users[j["user_id"]], j["payload"]["entries"], j["payload"]["user_event"]) for j in jobs]
+    day_events = [{"user_id": j["user_id"], "date": j["date"], "event": dict(j["payload"]["event"]),
+                   "idempotency_key": j["idempotency_key"]} for j in jobs]
+    crud.persist_days(db, days, day_events)
+    return {j["id"]: de["event"] for j, de in zip(jobs, day_events)}
+
+def work(worker: int, batch_users: int = 500, poll: float = 0.2, stop=None, max_idle_polls: int = None):
+    """Worker loop: claim, persist, finish, until stop is set (or max_idle_polls empty polls in a row)."""
+    from database.connection import engine
+
+    queue = get_queue()
+    idle = 0
+    last_prune = 0.0
+    while not (stop is not None and stop.is_set()):
+        jobs = queue.claim(worker, batch_users)
+        if not jobs:
+            idle += 1
+            if max_idle_polls is not None and idle >= max_idle_polls:
+                return
+            if time.time() - last_prune > 60:
+                queue.prune()
+                last_prune = time.time()
+            time.sleep(poll)
+            continue
+        idle = 0
+        started = time.perf_counter()
+        done, failed, retry = persist_jobs(engine, jobs, queue)
+        queue.finish(done, failed, retry)
+        if retry:
+            time.sleep(poll)
+        print(f"worker {worker}: {len(done)} days written, {len(failed)} failed, {len(retry)} to retry "
+              f"({len(jobs) / max(time.perf_counter() - started, 1e-9):.0f} days/s)", flush=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drain the /process-day write-behind queue")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    w = sub.add_parser("work", help="run the worker pool")
+    w.add_argument("--workers", type=int, default=4, help="worker processes")
+    w.add_argument("--batch-users", type=int, default=500, help="users claimed per transaction group")
+    w.add_argument("--poll", type=float, default=0.2, help="seconds to sleep when the queue is empty")
+    w.add_argument("--drain", action="store_true", help="exit once the queue stays empty")
+    sub.add_parser("stats", help="print queue depth and lag")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "stats":
+        print(json.dumps(get_queue().stats(), indent=2))
+        return 0
+    get_queue()  # create the schema before the workers race for it
+    ctx = multiprocessing.get_context("spawn")  # fresh engine and pool per worker
+    stop = ctx.Event()
+    idle = 5 if args.drain else None
+    procs = [ctx.Process(target=work, args=(n + 1, args.batch_users, args.poll, stop, idle))
+             for n in range(args.workers)]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        stop.set()
+        for p in procs:
+            p.join()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,2 +1,2 @@
 # backend/streax/__init__.py
-__all__ = ["models", "engine"]
+__all__ = ["models", "engine", "replay", "ranking", "achievements", "levels", "stats", "simulate"]
@@ -0,0 +1,98 @@
+# backend/streax/achievements.py
+"""
+Threshold achievements evaluated incrementally from process_day results.
+
+Every rule watches one field and unlocks when the field reaches its threshold.
+Fields are the engine event values (streak_days, total_xp, current_level) and
+cumulative completion counters kept by the caller ("tasks" for all tasks,
+"tasks:<type>" per task type).
+
+RuleIndex keeps, per field, the rules sorted by threshold, so evaluating a
+change (old value -> new value) is a bisect over that field's rules only:
+O(fields changed * log rules) per event, no rescans of history. A rule fires
+when old < threshold <= new; a streak that resets and climbs again crosses the
+same thresholds again, so callers store unlocks idempotently (unique user/name).
+"""
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+@dataclass(frozen=True)
+class Rule:
+    name: str          # stable id, stored in achievements.name
+    field: str
+    threshold: int
+    description: str = ""
+
+def streak(days: int) -> Rule:
+    return Rule(f"streak_{days}", "streak_days", days, f"{days}-day streak")
+
+def xp(total: int) -> Rule:
+    return Rule(f"xp_{total}", "total_xp", total, f"Earn {total} XP")
+
+def level(n: int) -> Rule:
+    return Rule(f"level_{n}", "current_level", n, f"Reach level {n}")
+
+def completions(n: int, task_type: str = None) -> Rule:
+    if task_type is None:
+        return Rule(f"tasks_{n}", "tasks", n, "Complete your first task" if n == 1 else f"Complete {n} tasks")
+    return Rule(f"tasks_{task_type}_{n}", f"tasks:{task_type}", n, f"Complete {n} {task_type} tasks")
+
+DEFAULT_RULES = (
+    [streak(d) for d in (3, 7, 14, 30, 100, 365)]
+    + [xp(v) for v in (100, 1000, 10000, 100000)]
+    + [level(n) for n in (5, 10, 25, 50)]
+    + [completions(n) for n in (1, 100, 1000)]
+    + [completions(n, t) for t in ("small", "medium", "large") for n in (10, 100)]
+)
+
+class RuleIndex:
+    def __init__(self, rules: Iterable[Rule] = DEFAULT_RULES):
+        self.rules: Dict[str, Rule] = {}
+        by_field: Dict[str, List[Rule]] = {}
+        for r in rules:
+            if r.name in self.rules:
+                raise ValueError(f"duplicate achievement name {r.name!r}")
+            self.rules[r.name] = r
+            by_field.setdefault(r.field, []).append(r)
+        self._rules = {f: sorted(rs, key=lambda r: r.threshold) for f, rs in by_field.items()}
+        self._thresholds = {f: [r.threshold for r in rs] for f, rs in self._rules.items()}
+
+    @property
+    def fields(self):
+        return self._rules.keys()
+
+    def crossed(self, field: str, old, new) -> List[Rule]:
+        """Rules on `field` with old < threshold <= new."""
+        ts = self._thresholds.get(field)
+        if not ts or new is None or (old is not None and new <= old):
+            return []
+        lo = bisect_right(ts, old) if old is not None else 0
+        hi = bisect_right(ts, new)
+        return self._rules[field][lo:hi]
+
+    def reached(self, field: str, value) -> List[Rule]:
+        """Rules on `field` whose threshold is <= value (backfill)."""
+        ts = self._thresholds.get(field)
+        if not ts or value is None:
+            return []
+        return self._rules[field][:bisect_right(ts, value)]
+
+    def evaluate(self, changes: Dict[str, Tuple[int, int]]) -> List[Rule]:
+        """changes: {field: (old, new)}; fields without rules are skipped."""
+        out = []
+        for field, (old, new) in changes.items():
+            if field in self._thresholds:
+                out.extend(self.crossed(field, old, new))
+        return out
+
+def counter_fields(task_types: Iterable[str]) -> Dict[str, int]:
+    """Completion counter increments for one day's completed task types."""
+    out = {}
+    for t in task_types:
+        out["tasks"] = out.get("tasks", 0) + 1
+        key = f"tasks:{t}"
+        out[key] = out.get(key, 0) + 1
+    return out
+
+default_index = RuleIndex()
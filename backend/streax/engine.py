@@ -1,13 +1,20 @@
 # backend/streax/engine.py
 from typing import List, Tuple
 from .models import Task, UserState
+from . import levels
 from datetime import date
 import math
 
+# XP rules (shared with streax.replay, which must stay bit-identical)
+STREAK_STEP = 0.05       # +5% per streak day ...
+STREAK_CAP = 1.0         # ... capped at +100% (2x)
+FULL_DAY_BONUS = 0.10    # +10% when the daily target is met
+# levels come from streax.levels.curve (linear 100 XP per level unless LEVEL_CURVE says otherwise)
+
 def compute_day_xp(tasks: List[Task], streak_days: int, full_day: bool) -> int:
     base = sum(t.base_xp for t in tasks)
-    mult = 1.0 + min(0.05 * max(0, streak_days), 1.0)
-    full_bonus = 0.10 if full_day else 0.0
+    mult = 1.0 + min(STREAK_STEP * max(0, streak_days), STREAK_CAP)
+    full_bonus = FULL_DAY_BONUS if full_day else 0.0
     total = base * mult * (1.0 + full_bonus)
     return int(round(total))
 
@@ -29,8 +36,7 @@ def process_day(user_state: UserState, completed_tasks: List[Task], today_iso: s
         user_state.consecutive_misses += 1
         user_state.streak_days = 0
 
-    # simple level relation for now (we'll replace with your L^1.5 later)
-    user_state.current_level = user_state.total_xp // 100
+    user_state.current_level = levels.curve.level_for(user_state.total_xp)
 
     user_state.last_active_date = today_iso
 
@@ -0,0 +1,157 @@
+# backend/streax/levels.py
+"""
+Level curves: total XP -> level, and the XP needed for any level.
+
+A curve is defined by the XP cost of each level-up (`step(level)` = XP to go from
+`level` to `level + 1`). TableCurve precomputes the cumulative thresholds
+(thresholds[L] = total XP at which level L starts, thresholds[0] = 0), so a level
+lookup is one bisect (O(log n)) and a threshold lookup is an index (O(1)); no
+loops or float pow on the request path. The table grows on demand if a user
+passes its last level, up to MAX_LEVEL: levels are capped there, so a huge
+total_xp cannot make the shared table grow without bound. LinearCurve needs no
+table at all (closed form).
+
+Curves:
+    LinearCurve(100)        level = total_xp // 100 (the original rule)
+    PowerCurve(100, 1.5)    level L -> L+1 costs round(100 * (L + 1) ** 1.5)
+
+The active curve is `curve` (LEVEL_CURVE=linear|power, LEVEL_CURVE_BASE,
+LEVEL_CURVE_EXPONENT). streax.engine, streax.replay and crud.get_user_stats all
+read it. After changing it, recompute stored levels with
+database/recompute_levels.py.
+"""
+import os
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+from typing import List, Tuple
+
+class LevelCurve(ABC):
+    name = "base"
+    MAX_LEVEL = 100_000  # table-based curves stop here (the table then holds MAX_LEVEL + 2 thresholds)
+
+    @abstractmethod
+    def step(self, level: int) -> int:
+        """XP needed to go from `level` to `level + 1` (must be >= 1)."""
+
+    @abstractmethod
+    def level_for(self, total_xp: int) -> int:
+        ...
+
+    @abstractmethod
+    def threshold(self, level: int) -> int:
+        """Total XP at which `level` starts."""
+
+    @abstractmethod
+    def table_for(self, max_xp: int) -> List[int]:
+        """
+        The thresholds up to max_xp (for vectorized lookups: level = bisect_right(table, xp) - 1,
+        then capped at MAX_LEVEL). Only thresholds <= max_xp, so the values fit the lookup's int64.
+        """
+
+    def progress(self, total_xp: int) -> Tuple[int, int, int]:
+        """(level, next level threshold, xp to next level)."""
+        level = self.level_for(total_xp)
+        nxt = self.threshold(level + 1)
+        return level, nxt, max(0, nxt - max(0, total_xp))
+
+    def describe(self) -> dict:
+        return {"curve": self.name}
+
+class TableCurve(LevelCurve):
+    """A curve looked up in its precomputed cumulative thresholds (see the module doc)."""
+    INITIAL_LEVELS = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.thresholds: List[int] = [0]
+        self._extend(self.INITIAL_LEVELS)
+
+    def _extend(self, levels: int):
+        levels = min(levels, self.MAX_LEVEL + 1)
+        with self._lock:
+            t = self.thresholds
+            while len(t) <= levels:
+                t.append(t[-1] + max(1, int(self.step(len(t) - 1))))
+
+    def _cover(self, total_xp: int):
+        if total_xp >= self.thresholds[-1]:
+            n = len(self.thresholds)
+            while self.thresholds[-1] <= total_xp and len(self.thresholds) <= self.MAX_LEVEL + 1:
+                n *= 2
+                self._extend(n)
+
+    def level_for(self, total_xp: int) -> int:
+        if total_xp <= 0:
+            return 0
+        self._cover(total_xp)
+        return min(bisect_right(self.thresholds, total_xp) - 1, self.MAX_LEVEL)
+
+    def threshold(self, level: int) -> int:
+        """Total XP at which `level` starts (levels past MAX_LEVEL + 1 answer MAX_LEVEL + 1's)."""
+        level = min(level, self.MAX_LEVEL + 1)
+        if level >= len(self.thresholds):
+            self._extend(level)
+        return self.thresholds[max(0, level)]
+
+    def table_for(self, max_xp: int) -> List[int]:
+        max_xp = max(0, max_xp)
+        self._cover(max_xp)
+        return self.thresholds[:bisect_right(self.thresholds, max_xp)]
+
+class LinearCurve(LevelCurve):
+    """Lookups in closed form (level = total_xp // xp_per_level): O(1) for any total_xp, no table."""
+    name = "linear"
+
+    def __init__(self, xp_per_level: int = 100):
+        self.xp_per_level = xp_per_level
+
+    def step(self, level):
+        return self.xp_per_level
+
+    def level_for(self, total_xp: int) -> int:
+        return max(0, total_xp) // self.xp_per_level
+
+    def threshold(self, level: int) -> int:
+        return max(0, level) * self.xp_per_level
+
+    def table_for(self, max_xp: int) -> List[int]:
+        return list(range(0, max(0, max_xp) + 1, self.xp_per_level))
+
+    def describe(self):
+        return {"curve": self.name, "xp_per_level": self.xp_per_level}
+
+class PowerCurve(TableCurve):
+    name = "power"
+
+    def __init__(self, base: int = 100, exponent: float = 1.5):
+        self.base = base
+        self.exponent = exponent
+        super().__init__()
+
+    def step(self, level):
+        return round(self.base * (level + 1) ** self.exponent)
+
+    def describe(self):
+        return {"curve": self.name, "base": self.base, "exponent": self.exponent}
+
+def make_curve(kind: str, base: int = 100, exponent: float = 1.5) -> LevelCurve:
+    if kind == "power":
+        return PowerCurve(base, exponent)
+    if kind != "linear":
+        raise ValueError(f"Unknown level curve {kind!r} (linear | power)")
+    return LinearCurve(base)
+
+def curve_from_env() -> LevelCurve:
+    kind = os.getenv("LEVEL_CURVE", "linear").lower()
+    try:
+        return make_curve(kind, int(os.getenv("LEVEL_CURVE_BASE", "100")),
+                          float(os.getenv("LEVEL_CURVE_EXPONENT", "1.5")))
+    except ValueError:
+        raise RuntimeError(f"Unknown LEVEL_CURVE {kind!r} (linear | power)")
+
+curve: LevelCurve = curve_from_env()
+
+def set_curve(new_curve: LevelCurve):
+    global curve
+    curve = new_curve
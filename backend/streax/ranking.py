@@ -0,0 +1,160 @@
+# backend/streax/ranking.py
+"""
+Indexable skip list used as an in-memory sorted set (same idea as a Redis ZSET).
+
+Members are ordered by score descending, ties by member ascending. Every forward
+pointer stores its span (how many nodes it skips), so besides O(log n) insert and
+delete we get O(log n) rank-of-member and O(log n + k) "k members from rank r".
+"""
+import random
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple
+
+MAX_LEVEL = 32
+P = 0.25
+
+class _Node:
+    __slots__ = ("key", "member", "score", "forward", "span")
+
+    def __init__(self, key, member, score, level: int):
+        self.key = key
+        self.member = member
+        self.score = score
+        self.forward = [None] * level
+        self.span = [0] * level
+
+class SkipListRanking:
+    def __init__(self, seed: Optional[int] = None):
+        self._head = _Node(None, None, None, MAX_LEVEL)
+        self._level = 1
+        self._length = 0
+        self._scores: Dict[Hashable, float] = {}
+        self._rnd = random.Random(seed)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __contains__(self, member) -> bool:
+        return member in self._scores
+
+    @staticmethod
+    def _key(member, score):
+        return (-score, member)
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < MAX_LEVEL and self._rnd.random() < P:
+            level += 1
+        return level
+
+    def score(self, member) -> Optional[float]:
+        return self._scores.get(member)
+
+    def update(self, member, score):
+        """Insert member or move it to its new score."""
+        old = self._scores.get(member)
+        if old is not None:
+            if old == score:
+                return
+            self._delete(self._key(member, old))
+        self._insert(self._key(member, score), member, score)
+        self._scores[member] = score
+
+    def remove(self, member) -> bool:
+        old = self._scores.pop(member, None)
+        if old is None:
+            return False
+        self._delete(self._key(member, old))
+        return True
+
+    def _insert(self, key, member, score):
+        update = [None] * MAX_LEVEL
+        rank = [0] * MAX_LEVEL
+        x = self._head
+        for i in reversed(range(self._level)):
+            rank[i] = 0 if i == self._level - 1 else rank[i + 1]
+            while x.forward[i] is not None and x.forward[i].key < key:
+                rank[i] += x.span[i]
+                x = x.forward[i]
+            update[i] = x
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                rank[i] = 0
+                update[i] = self._head
+                update[i].span[i] = self._length
+            self._level = level
+        node = _Node(key, member, score, level)
+        for i in range(level):
+            node.forward[i] = update[i].forward[i]
+            update[i].forward[i] = node
+            node.span[i] = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i] = (rank[0] - rank[i]) + 1
+        for i in range(level, self._level):
+            update[i].span[i] += 1
+        self._length += 1
+
+    def _delete(self, key):
+        update = [None] * MAX_LEVEL
+        x = self._head
+        for i in reversed(range(self._level)):
+            while x.forward[i] is not None and x.forward[i].key < key:
+                x = x.forward[i]
+            update[i] = x
+        x = x.forward[0]
+        if x is None or x.key != key:
+            return
+        for i in range(self._level):
+            if update[i].forward[i] is x:
+                update[i].span[i] += x.span[i] - 1
+                update[i].forward[i] = x.forward[i]
+            else:
+                update[i].span[i] -= 1
+        while self._level > 1 and self._head.forward[self._level - 1] is None:
+            self._level -= 1
+        self._length -= 1
+
+    def rank(self, member) -> Optional[int]:
+        """0-based rank (0 = highest score), None if absent."""
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        key = self._key(member, score)
+        traversed = 0
+        x = self._head
+        for i in reversed(range(self._level)):
+            while x.forward[i] is not None and x.forward[i].key <= key:
+                traversed += x.span[i]
+                x = x.forward[i]
+            if x is not self._head and x.key == key:
+                return traversed - 1
+        return None
+
+    def _node_at(self, rank: int) -> Optional[_Node]:
+        """Node at 0-based rank."""
+        if rank < 0 or rank >= self._length:
+            return None
+        target = rank + 1
+        traversed = 0
+        x = self._head
+        for i in reversed(range(self._level)):
+            while x.forward[i] is not None and traversed + x.span[i] <= target:
+                traversed += x.span[i]
+                x = x.forward[i]
+            if traversed == target:
+                return x
+        return None
+
+    def iter_from(self, rank: int) -> Iterator[Tuple[Hashable, float]]:
+        x = self._node_at(rank)
+        while x is not None:
+            yield x.member, x.score
+            x = x.forward[0]
+
+    def range(self, start: int, count: int) -> List[Tuple[Hashable, float]]:
+        """Up to `count` (member, score) pairs starting at 0-based rank `start`."""
+        out = []
+        for item in self.iter_from(max(0, start)):
+            if len(out) >= count:
+                break
+            out.append(item)
+        return out
@@ -0,0 +1,182 @@
+# backend/streax/replay.py
+"""
+Vectorized replay of engine.process_day over many user-days at once.
+
+Input is columnar (one row per processed user-day) as NumPy arrays; every rule is
+evaluated with whole-array operations, so recomputing the full history of all
+users costs a handful of passes instead of one Python call per user-day.
+Results are bit-identical to calling process_day row by row in (user, day) order.
+
+NumPy is only needed for this module (pip install numpy).
+"""
+from dataclasses import dataclass
+import numpy as np
+
+from .engine import STREAK_STEP, STREAK_CAP, FULL_DAY_BONUS
+from . import levels
+
+@dataclass
+class ReplayResult:
+    """Per-row outputs, in the sorted (user_id, day) order given by `order`."""
+    order: np.ndarray            # indices into the input arrays (-1 for days added by fill_gaps)
+    user_ids: np.ndarray
+    days: np.ndarray
+    full_day: np.ndarray         # bool
+    multiplier: np.ndarray       # float64, streak multiplier used for the day
+    day_xp: np.ndarray           # int64
+    total_xp: np.ndarray         # int64, after the day
+    streak_days: np.ndarray      # int64, after the day
+    consecutive_misses: np.ndarray
+    current_level: np.ndarray
+
+    def final_rows(self) -> np.ndarray:
+        """Index (into the result arrays) of each user's last row."""
+        if len(self.user_ids) == 0:
+            return np.zeros(0, dtype=np.int64)
+        last = np.ones(len(self.user_ids), dtype=bool)
+        last[:-1] = self.user_ids[1:] != self.user_ids[:-1]
+        return np.flatnonzero(last)
+
+def level_array(total_xp: np.ndarray, curve: levels.LevelCurve = None) -> np.ndarray:
+    """curve.level_for (default: levels.curve) over an array: one searchsorted against the threshold table."""
+    if len(total_xp) == 0:
+        return np.zeros(0, dtype=np.int64)
+    curve = curve or levels.curve
+    if isinstance(curve, levels.LinearCurve):
+        return np.maximum(total_xp, 0) // curve.xp_per_level
+    table = np.asarray(curve.table_for(int(total_xp.max())), dtype=np.int64)
+    found = np.searchsorted(table, total_xp, side="right") - 1
+    return np.clip(found, 0, curve.MAX_LEVEL).astype(np.int64)
+
+def _segment_starts(user_ids: np.ndarray) -> np.ndarray:
+    starts = np.ones(len(user_ids), dtype=bool)
+    starts[1:] = user_ids[1:] != user_ids[:-1]
+    return starts
+
+def _run_length(flag: np.ndarray, starts: np.ndarray):
+    """
+    For each row, the length of the run of consecutive True `flag` rows ending at it
+    (0 where flag is False), restarting at every user start.
+    Also returns whether that run reaches back to the user's first row.
+    """
+    n = len(flag)
+    idx = np.arange(n)
+    boundary = starts | ~flag
+    last_b = np.maximum.accumulate(np.where(boundary, idx, 0))
+    run = idx - last_b + flag[last_b].astype(np.int64)
+    run = np.where(flag, run, 0)
+    from_start = flag & starts[last_b] & flag[last_b]
+    return run, from_start
+
+def replay_days(
+    user_ids,
+    days,
+    base_xp,
+    completed,
+    required_completed=None,
+    daily_target_count: int = 0,
+    init_total_xp=None,
+    init_streak_days=None,
+    init_consecutive_misses=None,
+    fill_gaps: bool = False,
+    streak_step: float = STREAK_STEP,
+    streak_cap: float = STREAK_CAP,
+    full_day_bonus: float = FULL_DAY_BONUS,
+    curve: levels.LevelCurve = None,
+) -> ReplayResult:
+    """
+    user_ids, days: int arrays, one row per processed user-day (days = any monotonic day index,
+        e.g. days since epoch). Rows need not be sorted; (user_id, day) must be unique.
+    base_xp: sum of base_xp of the tasks completed that day.
+    completed: number of tasks completed that day (0 = a zero-task process_day call).
+    required_completed: number of completed tasks with required_daily (only used when daily_target_count > 0).
+    init_*: optional per-row arrays giving each user's state before their first row
+        (only the value on the user's first row is read); default 0.
+    fill_gaps: process_day itself ignores the calendar; set this to treat every missing day between two rows
+        of the same user as a zero-task day (what the missed-day sweeper applies).
+    streak_step, streak_cap, full_day_bonus, curve: the XP rules; the defaults are the engine's
+        (what-if runs pass others, see streax/simulate.py).
+    """
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    days = np.asarray(days, dtype=np.int64)
+    base_xp = np.asarray(base_xp, dtype=np.int64)
+    completed = np.asarray(completed, dtype=np.int64)
+    required_completed = (np.zeros_like(completed) if required_completed is None
+                          else np.asarray(required_completed, dtype=np.int64))
+    n = len(user_ids)
+
+    def init(a):
+        return np.zeros(n, dtype=np.int64) if a is None else np.asarray(a, dtype=np.int64)
+
+    init_total_xp, init_streak_days, init_consecutive_misses = (
+        init(init_total_xp), init(init_streak_days), init(init_consecutive_misses))
+
+    order = np.lexsort((days, user_ids))
+    user_ids, days = user_ids[order], days[order]
+    base_xp, completed, required_completed = base_xp[order], completed[order], required_completed[order]
+    init_total_xp = init_total_xp[order]
+    init_streak_days = init_streak_days[order]
+    init_consecutive_misses = init_consecutive_misses[order]
+
+    if fill_gaps and n:
+        starts = _segment_starts(user_ids)
+        gap = np.zeros(n, dtype=np.int64)
+        gap[1:] = np.where(starts[1:], 0, days[1:] - days[:-1] - 1)
+        if (gap < 0).any():
+            raise ValueError("(user_id, day) rows must be unique")
+        if gap.any():
+            # insert `gap` zero-task rows before each row; they carry no XP
+            reps = gap + 1
+            expanded = np.repeat(np.arange(n), reps)
+            within = np.arange(len(expanded)) - np.repeat(np.cumsum(reps) - reps, reps)
+            real = within == gap[expanded]
+            days = days[expanded] - gap[expanded] + within
+            user_ids = user_ids[expanded]
+            zero = lambda a: np.where(real, a[expanded], 0)
+            base_xp, completed, required_completed = zero(base_xp), zero(completed), zero(required_completed)
+            init_total_xp = init_total_xp[expanded]
+            init_streak_days = init_streak_days[expanded]
+            init_consecutive_misses = init_consecutive_misses[expanded]
+            order = np.where(real, order[expanded], -1)  # -1 marks a filled-in day
+            n = len(user_ids)
+
+    starts = _segment_starts(user_ids)
+    first_of_user = np.maximum.accumulate(np.where(starts, np.arange(n), 0))
+
+    active = completed > 0
+    if daily_target_count > 0:
+        full_day = required_completed >= daily_target_count
+    else:
+        full_day = active.copy()
+
+    # streak after each day; a run of active days that reaches the user's first row continues the initial streak
+    run, run_from_start = _run_length(active, starts)
+    streak_after = run + np.where(run_from_start, init_streak_days[first_of_user], 0)
+    streak_before = np.empty(n, dtype=np.int64)
+    streak_before[1:] = streak_after[:-1]
+    streak_before[starts] = init_streak_days[first_of_user][starts]
+
+    # same float64 operations, in the same order, as engine.compute_day_xp
+    mult = 1.0 + np.minimum(streak_step * np.maximum(0, streak_before), streak_cap)
+    bonus = np.where(full_day, full_day_bonus, 0.0)
+    day_xp = np.rint(base_xp * mult * (1.0 + bonus)).astype(np.int64)  # rint == round(): half to even
+
+    csum = np.cumsum(day_xp)
+    before_user = (csum - day_xp)[first_of_user]
+    total_xp = init_total_xp[first_of_user] + csum - before_user
+
+    miss_run, miss_from_start = _run_length(~active, starts)
+    misses = miss_run + np.where(miss_from_start, init_consecutive_misses[first_of_user], 0)
+
+    return ReplayResult(
+        order=order,
+        user_ids=user_ids,
+        days=days,
+        full_day=full_day,
+        multiplier=mult,
+        day_xp=day_xp,
+        total_xp=total_xp,
+        streak_days=streak_after,
+        consecutive_misses=misses,
+        current_level=level_array(total_xp, curve),
+    )
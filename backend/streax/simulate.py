@@ -0,0 +1,307 @@
+# backend/streax/simulate.py
+"""
+What-if simulation of the XP rules: replay real history, or project a user forward,
+under a candidate rule set and compare with the current one.
+
+Rules holds the parameters of engine.compute_day_xp, the daily target and the level
+curve; Rules() is what the engine applies today. Both simulations run on
+streax.replay, which is bit-identical to process_day for the same rules, so there
+is no Python loop over user-days:
+
+    summarize_replay(cols, baseline, candidate)
+        one chunk of real history (per-(user, day) columns as
+        database/rebuild_users.load_user_days returns them), replayed under both
+        rule sets -> Summary
+    project(state, profile, active_rate, days, runs, rule_sets)
+        Monte Carlo projection of one user `days` forward: in every run each day is
+        active with probability active_rate and then repeats one of the user's
+        recent active days (tasks, base XP, required tasks), drawn at random
+
+A Summary holds Histograms over fixed edges (counts per bin plus n / sum / min / max),
+so summaries of user-sharded chunks merge by addition in any order and can be
+reported while a run is still going. Quantiles are interpolated within a bin.
+
+NumPy is only needed for this module (pip install numpy).
+"""
+import functools
+import math
+from dataclasses import dataclass, asdict, fields
+from typing import Dict, Optional
+
+import numpy as np
+
+from .engine import STREAK_STEP, STREAK_CAP, FULL_DAY_BONUS
+from .replay import ReplayResult, replay_days
+from . import levels
+
+XP_EDGES = [0] + [m * 10 ** e for e in range(7) for m in (1, 2, 5)]
+LEVEL_EDGES = list(range(11)) + [15, 20, 25, 30, 40, 50, 75, 100, 150, 200, 300, 500, 1000]
+STREAK_EDGES = [0, 1, 2, 3, 5, 7, 10, 14, 21, 30, 45, 60, 90, 120, 180, 270, 365, 730]
+CHANGE_PCT_EDGES = [-50, -25, -10, -5, -1, -0.01, 0.01, 1, 5, 10, 25, 50, 100, 200]
+QUANTILES = (0.1, 0.5, 0.9, 0.99)
+
+@functools.lru_cache(maxsize=16)
+def _curve(kind: str, base: int, exponent: float) -> levels.LevelCurve:
+    return levels.make_curve(kind, base, exponent)
+
+@dataclass(frozen=True)
+class Rules:
+    streak_step: float = STREAK_STEP
+    streak_cap: float = STREAK_CAP
+    full_day_bonus: float = FULL_DAY_BONUS
+    daily_target_count: int = 2          # what app/main.py passes to process_day
+    curve: Optional[str] = None          # linear | power; None: the configured levels.curve
+    curve_base: int = 100
+    curve_exponent: float = 1.5
+
+    def level_curve(self) -> levels.LevelCurve:
+        if self.curve is None:
+            return levels.curve
+        return _curve(self.curve, self.curve_base, self.curve_exponent)
+
+    def replay_kwargs(self) -> dict:
+        return {
+            "streak_step": self.streak_step,
+            "streak_cap": self.streak_cap,
+            "full_day_bonus": self.full_day_bonus,
+            "daily_target_count": self.daily_target_count,
+            "curve": self.level_curve(),
+        }
+
+    def as_dict(self) -> dict:
+        out = {f.name: getattr(self, f.name) for f in fields(self)
+               if f.name not in ("curve", "curve_base", "curve_exponent")}
+        out["level_curve"] = self.level_curve().describe()
+        return out
+
+    def replace(self, **changes) -> "Rules":
+        """A copy with the given fields changed (None values are ignored)."""
+        values = asdict(self)
+        values.update({k: v for k, v in changes.items() if v is not None})
+        return Rules(**values)
+
+def _num(x: float):
+    return int(x) if float(x).is_integer() else round(float(x), 2) + 0.0  # + 0.0: no -0.0
+
+class Histogram:
+    """
+    Counts over fixed edges: bin 0 is (-inf, edges[0]), bin i is [edges[i-1], edges[i]),
+    the last bin is [edges[-1], inf).
+    """
+
+    def __init__(self, edges):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.zeros(len(self.edges) + 1, dtype=np.int64)
+        self.n = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values) -> "Histogram":
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return self
+        bins = np.searchsorted(self.edges, values, side="right")
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+        self.n += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        return self
+
+    def merge(self, other: "Histogram") -> "Histogram":
+        self.counts += other.counts
+        self.n += other.n
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def _bounds(self, i: int):
+        lo = self.edges[i - 1] if i > 0 else -math.inf
+        hi = self.edges[i] if i < len(self.edges) else math.inf
+        return lo, hi
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate q-quantile: linear within the bin it falls in, clamped to the observed min / max."""
+        if not self.n:
+            return None
+        target = q * self.n
+        cum = np.cumsum(self.counts)
+        i = int(np.searchsorted(cum, target, side="left"))
+        lo, hi = self._bounds(i)
+        lo, hi = max(lo, self.min), min(hi, self.max)
+        before = cum[i] - self.counts[i]
+        frac = (target - before) / self.counts[i] if self.counts[i] else 0.0
+        return lo + (hi - lo) * frac
+
+    def as_dict(self) -> dict:
+        if not self.n:
+            return {"n": 0}
+        out = {"n": self.n, "mean": _num(self.total / self.n), "min": _num(self.min), "max": _num(self.max)}
+        for q in QUANTILES:
+            out[f"p{int(q * 100)}"] = _num(self.quantile(q))
+        bins = []
+        for i in np.flatnonzero(self.counts):
+            lo, hi = self._bounds(int(i))
+            bins.append({"lo": None if lo == -math.inf else _num(lo),
+                         "hi": None if hi == math.inf else _num(hi),
+                         "count": int(self.counts[i])})
+        out["bins"] = bins
+        return out
+
+METRICS = {"total_xp": XP_EDGES, "level": LEVEL_EDGES, "best_streak": STREAK_EDGES}
+
+def _metric_histograms() -> Dict[str, Histogram]:
+    return {name: Histogram(edges) for name, edges in METRICS.items()}
+
+def per_user(r: ReplayResult):
+    """(user_ids, total_xp, level, best_streak) at each user's last row."""
+    last = r.final_rows()
+    if len(last) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty, empty
+    starts = np.concatenate(([0], last[:-1] + 1))
+    best = np.maximum.reduceat(r.streak_days, starts)
+    return r.user_ids[last], r.total_xp[last], r.current_level[last], best
+
+class Summary:
+    """Distributions of a replay under the baseline and the candidate rules, and their per-user change."""
+
+    def __init__(self):
+        self.users = 0
+        self.user_days = 0
+        self.baseline = _metric_histograms()
+        self.candidate = _metric_histograms()
+        self.xp_change_pct = Histogram(CHANGE_PCT_EDGES)  # users with baseline XP > 0
+        self.xp_up = self.xp_down = self.xp_same = 0
+        self.level_up = self.level_down = 0
+        self.baseline_mismatch = 0  # users whose stored total_xp differs from the baseline replay
+
+    def add(self, base: ReplayResult, cand: ReplayResult, stored_total_xp: Optional[dict] = None) -> "Summary":
+        ids, b_xp, b_level, b_best = per_user(base)
+        _, c_xp, c_level, c_best = per_user(cand)
+        self.users += len(ids)
+        self.user_days += len(base.day_xp)
+        for hists, xp, level, best in ((self.baseline, b_xp, b_level, b_best),
+                                       (self.candidate, c_xp, c_level, c_best)):
+            hists["total_xp"].add(xp)
+            hists["level"].add(level)
+            hists["best_streak"].add(best)
+        has_xp = b_xp > 0
+        self.xp_change_pct.add((c_xp[has_xp] - b_xp[has_xp]) / b_xp[has_xp] * 100.0)
+        self.xp_up += int((c_xp > b_xp).sum())
+        self.xp_down += int((c_xp < b_xp).sum())
+        self.xp_same += int((c_xp == b_xp).sum())
+        self.level_up += int((c_level > b_level).sum())
+        self.level_down += int((c_level < b_level).sum())
+        if stored_total_xp is not None:
+            self.baseline_mismatch += sum(1 for uid, xp in zip(ids.tolist(), b_xp.tolist())
+                                          if stored_total_xp.get(uid) != xp)
+        return self
+
+    def merge(self, other: "Summary") -> "Summary":
+        for name in ("users", "user_days", "xp_up", "xp_down", "xp_same",
+                     "level_up", "level_down", "baseline_mismatch"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for mine, theirs in ((self.baseline, other.baseline), (self.candidate, other.candidate)):
+            for name, h in mine.items():
+                h.merge(theirs[name])
+        self.xp_change_pct.merge(other.xp_change_pct)
+        return self
+
+    def as_dict(self) -> dict:
+        base_total = self.baseline["total_xp"].total
+        cand_total = self.candidate["total_xp"].total
+        return {
+            "users": self.users,
+            "user_days": self.user_days,
+            "baseline": {name: h.as_dict() for name, h in self.baseline.items()},
+            "candidate": {name: h.as_dict() for name, h in self.candidate.items()},
+            "change": {
+                "total_xp_pct": _num((cand_total - base_total) / base_total * 100.0) if base_total else None,
+                "user_xp_pct": self.xp_change_pct.as_dict(),
+                "users_xp_up": self.xp_up,
+                "users_xp_down": self.xp_down,
+                "users_xp_same": self.xp_same,
+                "users_level_up": self.level_up,
+                "users_level_down": self.level_down,
+            },
+            "baseline_mismatch_users": self.baseline_mismatch,
+        }
+
+def summarize_replay(cols: dict, baseline: Rules, candidate: Rules, fill_gaps: bool = True,
+                     stored_total_xp: Optional[dict] = None) -> Summary:
+    """
+    Replay one chunk of history (user_ids, days, base_xp, completed, required_completed
+    arrays) under both rule sets. stored_total_xp ({user_id: users.total_xp}) counts the
+    users whose stored XP the baseline replay does not reproduce.
+    """
+    base = replay_days(fill_gaps=fill_gaps, **cols, **baseline.replay_kwargs())
+    cand = replay_days(fill_gaps=fill_gaps, **cols, **candidate.replay_kwargs())
+    return Summary().add(base, cand, stored_total_xp)
+
+def _spread(values: np.ndarray) -> dict:
+    p10, p50, p90 = np.percentile(values, [10, 50, 90])
+    return {"p10": _num(p10), "p50": _num(p50), "p90": _num(p90)}
+
+def project(state: dict, profile: dict, active_rate: float, days: int, runs: int,
+            rule_sets: Dict[str, Rules], seed: Optional[int] = None, checkpoints: int = 4) -> dict:
+    """
+    state: the user's total_xp, streak_days, consecutive_misses now.
+    profile: the user's recent active days as equal-length arrays completed, base_xp,
+        required_completed (may be empty: the user then stays inactive).
+    Every rule set replays the same random draws, so differences between them come
+    from the rules alone.
+    """
+    rng = np.random.default_rng(seed)
+    n = runs * days
+    pool = len(profile["completed"])
+    if pool and active_rate > 0:
+        active = rng.random(n) < active_rate
+        pick = rng.integers(0, pool, n)
+    else:
+        active = np.zeros(n, dtype=bool)
+        pick = np.zeros(n, dtype=np.int64)
+
+    def drawn(name):
+        col = np.asarray(profile[name], dtype=np.int64)
+        return np.where(active, col[pick], 0) if pool else np.zeros(n, dtype=np.int64)
+
+    cols = {
+        "user_ids": np.repeat(np.arange(runs, dtype=np.int64), days),
+        "days": np.tile(np.arange(days, dtype=np.int64), runs),
+        "completed": drawn("completed"),
+        "base_xp": drawn("base_xp"),
+        "required_completed": drawn("required_completed"),
+        "init_total_xp": np.full(n, state["total_xp"], dtype=np.int64),
+        "init_streak_days": np.full(n, state["streak_days"], dtype=np.int64),
+        "init_consecutive_misses": np.full(n, state["consecutive_misses"], dtype=np.int64),
+    }
+    marks = sorted({max(1, round(days * (i + 1) / checkpoints)) for i in range(checkpoints)})
+    out = {"days": days, "runs": runs, "active_rate": round(active_rate, 4), "profile_days": pool,
+           "start": dict(state), "rules": {}}
+    gained = {}
+    for label, rules in rule_sets.items():
+        r = replay_days(**cols, **rules.replay_kwargs())
+        # input is already in (run, day) order, so the result reshapes to one row per run
+        total = r.total_xp.reshape(runs, days)
+        level = r.current_level.reshape(runs, days)
+        streak = r.streak_days.reshape(runs, days)
+        gained[label] = total[:, -1] - state["total_xp"]
+        out["rules"][label] = {
+            "rules": rules.as_dict(),
+            "final": {
+                "total_xp": Histogram(XP_EDGES).add(total[:, -1]).as_dict(),
+                "xp_gained": Histogram(XP_EDGES).add(gained[label]).as_dict(),
+                "level": Histogram(LEVEL_EDGES).add(level[:, -1]).as_dict(),
+                "best_streak": Histogram(STREAK_EDGES).add(np.maximum(streak.max(axis=1), state["streak_days"])).as_dict(),
+            },
+            "trajectory": [{"day": d, "total_xp": _spread(total[:, d - 1]), "level": _spread(level[:, d - 1])}
+                           for d in marks],
+        }
+    labels = list(rule_sets)
+    if len(labels) == 2:
+        a, b = labels
+        out["delta_xp_gained"] = {"of": f"{b} - {a}", **_spread(gained[b] - gained[a])}
+    return out
@@ -0,0 +1,102 @@
+# backend/streax/stats.py
+"""
+Per-user statistics kept as running counters (database table user_stats_agg).
+
+An aggregate is a plain dict (see empty()):
+
+    best_streak                       longest streak_days seen
+    active_days, first_date, last_date
+                                      days with at least one completion, first / last such day
+    tasks, xp                         completions and XP awarded, all time
+    week_start, week_tasks, week_xp   current ISO week (Monday) and its counters
+    month, month_tasks, month_xp      current month (yyyy-mm) and its counters
+    by_type                           {task type: [completions, xp, active days]}
+    by_task                           {task name: completions}
+
+fold_day() adds one processed day, so the write path never rescans history, and
+summarize() turns an aggregate into the values the Stats page shows. Counters of
+a week or month that has ended read as 0; a day older than the stored week or
+month only updates the all-time counters.
+"""
+from datetime import date, timedelta
+from typing import Dict, Iterable
+
+def empty() -> dict:
+    return {
+        "best_streak": 0, "active_days": 0, "first_date": None, "last_date": None,
+        "tasks": 0, "xp": 0,
+        "week_start": None, "week_tasks": 0, "week_xp": 0,
+        "month": None, "month_tasks": 0, "month_xp": 0,
+        "by_type": {}, "by_task": {},
+    }
+
+def week_start(day: date) -> str:
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+def month_of(day: date) -> str:
+    return day.isoformat()[:7]
+
+def fold_day(agg: dict, day_iso: str, entries: Iterable[Dict], streak_days: int) -> dict:
+    """
+    Add one processed day to agg (in place; also returned).
+    entries: completed tasks of the day with keys name, type, xp_awarded.
+    """
+    agg["best_streak"] = max(agg["best_streak"], streak_days or 0)
+    entries = list(entries)
+    if not entries:
+        return agg
+    xp = sum(e.get("xp_awarded") or 0 for e in entries)
+    agg["active_days"] += 1  # one processing per user and date (day_events)
+    agg["first_date"] = min(agg["first_date"] or day_iso, day_iso)
+    agg["last_date"] = max(agg["last_date"] or day_iso, day_iso)
+    agg["tasks"] += len(entries)
+    agg["xp"] += xp
+
+    day = date.fromisoformat(day_iso)
+    for key_field, key, prefix in (("week_start", week_start(day), "week"), ("month", month_of(day), "month")):
+        stored = agg[key_field]
+        if stored is not None and key < stored:
+            continue
+        if key != stored:
+            agg.update({key_field: key, f"{prefix}_tasks": 0, f"{prefix}_xp": 0})
+        agg[f"{prefix}_tasks"] += len(entries)
+        agg[f"{prefix}_xp"] += xp
+
+    seen_types = set()
+    for e in entries:
+        t = agg["by_type"].setdefault(e["type"], [0, 0, 0])
+        t[0] += 1
+        t[1] += e.get("xp_awarded") or 0
+        if e["type"] not in seen_types:
+            seen_types.add(e["type"])
+            t[2] += 1
+        agg["by_task"][e["name"]] = agg["by_task"].get(e["name"], 0) + 1
+    return agg
+
+def summarize(agg: dict, today: date) -> dict:
+    """
+    Stats page values. completion_rate per type = share of the days from the first to the
+    last active day on which a task of that type was completed.
+    """
+    agg = agg or empty()
+    span = 0
+    if agg["first_date"]:
+        span = (date.fromisoformat(agg["last_date"]) - date.fromisoformat(agg["first_date"])).days + 1
+    this_week = agg["week_start"] == week_start(today)
+    this_month = agg["month"] == month_of(today)
+    top = min(agg["by_task"].items(), key=lambda kv: (-kv[1], kv[0]), default=None)
+    return {
+        "best_streak": agg["best_streak"],
+        "active_days": agg["active_days"],
+        "first_active_date": agg["first_date"],
+        "tasks_completed": agg["tasks"],
+        "xp_this_week": agg["week_xp"] if this_week else 0,
+        "tasks_this_week": agg["week_tasks"] if this_week else 0,
+        "xp_this_month": agg["month_xp"] if this_month else 0,
+        "tasks_this_month": agg["month_tasks"] if this_month else 0,
+        "by_type": {
+            t: {"tasks": n, "xp": xp, "days": days, "completion_rate": round(days / span, 4) if span else 0.0}
+            for t, (n, xp, days) in sorted(agg["by_type"].items())
+        },
+        "most_completed_task": {"name": top[0], "count": top[1]} if top else None,
+    }
@@ -0,0 +1,39 @@
+# backend/streax/test_levels.py
+"""
+LinearCurve's closed forms against a table-based curve with the same steps, and no table behind them.
+
+Run (from backend/):
+    python -m unittest streax.test_levels      (or: python -m pytest streax/test_levels.py)
+"""
+import unittest
+
+import numpy as np
+
+from streax import levels
+from streax.replay import level_array
+
+class StepTable(levels.TableCurve):
+    """The linear rule looked up the table way."""
+    def __init__(self, xp_per_level: int):
+        self.xp_per_level = xp_per_level
+        super().__init__()
+
+    def step(self, level):
+        return self.xp_per_level
+
+class LinearCurveTest(unittest.TestCase):
+    def test_matches_the_table_lookup(self):
+        linear, table = levels.LinearCurve(70), StepTable(70)
+        xps = [-5, 0, 1, 69, 70, 71, 139, 140, 6999, 70_000, 123_456]
+        self.assertEqual([linear.level_for(x) for x in xps], [table.level_for(x) for x in xps])
+        self.assertEqual([linear.threshold(l) for l in range(2000)], [table.threshold(l) for l in range(2000)])
+        self.assertEqual([linear.progress(x) for x in xps], [table.progress(x) for x in xps])
+        self.assertEqual(linear.table_for(10_000), table.table_for(10_000))
+        np.testing.assert_array_equal(level_array(np.array(xps), linear), level_array(np.array(xps), table))
+
+    def test_builds_no_table(self):
+        self.assertFalse(hasattr(levels.LinearCurve(100), "thresholds"))
+        self.assertEqual(len(levels.PowerCurve(100, 1.5).thresholds), levels.TableCurve.INITIAL_LEVELS + 1)
+
+if __name__ == "__main__":
+    unittest.main()
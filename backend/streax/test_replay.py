@@ -0,0 +1,89 @@
+# backend/streax/test_replay.py
+"""
+replay_days against engine.process_day stepped day by day, on random histories.
+
+Run (from backend/):
+    python -m unittest streax.test_replay      (or: python -m pytest streax/test_replay.py)
+"""
+import random
+import unittest
+
+import numpy as np
+
+from streax.engine import process_day
+from streax.models import Task, UserState
+from streax.replay import replay_days
+
+def random_history(rnd: random.Random, users: int = 40, max_days: int = 60):
+    """[(user_id, init state, {day: [Task]})], days with gaps; some days are zero-task calls."""
+    out = []
+    for uid in rnd.sample(range(1, 10 * users), users):
+        init = UserState(user_id=uid, total_xp=rnd.choice([0, rnd.randint(0, 5000)]),
+                         streak_days=rnd.choice([0, rnd.randint(0, 30)]),
+                         consecutive_misses=rnd.choice([0, rnd.randint(0, 5)]))
+        day, days = rnd.randint(0, 20000), {}
+        for _ in range(rnd.randint(1, max_days)):
+            days[day] = [Task(i, f"t{i}", "small", rnd.randint(1, 300), rnd.random() < 0.5)
+                         for i in range(rnd.choice([0, 1, 1, 2, 3, 5]))]
+            day += rnd.choice([1, 1, 1, 2, 4])
+        out.append((uid, init, days))
+    return out
+
+def step(init: UserState, days: dict, fill_gaps: bool, target: int):
+    """{day: (day_xp, total_xp, streak_days, consecutive_misses, current_level)} from process_day."""
+    state = UserState(**vars(init))
+    calendar = range(min(days), max(days) + 1) if fill_gaps else sorted(days)
+    out = {}
+    for day in calendar:
+        state, event = process_day(state, days.get(day, []), str(day), daily_target_count=target)
+        out[day] = (event["day_xp"], event["total_xp"], event["streak_days"], event["consecutive_misses"],
+                    event["current_level"])
+    return out
+
+class ReplayMatchesEngine(unittest.TestCase):
+    def check(self, seed: int, fill_gaps: bool, target: int):
+        history = random_history(random.Random(seed))
+        rows = [(uid, init, day, tasks) for uid, init, days in history for day, tasks in days.items()]
+        random.Random(seed + 1).shuffle(rows)  # input order must not matter
+        r = replay_days(
+            user_ids=[u for u, _, _, _ in rows],
+            days=[d for _, _, d, _ in rows],
+            base_xp=[sum(t.base_xp for t in ts) for _, _, _, ts in rows],
+            completed=[len(ts) for _, _, _, ts in rows],
+            required_completed=[sum(t.required_daily for t in ts) for _, _, _, ts in rows],
+            daily_target_count=target,
+            init_total_xp=[i.total_xp for _, i, _, _ in rows],
+            init_streak_days=[i.streak_days for _, i, _, _ in rows],
+            init_consecutive_misses=[i.consecutive_misses for _, i, _, _ in rows],
+            fill_gaps=fill_gaps,
+        )
+        got = {}
+        for k in range(len(r.user_ids)):
+            uid, day = int(r.user_ids[k]), int(r.days[k])
+            if r.order[k] >= 0:
+                self.assertEqual((rows[r.order[k]][0], rows[r.order[k]][2]), (uid, day))
+            got.setdefault(uid, {})[day] = (int(r.day_xp[k]), int(r.total_xp[k]), int(r.streak_days[k]),
+                                            int(r.consecutive_misses[k]), int(r.current_level[k]))
+        for uid, init, days in history:
+            self.assertEqual(got[uid], step(init, days, fill_gaps, target), f"user {uid}")
+
+    def test_logged_days(self):
+        for seed in range(5):
+            for target in (0, 2):
+                with self.subTest(seed=seed, target=target):
+                    self.check(seed, fill_gaps=False, target=target)
+
+    def test_fill_gaps(self):
+        for seed in range(5):
+            for target in (0, 2):
+                with self.subTest(seed=seed, target=target):
+                    self.check(seed, fill_gaps=True, target=target)
+
+    def test_no_rows(self):
+        r = replay_days(user_ids=[], days=[], base_xp=[], completed=[], fill_gaps=True)
+        self.assertEqual(len(r.day_xp), 0)
+        self.assertEqual(len(r.final_rows()), 0)
+        np.testing.assert_array_equal(r.current_level, np.zeros(0, dtype=np.int64))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,8 +6,8 @@ const API = import.meta.env.VITE_API_URL || "http://127.0.0.1:8000";
 
 /**
  * Streaks page
- * - fetches task logs for last ~365 days
- * - builds a map of date -> count
+ * - fetches per-day activity for the last 365 days (server-side rollup)
+ * - builds a map of date -> number of tasks that awarded XP
  * - passes map to StreakGrid
  */
 export default function Streaks() {
@@ -19,24 +19,19 @@ export default function Streaks() {
     async function load() {
       setLoading(true);
       try {
-        // request last 400 logs to be safe (backend returns most recent first)
-        const res = await fetch(`${API}/task-logs?user_id=${userId}&limit=400`);
+        // backend aggregates per day (at most 366 rows), defaults to the last 365 days
+        const res = await fetch(`${API}/users/${userId}/activity`);
         const json = await res.json();
-        const logs = json.logs || [];
-        // count tasks per day
+        const days = json.days || [];
         const counts = new Map();
-        logs.forEach(l => {
-          // l.date should be 'YYYY-MM-DD' already
-          const day = l.date;
-          if (!day) return;
-          const prev = counts.get(day) || 0;
-          counts.set(day, prev + (l.xp_awarded ? 1 : 0)); // count by entries (you can change)
+        days.forEach(d => {
+          // d.date is 'YYYY-MM-DD'
+          if (!d.date) return;
+          counts.set(d.date, d.scored || 0); // tasks that awarded XP, not every log
         });
-
-        // NOTE: backend returns recent first; counts map ready
         setMap(counts);
       } catch (e) {
-        console.error("Failed to load task logs", e);
+        console.error("Failed to load activity", e);
       } finally {
         setLoading(false);
       }